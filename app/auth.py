@@ -3,16 +3,115 @@
 from __future__ import annotations
 
 import hashlib
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 
 import os
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import APIKeyHeader
+from starlette.responses import RedirectResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
 
 from config.db import get_db
-from models import User
+from models import ChangeCounter, User
+from services.table_versions import bump_counter, current_counter
+
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+USER_CACHE_RECHECK_SECONDS = float(os.getenv("USER_CACHE_RECHECK_SECONDS", "2"))
+USERS_VERSION_COUNTER = "users"
+USERS_VERSION_SESSION_KEY = "users_version"
+
+_CHANGED_USERS = "changed_user_ids"
+
+
+class CurrentUser(NamedTuple):
+    """Identity and role flags of the logged-in user."""
+
+    id: int
+    username: str
+    email: str
+    is_admin: bool
+    is_active: bool
+
+
+class UserCache:
+    """Bounded TTL/LRU cache of :class:`CurrentUser` keyed by user id.
+
+    Each entry remembers the ``users`` counter it was loaded at. Entries older
+    than the counter are ignored: the process rereads it at most every
+    ``recheck_seconds``, and a session stamped with a newer value (its own
+    write, possibly on another worker) applies it at once. A user demoted or
+    deactivated on another worker thus loses access within ``recheck_seconds``
+    rather than the TTL.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, recheck_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.recheck_seconds = recheck_seconds
+        self._entries: OrderedDict[int, tuple[float, int, CurrentUser]] = OrderedDict()
+        self._generation = 0
+        self._version = 0
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def known_version(self, db: Session) -> int:
+        """The ``users`` counter, reread at most every ``recheck_seconds``."""
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.recheck_seconds:
+                return self._version
+        version = current_counter(db.connection(), USERS_VERSION_COUNTER)
+        with self._lock:
+            self._version, self._checked_at = version, now
+        return version
+
+    def get(self, user_id: int, min_version: int) -> CurrentUser | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, version, user = entry
+            if expires_at <= now or version < min_version:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user: CurrentUser, version: int, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, version, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+                self._checked_at = float("-inf")
+            else:
+                self._entries.pop(user_id, None)
+
+
+user_cache = UserCache(
+    USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES, USER_CACHE_RECHECK_SECONDS
+)
 
 
 def hash_password(password: str) -> str:
@@ -23,19 +122,69 @@ def hash_password(password: str) -> str:
 
 def get_current_user(
     request: Request, db: Session = Depends(get_db)
-) -> Optional[User]:
+) -> Optional[CurrentUser]:
     """Retrieve the currently logged-in user from the session."""
 
     user_id = request.session.get("user_id")
     if user_id is None:
         return None
-    user = db.get(User, user_id)
-    if user and not user.is_active:
+    min_version = max(
+        request.session.get(USERS_VERSION_SESSION_KEY, 0), user_cache.known_version(db)
+    )
+    user = user_cache.get(user_id, min_version)
+    if user is None:
+        generation = user_cache.generation
+        # The row and the counter it is valid for, in one round trip.
+        version = (
+            select(ChangeCounter.value)
+            .where(ChangeCounter.name == USERS_VERSION_COUNTER)
+            .scalar_subquery()
+        )
+        row = db.execute(
+            select(
+                User.id, User.username, User.email, User.is_admin, User.is_active, version
+            ).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        user = CurrentUser(*row[:5])
+        user_cache.set(user, row[5] or 0, generation)
+    if not user.is_active:
         return None
     return user
 
 
-def require_admin(user: User | None = Depends(get_current_user)) -> User:
+def mark_user_changed(request: Request, db: Session, user_id: int) -> None:
+    """Version a write to ``user_id`` made in ``db``'s open transaction.
+
+    Call before committing. The cached entry is dropped once the commit goes
+    through, and the session is stamped so its next request reloads on any
+    worker.
+    """
+
+    version = bump_counter(db.connection(), USERS_VERSION_COUNTER)
+    request.session[USERS_VERSION_SESSION_KEY] = version
+    db.info.setdefault(_CHANGED_USERS, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    for user_id in session.info.pop(_CHANGED_USERS, ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session) -> None:
+    session.info.pop(_CHANGED_USERS, None)
+
+
+@event.listens_for(User.__table__, "after_create")
+def _clear_users_on_create(target, connection, **kw) -> None:
+    # A recreated table restarts ids and the counter; nothing cached applies.
+    user_cache.invalidate()
+
+
+def require_admin(user: CurrentUser | None = Depends(get_current_user)) -> CurrentUser:
     """Ensure the user is authenticated and has admin role."""
 
     if not user or not user.is_admin:
@@ -53,3 +202,36 @@ def require_api_key(api_key: str = Depends(api_key_header)) -> None:
     if not api_key or api_key != expected:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No autorizado")
 
+
+class LoginRequiredMiddleware:
+    """Pure ASGI gate that redirects anonymous requests to ``/login``.
+
+    Allowed paths are matched against a prebuilt set and prefix tuple before
+    the session is looked at, so static files, notification polls and the
+    billing webhook pass straight through. Must run inside
+    ``SessionMiddleware``.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        allowed_paths: frozenset[str] | set[str] = frozenset(),
+        allowed_prefixes: tuple[str, ...] = (),
+        login_path: str = "/login",
+    ) -> None:
+        self.app = app
+        self.allowed_paths = frozenset(allowed_paths)
+        self.allowed_prefixes = tuple(allowed_prefixes)
+        self.login_path = login_path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path = scope["path"]
+            if (
+                path not in self.allowed_paths
+                and not path.startswith(self.allowed_prefixes)
+                and not scope["session"].get("user_id")
+            ):
+                await RedirectResponse(self.login_path)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -1,9 +1,16 @@
-from sqlalchemy import MetaData, create_engine, text, inspect
+from sqlalchemy import MetaData, create_engine, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from config.db_pool import engine_options, instrument_pool
+from config.query_stats import instrument_queries
+
+import logging
 import os
 
+LOGGER = logging.getLogger(__name__)
+
 # Prefer ``DATABASE_URL`` and fallback to ``DB_DSN`` for backward compatibility
 DB_DSN = os.getenv("DATABASE_URL") or os.getenv("DB_DSN")
 if not DB_DSN:
@@ -12,13 +19,21 @@ if not DB_DSN:
 _raw_schema = os.getenv("DB_SCHEMA", "movdin")
 SCHEMA_NAME = _raw_schema or None
 
-engine_kwargs: dict[str, object] = {"future": True, "pool_pre_ping": True}
+# Arbitrary application-wide key for ``pg_advisory_xact_lock`` around migrations.
+SCHEMA_MIGRATION_LOCK_KEY = 7_240_312_002
+
+# Text search configuration backing ``transactions.search_vector`` on Postgres.
+SEARCH_CONFIG = f"{SCHEMA_NAME or 'public'}.spanish_unaccent"
+
+engine_kwargs: dict[str, object] = {"future": True, **engine_options(DB_DSN)}
 if DB_DSN.startswith("sqlite"):
     engine_kwargs["connect_args"] = {"check_same_thread": False}
     if ":memory:" in DB_DSN:
         engine_kwargs["poolclass"] = StaticPool
 
 engine = create_engine(DB_DSN, **engine_kwargs)
+instrument_pool(engine)
+instrument_queries(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 
@@ -27,15 +42,61 @@ class Base(DeclarativeBase):
 
 
 def init_db() -> None:
-    """Create the service schema and tables if they do not exist."""
+    """Create the service schema and bring it up to the latest migration step.
+
+    A current database costs a single read of ``schema_version``. Otherwise the
+    tables are created and the pending steps applied in one transaction, under
+    an advisory lock on Postgres so workers booting together run them once.
+    """
     import models  # register models
 
+    if _schema_version() >= len(SCHEMA_MIGRATIONS):
+        return
+
     with engine.begin() as conn:
-        if engine.dialect.name == "postgresql" and SCHEMA_NAME:
-            conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{_quote_identifier(SCHEMA_NAME)}"'))
+        if engine.dialect.name == "postgresql":
+            conn.execute(select(func.pg_advisory_xact_lock(SCHEMA_MIGRATION_LOCK_KEY)))
+            if SCHEMA_NAME:
+                conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{_quote_identifier(SCHEMA_NAME)}"'))
+        Base.metadata.create_all(bind=conn)
+
+        version_table = models.SchemaVersion.__table__
+        applied = conn.scalar(select(func.max(version_table.c.version))) or 0
+        for version, step in enumerate(SCHEMA_MIGRATIONS, start=1):
+            if version <= applied:
+                continue
+            LOGGER.info("Applying schema migration %s: %s", version, step.__name__)
+            step(conn)
+            conn.execute(
+                dialect_insert(conn, version_table)
+                .values(version=version, description=step.__doc__.strip())
+                .on_conflict_do_nothing(index_elements=["version"])
+            )
+
+
+def _schema_version() -> int:
+    """Latest applied migration step, or ``0`` before versioning existed."""
+
+    import models
+
+    version_table = models.SchemaVersion.__table__
+    try:
+        with engine.connect() as conn:
+            return conn.scalar(select(func.max(version_table.c.version))) or 0
+    except DBAPIError:
+        return 0
+
 
-    Base.metadata.create_all(bind=engine)
-    _apply_schema_upgrades()
+def dialect_insert(bind, table):
+    """Return an ``INSERT`` construct supporting ``ON CONFLICT`` for the bind's dialect."""
+
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:  # pragma: no cover - unsupported backends
+        raise RuntimeError(f"ON CONFLICT is not supported on {bind.dialect.name}")
+    return insert(table)
 
 
 def _quote_identifier(identifier: str) -> str:
@@ -52,361 +113,529 @@ def _qualified_table(name: str) -> str:
     return name
 
 
-def _apply_schema_upgrades() -> None:
-    """Apply lightweight schema migrations required by the application."""
+def _inspection_schema() -> str | None:
+    return SCHEMA_NAME if engine.dialect.name == "postgresql" else None
 
-    schema = SCHEMA_NAME if engine.dialect.name == "postgresql" else None
 
-    with engine.begin() as conn:
-        inspector = inspect(conn)
-        table_names = set(inspector.get_table_names(schema=schema))
-
-        if "invoices" in table_names:
-            columns = {
-                col["name"] for col in inspector.get_columns("invoices", schema=schema)
-            }
-            table = _qualified_table("invoices")
-            if "percepciones" not in columns:
-                if "retenciones" in columns:
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} RENAME COLUMN retenciones TO percepciones"
-                        )
-                    )
-                else:
-                    if engine.dialect.name == "postgresql":
-                        conn.execute(
-                            text(
-                                f"ALTER TABLE {table} "
-                                "ADD COLUMN percepciones NUMERIC(12, 2) DEFAULT 0 NOT NULL"
-                            )
-                        )
-                    else:
-                        conn.execute(
-                            text(
-                                f"ALTER TABLE {table} "
-                                "ADD COLUMN percepciones NUMERIC(12, 2) DEFAULT 0"
-                            )
-                        )
+# Each step inspects before altering, so databases created before versioning
+# (at any point of this history) start from step 1 safely.
+def _add_invoice_percepciones(conn) -> None:
+    """Rename ``retenciones`` to ``percepciones`` or add it."""
 
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+
+    if "invoices" in table_names:
+        columns = {
+            col["name"] for col in inspector.get_columns("invoices", schema=schema)
+        }
+        table = _qualified_table("invoices")
+        if "percepciones" not in columns:
+            if "retenciones" in columns:
                 conn.execute(
                     text(
-                        f"UPDATE {table} SET percepciones = 0 "
-                        "WHERE percepciones IS NULL"
+                        f"ALTER TABLE {table} RENAME COLUMN retenciones TO percepciones"
                     )
                 )
-
-        if "retention_certificates" in table_names:
-            columns = {
-                col["name"]
-                for col in inspector.get_columns("retention_certificates", schema=schema)
-            }
-            table = _qualified_table("retention_certificates")
-            type_table = _qualified_table("retained_tax_types")
-            if "retained_tax_type_id" not in columns:
+            else:
                 if engine.dialect.name == "postgresql":
                     conn.execute(
                         text(
                             f"ALTER TABLE {table} "
-                            f"ADD COLUMN retained_tax_type_id INTEGER REFERENCES {type_table}(id)"
+                            "ADD COLUMN percepciones NUMERIC(12, 2) DEFAULT 0 NOT NULL"
                         )
                     )
                 else:
                     conn.execute(
                         text(
-                            f"ALTER TABLE {table} ADD COLUMN retained_tax_type_id INTEGER"
+                            f"ALTER TABLE {table} "
+                            "ADD COLUMN percepciones NUMERIC(12, 2) DEFAULT 0"
                         )
                     )
 
-                default_name = "Sin especificar"
-                names: set[str] = set()
+            conn.execute(
+                text(
+                    f"UPDATE {table} SET percepciones = 0 "
+                    "WHERE percepciones IS NULL"
+                )
+            )
+
+
+def _add_retained_tax_type_to_certificates(conn) -> None:
+    """Replace the free-text certificate concept with a retained tax type."""
+
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+
+    if "retention_certificates" in table_names:
+        columns = {
+            col["name"]
+            for col in inspector.get_columns("retention_certificates", schema=schema)
+        }
+        table = _qualified_table("retention_certificates")
+        type_table = _qualified_table("retained_tax_types")
+        if "retained_tax_type_id" not in columns:
+            if engine.dialect.name == "postgresql":
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} "
+                        f"ADD COLUMN retained_tax_type_id INTEGER REFERENCES {type_table}(id)"
+                    )
+                )
+            else:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} ADD COLUMN retained_tax_type_id INTEGER"
+                    )
+                )
+
+            default_name = "Sin especificar"
+            names: set[str] = set()
+            if "concept" in columns:
+                results = conn.execute(
+                    text(f"SELECT DISTINCT concept FROM {table}")
+                ).all()
+                for (concept,) in results:
+                    cleaned = (concept or "").strip()
+                    if not cleaned:
+                        cleaned = default_name
+                    names.add(cleaned)
+
+            if not names:
+                count = conn.execute(
+                    text(f"SELECT COUNT(*) FROM {table}")
+                ).scalar_one()
+                if count:
+                    names.add(default_name)
+
+            if names:
+                existing_names = {
+                    row[0]
+                    for row in conn.execute(
+                        text(f"SELECT name FROM {type_table}")
+                    ).all()
+                }
+                missing = names - existing_names
+                for name in sorted(missing):
+                    conn.execute(
+                        text(f"INSERT INTO {type_table} (name) VALUES (:name)"),
+                        {"name": name},
+                    )
+
+                type_map = {
+                    row[1]: row[0]
+                    for row in conn.execute(
+                        text(f"SELECT id, name FROM {type_table}")
+                    ).all()
+                }
+
                 if "concept" in columns:
-                    results = conn.execute(
-                        text(f"SELECT DISTINCT concept FROM {table}")
+                    rows = conn.execute(
+                        text(f"SELECT id, concept FROM {table}")
                     ).all()
-                    for (concept,) in results:
+                    for cert_id, concept in rows:
                         cleaned = (concept or "").strip()
                         if not cleaned:
                             cleaned = default_name
-                        names.add(cleaned)
-
-                if not names:
-                    count = conn.execute(
-                        text(f"SELECT COUNT(*) FROM {table}")
-                    ).scalar_one()
-                    if count:
-                        names.add(default_name)
-
-                if names:
-                    existing_names = {
-                        row[0]
-                        for row in conn.execute(
-                            text(f"SELECT name FROM {type_table}")
-                        ).all()
-                    }
-                    missing = names - existing_names
-                    for name in sorted(missing):
-                        conn.execute(
-                            text(f"INSERT INTO {type_table} (name) VALUES (:name)"),
-                            {"name": name},
-                        )
-
-                    type_map = {
-                        row[1]: row[0]
-                        for row in conn.execute(
-                            text(f"SELECT id, name FROM {type_table}")
-                        ).all()
-                    }
-
-                    if "concept" in columns:
-                        rows = conn.execute(
-                            text(f"SELECT id, concept FROM {table}")
-                        ).all()
-                        for cert_id, concept in rows:
-                            cleaned = (concept or "").strip()
-                            if not cleaned:
-                                cleaned = default_name
-                            type_id = type_map.get(cleaned)
-                            if type_id is not None:
-                                conn.execute(
-                                    text(
-                                        f"UPDATE {table} "
-                                        "SET retained_tax_type_id = :type_id "
-                                        "WHERE id = :cert_id"
-                                    ),
-                                    {"type_id": type_id, "cert_id": cert_id},
-                                )
-                    else:
-                        default_id = type_map.get(default_name)
-                        if default_id is not None:
+                        type_id = type_map.get(cleaned)
+                        if type_id is not None:
                             conn.execute(
                                 text(
-                                    f"UPDATE {table} SET retained_tax_type_id = :type_id"
+                                    f"UPDATE {table} "
+                                    "SET retained_tax_type_id = :type_id "
+                                    "WHERE id = :cert_id"
                                 ),
-                                {"type_id": default_id},
+                                {"type_id": type_id, "cert_id": cert_id},
                             )
-
-                null_count = conn.execute(
-                    text(
-                        f"SELECT COUNT(*) FROM {table} "
-                        "WHERE retained_tax_type_id IS NULL"
-                    )
-                ).scalar_one()
-                if null_count == 0 and engine.dialect.name == "postgresql":
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ALTER COLUMN retained_tax_type_id SET NOT NULL"
+                else:
+                    default_id = type_map.get(default_name)
+                    if default_id is not None:
+                        conn.execute(
+                            text(
+                                f"UPDATE {table} SET retained_tax_type_id = :type_id"
+                            ),
+                            {"type_id": default_id},
                         )
-                    )
 
-        if "accounts" in table_names:
-            columns = {
-                col["name"] for col in inspector.get_columns("accounts", schema=schema)
-            }
-            table = _qualified_table("accounts")
-            if "billing_last_checkpoint_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
-                conn.execute(
-                    text(
-                        f"ALTER TABLE {table} "
-                        f"ADD COLUMN billing_last_checkpoint_id {col_type}"
-                    )
+            null_count = conn.execute(
+                text(
+                    f"SELECT COUNT(*) FROM {table} "
+                    "WHERE retained_tax_type_id IS NULL"
                 )
-            if "billing_last_confirmed_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            ).scalar_one()
+            if null_count == 0 and engine.dialect.name == "postgresql":
                 conn.execute(
                     text(
                         f"ALTER TABLE {table} "
-                        f"ADD COLUMN billing_last_confirmed_id {col_type}"
+                        "ALTER COLUMN retained_tax_type_id SET NOT NULL"
                     )
                 )
-            if "billing_last_changes_checkpoint_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+
+
+def _add_account_billing_checkpoints(conn) -> None:
+    """Add the billing sync checkpoints to ``accounts``."""
+
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+
+    if "accounts" in table_names:
+        columns = {
+            col["name"] for col in inspector.get_columns("accounts", schema=schema)
+        }
+        table = _qualified_table("accounts")
+        if "billing_last_checkpoint_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN billing_last_checkpoint_id {col_type}"
+                )
+            )
+        if "billing_last_confirmed_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN billing_last_confirmed_id {col_type}"
+                )
+            )
+        if "billing_last_changes_checkpoint_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN billing_last_changes_checkpoint_id {col_type}"
+                )
+            )
+        if "billing_last_changes_confirmed_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN billing_last_changes_confirmed_id {col_type}"
+                )
+            )
+        if "billing_synced_at" not in columns:
+            if engine.dialect.name == "postgresql":
                 conn.execute(
                     text(
                         f"ALTER TABLE {table} "
-                        f"ADD COLUMN billing_last_changes_checkpoint_id {col_type}"
+                        "ADD COLUMN billing_synced_at TIMESTAMPTZ"
                     )
                 )
-            if "billing_last_changes_confirmed_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            else:
                 conn.execute(
                     text(
                         f"ALTER TABLE {table} "
-                        f"ADD COLUMN billing_last_changes_confirmed_id {col_type}"
+                        "ADD COLUMN billing_synced_at DATETIME"
                     )
                 )
-            if "billing_synced_at" not in columns:
-                if engine.dialect.name == "postgresql":
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN billing_synced_at TIMESTAMPTZ"
-                        )
-                    )
-                else:
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN billing_synced_at DATETIME"
-                        )
-                    )
 
 
-        if "billing_transaction_sync_states" in table_names:
-            columns = {
-                col["name"]
-                for col in inspector.get_columns("billing_transaction_sync_states", schema=schema)
-            }
-            table = _qualified_table("billing_transaction_sync_states")
-            if "exportable_movement_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+def _add_billing_sync_states(conn) -> None:
+    """Create or complete ``billing_transaction_sync_states``."""
+
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+
+    if "billing_transaction_sync_states" in table_names:
+        columns = {
+            col["name"]
+            for col in inspector.get_columns("billing_transaction_sync_states", schema=schema)
+        }
+        table = _qualified_table("billing_transaction_sync_states")
+        if "exportable_movement_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN exportable_movement_id {col_type}"
+                )
+            )
+        if "is_custom_inkwell" not in columns:
+            if engine.dialect.name == "postgresql":
                 conn.execute(
                     text(
                         f"ALTER TABLE {table} "
-                        f"ADD COLUMN exportable_movement_id {col_type}"
+                        "ADD COLUMN is_custom_inkwell BOOLEAN DEFAULT FALSE NOT NULL"
                     )
                 )
-            if "is_custom_inkwell" not in columns:
-                if engine.dialect.name == "postgresql":
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN is_custom_inkwell BOOLEAN DEFAULT FALSE NOT NULL"
-                        )
-                    )
-                else:
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN is_custom_inkwell BOOLEAN DEFAULT 0"
-                        )
-                    )
-            if "status" not in columns:
+            else:
                 conn.execute(
                     text(
                         f"ALTER TABLE {table} "
-                        "ADD COLUMN status VARCHAR(20) DEFAULT 'unavailable' NOT NULL"
+                        "ADD COLUMN is_custom_inkwell BOOLEAN DEFAULT 0"
                     )
                 )
-            if "updated_at_event_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+        if "status" not in columns:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    "ADD COLUMN status VARCHAR(20) DEFAULT 'unavailable' NOT NULL"
+                )
+            )
+        if "updated_at_event_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN updated_at_event_id {col_type} DEFAULT 0 NOT NULL"
+                )
+            )
+        if "created_at" not in columns:
+            if engine.dialect.name == "postgresql":
                 conn.execute(
                     text(
                         f"ALTER TABLE {table} "
-                        f"ADD COLUMN updated_at_event_id {col_type} DEFAULT 0 NOT NULL"
+                        "ADD COLUMN created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL"
                     )
                 )
-            if "created_at" not in columns:
-                if engine.dialect.name == "postgresql":
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL"
-                        )
-                    )
-                else:
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN created_at DATETIME"
-                        )
-                    )
-            if "updated_at" not in columns:
-                if engine.dialect.name == "postgresql":
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL"
-                        )
-                    )
-                else:
-                    conn.execute(
-                        text(
-                            f"ALTER TABLE {table} "
-                            "ADD COLUMN updated_at DATETIME"
-                        )
-                    )
-        elif "transactions" in table_names:
-            # Backward-compatible creation for environments where metadata.create_all
-            # did not create the sync-state table yet.
-            if engine.dialect.name == "postgresql":
+            else:
                 conn.execute(
                     text(
-                        f"CREATE TABLE IF NOT EXISTS {_qualified_table('billing_transaction_sync_states')} ("
-                        "transaction_id BIGINT PRIMARY KEY, "
-                        "exportable_movement_id BIGINT, "
-                        "is_custom_inkwell BOOLEAN DEFAULT FALSE NOT NULL, "
-                        "status VARCHAR(20) DEFAULT 'unavailable' NOT NULL, "
-                        "updated_at_event_id BIGINT DEFAULT 0 NOT NULL, "
-                        "created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL, "
-                        "updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL"
-                        ")"
+                        f"ALTER TABLE {table} "
+                        "ADD COLUMN created_at DATETIME"
                     )
                 )
+        if "updated_at" not in columns:
+            if engine.dialect.name == "postgresql":
                 conn.execute(
                     text(
-                        f"CREATE INDEX IF NOT EXISTS ix_billing_tx_sync_status "
-                        f"ON {_qualified_table('billing_transaction_sync_states')}(status)"
+                        f"ALTER TABLE {table} "
+                        "ADD COLUMN updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL"
                     )
                 )
             else:
                 conn.execute(
                     text(
-                        "CREATE TABLE IF NOT EXISTS billing_transaction_sync_states ("
-                        "transaction_id INTEGER PRIMARY KEY, "
-                        "exportable_movement_id INTEGER, "
-                        "is_custom_inkwell BOOLEAN DEFAULT 0, "
-                        "status VARCHAR(20) DEFAULT 'unavailable' NOT NULL, "
-                        "updated_at_event_id INTEGER DEFAULT 0 NOT NULL, "
-                        "created_at DATETIME, "
-                        "updated_at DATETIME"
-                        ")"
+                        f"ALTER TABLE {table} "
+                        "ADD COLUMN updated_at DATETIME"
                     )
                 )
+    elif "transactions" in table_names:
+        # Backward-compatible creation for environments where metadata.create_all
+        # did not create the sync-state table yet.
+        if engine.dialect.name == "postgresql":
+            conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {_qualified_table('billing_transaction_sync_states')} ("
+                    "transaction_id BIGINT PRIMARY KEY, "
+                    "exportable_movement_id BIGINT, "
+                    "is_custom_inkwell BOOLEAN DEFAULT FALSE NOT NULL, "
+                    "status VARCHAR(20) DEFAULT 'unavailable' NOT NULL, "
+                    "updated_at_event_id BIGINT DEFAULT 0 NOT NULL, "
+                    "created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL, "
+                    "updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL"
+                    ")"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS ix_billing_tx_sync_status "
+                    f"ON {_qualified_table('billing_transaction_sync_states')}(status)"
+                )
+            )
+        else:
+            conn.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS billing_transaction_sync_states ("
+                    "transaction_id INTEGER PRIMARY KEY, "
+                    "exportable_movement_id INTEGER, "
+                    "is_custom_inkwell BOOLEAN DEFAULT 0, "
+                    "status VARCHAR(20) DEFAULT 'unavailable' NOT NULL, "
+                    "updated_at_event_id INTEGER DEFAULT 0 NOT NULL, "
+                    "created_at DATETIME, "
+                    "updated_at DATETIME"
+                    ")"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_billing_tx_sync_status "
+                    "ON billing_transaction_sync_states(status)"
+                )
+            )
+
+
+def _add_transaction_billing_indexes(conn) -> None:
+    """Add ``billing_transaction_id`` and the listing indexes to ``transactions``."""
+
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+
+    if "transactions" in table_names:
+        columns = {
+            col["name"]
+            for col in inspector.get_columns("transactions", schema=schema)
+        }
+        table = _qualified_table("transactions")
+        if "billing_transaction_id" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} "
+                    f"ADD COLUMN billing_transaction_id {col_type}"
+                )
+            )
+        indexes = {
+            idx["name"] for idx in inspector.get_indexes("transactions", schema=schema)
+        }
+        index_name = "ux_transactions_billing_transaction_id"
+        if index_name not in indexes:
+            if engine.dialect.name == "postgresql":
                 conn.execute(
                     text(
-                        "CREATE INDEX IF NOT EXISTS ix_billing_tx_sync_status "
-                        "ON billing_transaction_sync_states(status)"
+                        f"CREATE UNIQUE INDEX {index_name} "
+                        f"ON {table}(billing_transaction_id) "
+                        "WHERE billing_transaction_id IS NOT NULL"
                     )
                 )
-
-        if "transactions" in table_names:
-            columns = {
-                col["name"]
-                for col in inspector.get_columns("transactions", schema=schema)
-            }
-            table = _qualified_table("transactions")
-            if "billing_transaction_id" not in columns:
-                col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            else:
                 conn.execute(
                     text(
-                        f"ALTER TABLE {table} "
-                        f"ADD COLUMN billing_transaction_id {col_type}"
+                        f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} "
+                        f"ON {table}(billing_transaction_id) "
+                        "WHERE billing_transaction_id IS NOT NULL"
                     )
                 )
-            indexes = {
-                idx["name"] for idx in inspector.get_indexes("transactions", schema=schema)
-            }
-            index_name = "ux_transactions_billing_transaction_id"
-            if index_name not in indexes:
-                if engine.dialect.name == "postgresql":
-                    conn.execute(
-                        text(
-                            f"CREATE UNIQUE INDEX {index_name} "
-                            f"ON {table}(billing_transaction_id) "
-                            "WHERE billing_transaction_id IS NOT NULL"
-                        )
-                    )
-                else:
-                    conn.execute(
-                        text(
-                            f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} "
-                            f"ON {table}(billing_transaction_id) "
-                            "WHERE billing_transaction_id IS NOT NULL"
-                        )
-                    )
+        if "ix_transactions_date_id" not in indexes:
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_transactions_date_id "
+                    f"ON {table}(date, id)"
+                )
+            )
+
+
+def _add_transaction_search(conn) -> None:
+    """Create the full-text search index for transactions."""
+
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+    if "transactions" in table_names:
+        columns = {col["name"] for col in inspector.get_columns("transactions", schema=schema)}
+        _ensure_transaction_search(conn, columns, table_names)
+
+
+def _add_billing_info_change_seq(conn) -> None:
+    """Number invoice and certificate changes for the incremental feed."""
+
+    schema = _inspection_schema()
+    inspector = inspect(conn)
+    table_names = set(inspector.get_table_names(schema=schema))
+
+    for name in ("invoices", "retention_certificates"):
+        if name not in table_names:
+            continue
+        columns = {col["name"] for col in inspector.get_columns(name, schema=schema)}
+        table = _qualified_table(name)
+        if "change_seq" not in columns:
+            col_type = "BIGINT" if engine.dialect.name == "postgresql" else "INTEGER"
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN change_seq {col_type}"))
+        conn.execute(
+            text(f"CREATE INDEX IF NOT EXISTS ix_{name}_change_seq ON {table}(change_seq)")
+        )
+
+
+def _rebuild_daily_balances(conn) -> None:
+    """Fill ``account_daily_balances`` from existing transactions."""
+
+    table_names = set(inspect(conn).get_table_names(schema=_inspection_schema()))
+
+    if "account_daily_balances" in table_names and "transactions" in table_names:
+        from services.balances import rebuild_daily_balances
+
+        rollup = _qualified_table("account_daily_balances")
+        transactions = _qualified_table("transactions")
+        has_rollup = conn.execute(text(f"SELECT 1 FROM {rollup} LIMIT 1")).first()
+        has_transactions = conn.execute(
+            text(f"SELECT 1 FROM {transactions} LIMIT 1")
+        ).first()
+        if has_transactions and not has_rollup:
+            rebuild_daily_balances(conn)
+
+
+def _ensure_transaction_search(conn, columns: set[str], table_names: set[str]) -> None:
+    """Create the full-text search index for transaction description and notes."""
+
+    from models import TRANSACTION_FTS_SQLITE_DDL, TRANSACTION_FTS_TABLE
+
+    table = _qualified_table("transactions")
+    if engine.dialect.name == "sqlite":
+        if TRANSACTION_FTS_TABLE in table_names:
+            return
+        for statement in TRANSACTION_FTS_SQLITE_DDL:
+            conn.execute(text(statement))
+        conn.execute(
+            text(
+                f"INSERT INTO {TRANSACTION_FTS_TABLE}({TRANSACTION_FTS_TABLE}) "
+                "VALUES ('rebuild')"
+            )
+        )
+        return
+    if engine.dialect.name != "postgresql" or "search_vector" in columns:
+        return
+
+    schema = _quote_identifier(SCHEMA_NAME or "public")
+    config = f'"{schema}".spanish_unaccent'
+    conn.execute(
+        text(
+            "DO $$ BEGIN "
+            "IF NOT EXISTS (SELECT 1 FROM pg_ts_config c "
+            "JOIN pg_namespace n ON n.oid = c.cfgnamespace "
+            f"WHERE c.cfgname = 'spanish_unaccent' AND n.nspname = '{schema}') THEN "
+            f"CREATE TEXT SEARCH CONFIGURATION {config} (COPY = pg_catalog.spanish); "
+            "END IF; END $$"
+        )
+    )
+    savepoint = conn.begin_nested()
+    try:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+        conn.execute(
+            text(
+                f"ALTER TEXT SEARCH CONFIGURATION {config} "
+                "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem"
+            )
+        )
+    except DBAPIError:
+        savepoint.rollback()
+        LOGGER.warning("unaccent extension unavailable; search will be accent-sensitive")
+    else:
+        savepoint.commit()
+    conn.execute(
+        text(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}'::regconfig, "
+            "coalesce(description, '') || ' ' || coalesce(notes, ''))) STORED"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_transactions_search_vector "
+            f"ON {table} USING GIN (search_vector)"
+        )
+    )
+
+
+# Applied in order and recorded in ``schema_version``; append new steps at the
+# end and never reorder. ``create_all`` only runs while a step is pending, so a
+# new model needs a step too (even an empty one).
+SCHEMA_MIGRATIONS = (
+    _add_invoice_percepciones,
+    _add_retained_tax_type_to_certificates,
+    _add_account_billing_checkpoints,
+    _add_billing_sync_states,
+    _add_transaction_billing_indexes,
+    _add_transaction_search,
+    _add_billing_info_change_seq,
+    _rebuild_daily_balances,
+)
 
 
 def get_db():
@@ -0,0 +1,178 @@
+"""Connection pool settings from the environment and pool metrics.
+
+``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``, ``DB_POOL_TIMEOUT_SECONDS``,
+``DB_POOL_RECYCLE_SECONDS``, ``DB_POOL_PRE_PING`` and, on Postgres,
+``DB_STATEMENT_TIMEOUT_MS`` tune the engine. To drop the round trip pre-ping
+adds to every checkout, set ``DB_POOL_PRE_PING=false`` and let
+``DB_POOL_RECYCLE_SECONDS`` retire connections before the server or a proxy
+closes them.
+
+Counters come from pool events. SQLAlchemy has no event for the start of a
+checkout, so :class:`TimedQueuePool` stamps it and times the wait for a free
+slot. The ``checkout`` event closes the measurement after any pre-ping.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+LOGGER = logging.getLogger(__name__)
+
+POOL_SAMPLE_SIZE = 1000
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "max": 1.0}
+
+_checkout_started = threading.local()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        LOGGER.warning("Invalid %s value, using %s", name, default)
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def engine_options(dsn: str) -> dict[str, object]:
+    """``create_engine`` keyword arguments for ``dsn`` from the environment.
+
+    In-memory SQLite keeps its single shared connection, so only the liveness
+    options apply to it.
+    """
+
+    options: dict[str, object] = {
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE_SECONDS", -1),
+    }
+    if dsn.startswith("sqlite") and ":memory:" in dsn:
+        return options
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int("DB_POOL_TIMEOUT_SECONDS", 30),
+    )
+    statement_timeout = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+    if dsn.startswith("postgresql") and statement_timeout > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+def _percentiles(values) -> dict[str, float] | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        name: round(ordered[max(0, math.ceil(fraction * len(ordered)) - 1)], 2)
+        for name, fraction in PERCENTILES.items()
+    }
+
+
+class PoolMetrics:
+    """Event counters and recent wait/checkout latencies, in milliseconds."""
+
+    def __init__(self, sample_size: int) -> None:
+        self._wait_ms: deque[float] = deque(maxlen=sample_size)
+        self._checkout_ms: deque[float] = deque(maxlen=sample_size)
+        self._counters = dict.fromkeys(
+            ("connects", "checkouts", "checkins", "invalidations", "timeouts"), 0
+        )
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def record_wait(self, ms: float) -> None:
+        with self._lock:
+            self._wait_ms.append(ms)
+
+    def record_checkout(self, ms: float | None) -> None:
+        with self._lock:
+            self._counters["checkouts"] += 1
+            if ms is not None:
+                self._checkout_ms.append(ms)
+
+    def snapshot(self, pool: Pool) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            wait_ms, checkout_ms = list(self._wait_ms), list(self._checkout_ms)
+        state: dict[str, object] = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            state.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+                max_overflow=pool._max_overflow,
+            )
+        return {
+            **state,
+            **counters,
+            "wait_ms": _percentiles(wait_ms),
+            "checkout_ms": _percentiles(checkout_ms),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = dict.fromkeys(self._counters, 0)
+            self._wait_ms.clear()
+            self._checkout_ms.clear()
+
+
+pool_metrics = PoolMetrics(POOL_SAMPLE_SIZE)
+
+
+class TimedQueuePool(QueuePool):
+    """``QueuePool`` that times how long each checkout waits for a slot."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        _checkout_started.value = started
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.count("timeouts")
+            raise
+        finally:
+            pool_metrics.record_wait((time.perf_counter() - started) * 1000)
+
+
+def instrument_pool(engine: Engine) -> None:
+    """Feed ``pool_metrics`` from ``engine``'s pool events."""
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        pool_metrics.count("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        started = getattr(_checkout_started, "value", None)
+        _checkout_started.value = None
+        # Pools other than TimedQueuePool (in-memory SQLite) only count.
+        pool_metrics.record_checkout(
+            (time.perf_counter() - started) * 1000 if started is not None else None
+        )
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record) -> None:
+        pool_metrics.count("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception) -> None:
+        pool_metrics.count("invalidations")
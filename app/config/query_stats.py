@@ -0,0 +1,154 @@
+"""Per-request SQL statement counts and timings.
+
+Cursor events on the engine add every statement's duration to the
+:class:`QueryStats` of the current context. :class:`QueryTimingMiddleware`
+opens one per HTTP request and reports it in a ``Server-Timing`` header. The
+threadpool that runs sync routes copies the context, so their queries count.
+Work handed to other executors does not count. Statements slower than
+``SLOW_QUERY_MS`` are logged normalized, whether or not a request is being
+tracked.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections.abc import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _env_ms(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        LOGGER.warning("Invalid %s value, using %s", name, default)
+        return default
+
+
+# 0 turns the slow-query log off.
+SLOW_QUERY_MS = _env_ms("SLOW_QUERY_MS", 500)
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+_STARTED = "query_started"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_PARAMETER_LIST = re.compile(rf"\(\s*{_PARAMETER}(?:\s*,\s*{_PARAMETER})+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse whitespace and replace literals and parameter lists.
+
+    Statements that differ only in values or ``IN`` list length normalize to
+    the same text, so the slow-query log can be grouped.
+    """
+
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Statements executed and their total time within one tracked scope."""
+
+    def __init__(self, record: bool = False) -> None:
+        self.count = 0
+        self.duration_ms = 0.0
+        self.statements: list[str] | None = [] if record else None
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, duration_ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.duration_ms += duration_ms
+            if self.statements is not None:
+                self.statements.append(normalize_sql(statement))
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration_ms:.1f}, db-count;desc="{self.count}"'
+
+
+@contextmanager
+def track_queries(record: bool = False) -> Iterator[QueryStats]:
+    """Collect the statements run in the current context into a new ``QueryStats``."""
+
+    stats = QueryStats(record)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int) -> Iterator[QueryStats]:
+    """Fail with the statements run if the block runs more than ``max_queries``."""
+
+    with track_queries(record=True) as stats:
+        yield stats
+    if stats.count > max_queries:
+        listing = "\n".join(f"  {statement}" for statement in stats.statements)
+        raise AssertionError(f"{stats.count} queries, budget {max_queries}:\n{listing}")
+
+
+def instrument_queries(engine: Engine) -> None:
+    """Time every statement on ``engine`` for request stats and the slow-query log."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany) -> None:
+        duration_ms = (time.perf_counter() - conn.info[_STARTED].pop()) * 1000
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.add(statement, duration_ms)
+        if SLOW_QUERY_MS > 0 and duration_ms >= SLOW_QUERY_MS:
+            LOGGER.warning("Slow query (%.1f ms): %s", duration_ms, normalize_sql(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _discard(exception_context) -> None:
+        conn = exception_context.connection
+        if conn is not None and conn.info.get(_STARTED):
+            conn.info[_STARTED].pop()
+
+
+class QueryTimingMiddleware:
+    """Pure ASGI middleware adding the request's ``Server-Timing`` database metrics.
+
+    The header goes out with the response start, so the rows a streaming body
+    reads afterwards are not included.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+
+            async def send_with_timing(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", stats.server_timing())
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
@@ -12,8 +12,9 @@ from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from config.db import get_db, init_db, SessionLocal
 from config.constants import CURRENCY_SYMBOLS
+from config.query_stats import QueryTimingMiddleware
 from models import Account, Invoice, User
-from auth import get_current_user, require_admin, hash_password
+from auth import LoginRequiredMiddleware, get_current_user, require_admin, hash_password
 from routes.accounts import router as accounts_router, get_account_summary_data
 from routes.health import router as health_router
 from routes.transactions import router as transactions_router
@@ -24,6 +25,13 @@ from routes.retained_taxes import router as retained_taxes_router
 from routes.users import router as users_router
 from routes.billing_info import router as billing_info_router
 from routes.notifications import router as notifications_router
+from services.account_cache import account_metadata_cache, billing_account_meta
+from services.billing_http import (
+    close_billing_async_client,
+    close_billing_http_client,
+    start_billing_http_client,
+)
+from services.billing_sync import start_billing_sync_job, stop_billing_sync_job
 from services.notifications import (
     start_notification_retention_job,
     stop_notification_retention_job,
@@ -36,22 +44,25 @@ load_dotenv()
 app = FastAPI(title="Movimientos")
 
 
-@app.middleware("http")
-async def require_login_middleware(request: Request, call_next):
-    path = request.url.path
-    if path.startswith("/notificaciones"):
-        return await call_next(request)
-    allowed = {"/login", "/register", "/health", "/facturacion-info"}
-    if not request.session.get("user_id") and not path.startswith("/static") and path not in allowed:
-        return RedirectResponse("/login")
-    return await call_next(request)
-
-
+# Added first so it runs inside SessionMiddleware and can read the session.
+app.add_middleware(
+    LoginRequiredMiddleware,
+    allowed_paths={
+        "/login",
+        "/register",
+        "/health",
+        "/facturacion-info",
+        "/transactions/billing/webhook",
+    },
+    allowed_prefixes=("/static", "/notificaciones"),
+)
 app.add_middleware(
     SessionMiddleware,
     secret_key=os.getenv("SECRET_KEY", "secret"),
     https_only=os.getenv("SESSION_COOKIE_SECURE", "false").lower() == "true",
 )
+# Outermost, so every response carries the request's database metrics.
+app.add_middleware(QueryTimingMiddleware)
 
 templates = Jinja2Templates(directory=Path(__file__).parent / "templates")
 
@@ -85,6 +96,8 @@ def on_startup() -> None:
                 db.commit()
 
     start_notification_retention_job()
+    start_billing_http_client()
+    start_billing_sync_job()
 
 app.include_router(health_router)
 app.include_router(accounts_router)
@@ -105,15 +118,18 @@ app.mount(
 
 
 @app.on_event("shutdown")
-def on_shutdown() -> None:
+async def on_shutdown() -> None:
     stop_notification_retention_job()
+    stop_billing_sync_job()
+    close_billing_http_client()
+    await close_billing_async_client()
 
 
 @app.get("/", response_class=HTMLResponse)
-async def index(
+def index(
     request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)
 ):
-    billing_account = db.query(Account).filter(Account.is_billing.is_(True)).first()
+    billing_account = billing_account_meta(db)
     return templates.TemplateResponse(
         "index.html",
         {
@@ -154,18 +170,18 @@ async def accounts_page(request: Request, user=Depends(get_current_user)):
 
 
 @app.get("/billing-account-details.html", response_class=HTMLResponse)
-async def billing_account_details(
+def billing_account_details(
     request: Request,
     account_id: int | None = None,
     db: Session = Depends(get_db),
     user=Depends(get_current_user),
 ):
     if account_id is not None:
-        account = db.get(Account, account_id)
+        account = account_metadata_cache.get(db).get(account_id)
         if not account:
             raise HTTPException(status_code=404, detail="Cuenta no encontrada")
     else:
-        account = db.query(Account).filter(Account.is_billing.is_(True)).first()
+        account = billing_account_meta(db)
         if not account:
             raise HTTPException(
                 status_code=404, detail="Cuenta de facturación no configurada"
@@ -242,8 +258,8 @@ async def billing_account_details(
 
 
 @app.get("/billing.html", response_class=HTMLResponse)
-async def billing(request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    acc = db.query(Account).filter(Account.is_billing.is_(True)).first()
+def billing(request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    acc = billing_account_meta(db)
     if acc:
         title = f"Facturación - {acc.name}"
         header_title = (
@@ -268,10 +284,10 @@ async def billing(request: Request, db: Session = Depends(get_db), user=Depends(
 
 
 @app.get("/certificados-retencion.html", response_class=HTMLResponse)
-async def retention_certificates(
+def retention_certificates(
     request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)
 ):
-    acc = db.query(Account).filter(Account.is_billing.is_(True)).first()
+    acc = billing_account_meta(db)
     if acc:
         title = f"Certificados de Retención - {acc.name}"
         header_title = (
@@ -297,7 +313,7 @@ async def retention_certificates(
 
 
 @app.get("/invoice/{invoice_id}", response_class=HTMLResponse)
-async def invoice_detail(
+def invoice_detail(
     request: Request, invoice_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
 ):
     inv = db.get(Invoice, invoice_id)
@@ -324,7 +340,7 @@ async def invoice_detail(
 
 
 @app.get("/invoice/{invoice_id}/edit", response_class=HTMLResponse)
-async def edit_invoice_page(
+def edit_invoice_page(
     request: Request,
     invoice_id: int,
     db: Session = Depends(get_db),
@@ -5,6 +5,7 @@ from typing import Any
 from decimal import Decimal
 
 from sqlalchemy import (
+    DDL,
     Integer,
     BigInteger,
     String,
@@ -21,6 +22,7 @@ from sqlalchemy import (
     JSON,
     UniqueConstraint,
     Uuid,
+    event,
 )
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -79,14 +81,21 @@ class Transaction(Base):
     __tablename__ = "transactions"
     __table_args__ = (
         Index("ix_transactions_account_date_id", "account_id", "date", "id"),
+        Index("ix_transactions_date_id", "date", "id"),
         CheckConstraint("amount <> 0", name="ck_transactions_amount_nonzero"),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
-    date: Mapped[date] = mapped_column(Date, nullable=False)
+    # ``active_history`` keeps the previous value around on change so the daily
+    # balance rollup can reverse it (see ``services.balances``).
+    date: Mapped[date] = mapped_column(Date, nullable=False, active_history=True)
     description: Mapped[str] = mapped_column(Text, default="")
-    amount: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    amount: Mapped[Decimal] = mapped_column(
+        Numeric(12, 2), nullable=False, active_history=True
+    )
     notes: Mapped[str] = mapped_column(Text, default="")
-    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id"), nullable=False)
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("accounts.id"), nullable=False, active_history=True
+    )
     billing_transaction_id: Mapped[int | None] = mapped_column(
         BigInteger, unique=True, nullable=True
     )
@@ -97,6 +106,58 @@ class Transaction(Base):
     account = relationship("Account", back_populates="transactions")
 
 
+# SQLite keeps an FTS5 shadow index of description/notes in sync through
+# triggers; Postgres uses a generated ``search_vector`` column instead (see
+# ``config.db._ensure_transaction_search``).
+TRANSACTION_FTS_TABLE = "transactions_fts"
+TRANSACTION_FTS_SQLITE_DDL: tuple[str, ...] = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TRANSACTION_FTS_TABLE} USING fts5("
+    "description, notes, content='transactions', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}(rowid, description, notes) "
+    "VALUES (new.id, coalesce(new.description, ''), coalesce(new.notes, '')); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}({TRANSACTION_FTS_TABLE}, rowid, description, notes) "
+    "VALUES ('delete', old.id, coalesce(old.description, ''), coalesce(old.notes, '')); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_au "
+    "AFTER UPDATE OF description, notes ON transactions BEGIN "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}({TRANSACTION_FTS_TABLE}, rowid, description, notes) "
+    "VALUES ('delete', old.id, coalesce(old.description, ''), coalesce(old.notes, '')); "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}(rowid, description, notes) "
+    "VALUES (new.id, coalesce(new.description, ''), coalesce(new.notes, '')); END",
+)
+
+for _statement in TRANSACTION_FTS_SQLITE_DDL:
+    event.listen(
+        Transaction.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    Transaction.__table__,
+    "after_drop",
+    DDL(f"DROP TABLE IF EXISTS {TRANSACTION_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+class AccountDailyBalance(Base):
+    """Per-account, per-day rollup of transaction amounts.
+
+    ``cumulative_balance`` is the sum of every transaction of the account up to
+    and including ``date`` (the opening balance is not included).
+    """
+
+    __tablename__ = "account_daily_balances"
+
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id"), primary_key=True)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    net_amount: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False, default=0)
+    cumulative_balance: Mapped[Decimal] = mapped_column(
+        Numeric(14, 2), nullable=False, default=0
+    )
+
+
 class BillingTransactionSyncState(Base):
     __tablename__ = "billing_transaction_sync_states"
     __table_args__ = (
@@ -116,10 +177,37 @@ class BillingTransactionSyncState(Base):
     )
 
 
+class BillingSyncRun(Base):
+    """One billing sync (every page of a drain), with its totals per phase in ms."""
+
+    __tablename__ = "billing_sync_runs"
+    __table_args__ = (
+        Index("ix_billing_sync_runs_started_at", "started_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    trigger: Mapped[str] = mapped_column(String(20), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    pages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    deleted_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    bytes_received: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    fetch_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    parse_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    apply_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    commit_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ack_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error_detail: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
 class Invoice(Base):
     __tablename__ = "invoices"
     __table_args__ = (
         Index("ix_invoices_account_date_id", "account_id", "date", "id"),
+        Index("ix_invoices_change_seq", "change_seq"),
         CheckConstraint("amount <> 0", name="ck_invoices_amount_nonzero"),
     )
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -137,6 +225,9 @@ class Invoice(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    # Position in the /facturacion-info change feed; NULL for rows untouched
+    # since the feed was introduced.
+    change_seq: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     account = relationship("Account", back_populates="invoices")
 
@@ -162,6 +253,7 @@ class RetentionCertificate(Base):
             "date",
             "id",
         ),
+        Index("ix_retention_certificates_change_seq", "change_seq"),
         CheckConstraint(
             "amount <> 0", name="ck_retention_certificates_amount_nonzero"
         ),
@@ -178,12 +270,47 @@ class RetentionCertificate(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
+    change_seq: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     retained_tax_type = relationship(
         "RetainedTaxType", back_populates="certificates"
     )
 
 
+class BillingInfoTombstone(Base):
+    """Deleted invoice or retention certificate, kept for the change feed."""
+
+    __tablename__ = "billing_info_tombstones"
+
+    change_seq: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    entity: Mapped[str] = mapped_column(String(30), nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class ChangeCounter(Base):
+    """Named monotonic counters, bumped under a row lock by the writers."""
+
+    __tablename__ = "change_counters"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class SchemaVersion(Base):
+    """One row per schema migration step applied by ``config.db.init_db``."""
+
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    description: Mapped[str] = mapped_column(String(200), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
 class FrequentTransaction(Base):
     __tablename__ = "frequent_transactions"
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -251,3 +378,12 @@ class Notification(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
+
+
+# Register the session hooks that keep ``account_daily_balances`` in sync with
+# every transaction write, number the /facturacion-info changes, version the
+# tables behind the ETags and invalidate the account metadata cache.
+import services.balances  # noqa: E402,F401
+import services.billing_changes  # noqa: E402,F401
+import services.table_versions  # noqa: E402,F401
+import services.account_cache  # noqa: E402,F401
@@ -1,9 +1,9 @@
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import and_, bindparam, func, select, case
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import and_, bindparam, func, or_, select, case
 from sqlalchemy.orm import Session
 
 from config.db import get_db
@@ -14,13 +14,20 @@ from schemas import (
     AccountIn,
     AccountOut,
     BalanceOut,
+    TransactionLedgerPage,
     TransactionWithBalance,
     AccountSummary,
     RetentionBreakdown,
 )
+from services.balances import balance_until
+from services.table_versions import not_modified_response, table_versions_etag
+from services.transactions import decode_transaction_cursor, encode_transaction_cursor
 
 router = APIRouter(prefix="/accounts")
 
+# Tables read by ``/accounts/balances``; a write to any of them changes its ETag.
+BALANCE_TABLES = ("accounts", "transactions", "invoices", "retention_certificates")
+
 
 def _normalize_tax_name(name: str) -> str:
     return "".join(ch for ch in name.casefold() if ch.isalnum())
@@ -220,37 +227,33 @@ def delete_account(account_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/balances", response_model=List[AccountBalance])
-def account_balances(to_date: date | None = None, db: Session = Depends(get_db)):
+def account_balances(
+    request: Request,
+    response: Response,
+    to_date: date | None = None,
+    db: Session = Depends(get_db),
+):
+    etag = table_versions_etag(db.connection(), BALANCE_TABLES)
+    not_modified = not_modified_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
     to_date = to_date or date.max
+    # One index seek per account on the daily rollup instead of summing every
+    # transaction up to ``to_date``.
     stmt = (
         select(
             Account.id,
             Account.name,
             Account.currency,
-            (Account.opening_balance + func.coalesce(func.sum(Transaction.amount), 0)).label(
-                "balance"
-            ),
+            (
+                Account.opening_balance
+                + func.coalesce(balance_until(Account.id, bindparam("to_date")), 0)
+            ).label("balance"),
             Account.color,
             Account.is_billing,
         )
-        .select_from(Account)
-        .join(
-            Transaction,
-            and_(
-                Transaction.account_id == Account.id,
-                Transaction.date <= bindparam("to_date"),
-            ),
-            isouter=True,
-        )
         .where(Account.is_active == True)
-        .group_by(
-            Account.id,
-            Account.name,
-            Account.opening_balance,
-            Account.currency,
-            Account.color,
-            Account.is_billing,
-        )
         .order_by(Account.name)
     )
     rows = db.execute(stmt, {"to_date": to_date}).all()
@@ -329,22 +332,9 @@ def account_balance(account_id: int, to_date: date | None = None, db: Session =
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Account not found"
         )
-    stmt = (
-        select((Account.opening_balance + func.coalesce(func.sum(Transaction.amount), 0)).label("balance"))
-        .select_from(Account)
-        .join(
-            Transaction,
-            and_(
-                Transaction.account_id == Account.id,
-                Transaction.date <= bindparam("to_date"),
-            ),
-            isouter=True,
-        )
-        .where(Account.id == bindparam("account_id"))
-        .group_by(Account.id, Account.opening_balance)
-    )
-    row = db.execute(stmt, {"account_id": account_id, "to_date": to_date}).one_or_none()
-    balance = row.balance if row else acc.opening_balance
+    stmt = select(balance_until(bindparam("account_id"), bindparam("to_date")))
+    rolled_up = db.execute(stmt, {"account_id": account_id, "to_date": to_date}).scalar()
+    balance = acc.opening_balance + (rolled_up or 0)
     return BalanceOut(balance=balance)
 
 
@@ -353,45 +343,87 @@ def account_summary(account_id: int, db: Session = Depends(get_db)):
     return get_account_summary_data(db, account_id)
 
 
-@router.get("/{account_id}/transactions", response_model=List[TransactionWithBalance])
+@router.get("/{account_id}/transactions", response_model=TransactionLedgerPage)
 def account_transactions(
     account_id: int,
     from_: date | None = None,
     to: date | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
     db: Session = Depends(get_db),
 ):
-    stmt = (
-        select(
-            Transaction.id,
-            Transaction.account_id,
-            Transaction.date,
-            Transaction.description,
-            Transaction.amount,
-            Transaction.notes,
-            func.sum(Transaction.amount)
-            .over(
-                partition_by=Transaction.account_id,
-                order_by=(Transaction.date, Transaction.id),
-            )
-            .label("running_balance"),
-        )
-        .where(Transaction.account_id == account_id)
-    )
+    limit = max(1, min(limit, 500))
+    stmt = select(
+        Transaction.id,
+        Transaction.account_id,
+        Transaction.date,
+        Transaction.description,
+        Transaction.amount,
+        Transaction.notes,
+    ).where(Transaction.account_id == account_id)
     if from_:
         stmt = stmt.where(Transaction.date >= from_)
     if to:
         stmt = stmt.where(Transaction.date <= to)
-    stmt = stmt.order_by(Transaction.date, Transaction.id)
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_transaction_cursor(cursor)
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido"
+            ) from exc
+        stmt = stmt.where(
+            or_(
+                Transaction.date > cursor_date,
+                and_(Transaction.date == cursor_date, Transaction.id > cursor_id),
+            )
+        )
+    stmt = stmt.order_by(Transaction.date, Transaction.id).limit(limit + 1)
     rows = db.execute(stmt).all()
-    return [
-        TransactionWithBalance(
-            id=r.id,
-            account_id=r.account_id,
-            date=r.date,
-            description=r.description,
-            amount=r.amount,
-            notes=r.notes,
-            running_balance=r.running_balance,
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return TransactionLedgerPage(items=[], limit=limit, has_more=False)
+
+    # The page starts from the rollup checkpoint of the previous day plus the
+    # earlier movements of its first day, so only the page rows are read.
+    first = rows[0]
+    same_day = (
+        select(func.sum(Transaction.amount))
+        .where(
+            Transaction.account_id == account_id,
+            Transaction.date == first.date,
+            Transaction.id < first.id,
         )
-        for r in rows
-    ]
+        .scalar_subquery()
+    )
+    running_balance = db.execute(
+        select(
+            func.coalesce(
+                balance_until(account_id, first.date - timedelta(days=1)), 0
+            )
+            + func.coalesce(same_day, 0)
+        )
+    ).scalar_one()
+
+    items = []
+    for r in rows:
+        running_balance += r.amount
+        items.append(
+            TransactionWithBalance(
+                id=r.id,
+                account_id=r.account_id,
+                date=r.date,
+                description=r.description,
+                amount=r.amount,
+                notes=r.notes,
+                running_balance=running_balance,
+            )
+        )
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_transaction_cursor(rows[-1].date, rows[-1].id)
+    return TransactionLedgerPage(
+        items=items, limit=limit, has_more=has_more, next_cursor=next_cursor
+    )
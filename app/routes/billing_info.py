@@ -1,36 +1,189 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from collections.abc import Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.orm import Session, selectinload
 
 from auth import require_api_key
-from config.db import get_db
-from models import Account, Invoice, RetentionCertificate
-from schemas import BillingInfoOut
+from config.db import SessionLocal, get_db
+from models import BillingInfoTombstone, Invoice, RetentionCertificate
+from schemas import (
+    BillingInfoChangesOut,
+    BillingInfoDeleted,
+    BillingInfoOut,
+    InvoiceOut,
+    RetentionCertificateOut,
+)
+from services.account_cache import AccountMeta, billing_account_meta
+from services.billing_changes import (
+    BILLING_INFO_COUNTER,
+    decode_change_cursor,
+    encode_change_cursor,
+)
+from services.table_versions import current_counter, not_modified_response, table_versions_etag
 
 router = APIRouter()
 
+STREAM_BATCH_SIZE = 500
+BILLING_INFO_TABLES = ("accounts", "invoices", "retention_certificates", "retained_tax_types")
+
 
 @router.get(
     "/facturacion-info",
     response_model=BillingInfoOut,
     dependencies=[Depends(require_api_key)],
 )
-def billing_info(db: Session = Depends(get_db)):
-    acc = db.scalar(select(Account).where(Account.is_billing == True))
+def billing_info(
+    request: Request,
+    response: Response,
+    since: str | None = Query(None),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """Full dump of the billing account's invoices and every certificate.
+
+    With ``since`` (the ``next_cursor`` of a previous response) only the rows
+    changed afterwards are returned, up to ``limit`` changes per call. Both
+    modes answer ``If-None-Match`` with ``304`` before querying the rows; an
+    incremental page's ETag also covers its cursor and limit, so it never
+    matches the dump or another page.
+    """
+
+    cursor = None
+    if since is not None:
+        try:
+            cursor = decode_change_cursor(since)
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail="Cursor inválido") from exc
+
+    etag = table_versions_etag(db.connection(), BILLING_INFO_TABLES)
+    if cursor is not None:
+        etag = f'{etag[:-1]}-since{cursor}-limit{limit}"'
+    not_modified = not_modified_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    acc = billing_account_meta(db)
     if not acc:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Billing account not found")
-    invoices = list(
-        db.scalars(
+    if cursor is not None:
+        changes = _billing_info_changes(db, acc, cursor, limit)
+        changes.headers.update(response.headers)
+        return changes
+
+    # Read the counter first: rows changed while dumping are sent again on the
+    # next incremental call rather than missed.
+    next_cursor = encode_change_cursor(current_counter(db.connection(), BILLING_INFO_COUNTER))
+    return StreamingResponse(
+        _stream_billing_info(acc.id, next_cursor),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
+
+
+def _stream_billing_info(account_id: int, next_cursor: str) -> Iterator[bytes]:
+    """Write the ``BillingInfoOut`` document a batch of rows at a time.
+
+    Runs after the request session is closed, so it opens its own and reads
+    both collections with server-side cursors: memory stays flat and the first
+    bytes leave before the last row is read. The session holds a pool
+    connection until the client has read the whole body, so slow consumers
+    count against ``DB_POOL_SIZE`` for the length of their download.
+    """
+
+    with SessionLocal() as db:
+        yield b'{"invoices":['
+        invoices = db.scalars(
             select(Invoice)
-            .where(Invoice.account_id == acc.id)
+            .where(Invoice.account_id == account_id)
             .order_by(Invoice.date, Invoice.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
         )
-    )
-    certificates = list(
-        db.scalars(
+        yield from _json_items(invoices, InvoiceOut)
+        yield b'],"retention_certificates":['
+        certificates = db.scalars(
             select(RetentionCertificate)
             .options(selectinload(RetentionCertificate.retained_tax_type))
             .order_by(RetentionCertificate.date, RetentionCertificate.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
         )
+        yield from _json_items(certificates, RetentionCertificateOut)
+        yield b'],"next_cursor":' + json.dumps(next_cursor).encode("utf-8") + b"}"
+
+
+def _json_items(rows, schema: type[BaseModel]) -> Iterator[bytes]:
+    # One chunk per batch: Starlette sends every chunk of a sync iterator
+    # through the threadpool and its own ``send``.
+    separator = b""
+    batch: list[bytes] = []
+    for row in rows:
+        batch.append(schema.model_validate(row).model_dump_json().encode("utf-8"))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield separator + b",".join(batch)
+            separator, batch = b",", []
+    if batch:
+        yield separator + b",".join(batch)
+
+
+def _billing_info_changes(db: Session, acc: AccountMeta, cursor: int, limit: int) -> JSONResponse:
+    """Up to ``limit`` changes after ``cursor``, merged in change order."""
+
+    invoices = db.scalars(
+        select(Invoice)
+        .where(Invoice.change_seq > cursor)
+        .order_by(Invoice.change_seq)
+        .limit(limit + 1)
+    ).all()
+    certificates = db.scalars(
+        select(RetentionCertificate)
+        .options(selectinload(RetentionCertificate.retained_tax_type))
+        .where(RetentionCertificate.change_seq > cursor)
+        .order_by(RetentionCertificate.change_seq)
+        .limit(limit + 1)
+    ).all()
+    tombstones = db.scalars(
+        select(BillingInfoTombstone)
+        .where(BillingInfoTombstone.change_seq > cursor)
+        .order_by(BillingInfoTombstone.change_seq)
+        .limit(limit + 1)
+    ).all()
+
+    changes = sorted([*invoices, *certificates, *tombstones], key=lambda row: row.change_seq)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    changed_invoices = []
+    changed_certificates = []
+    deleted = BillingInfoDeleted()
+    for row in changes:
+        if isinstance(row, Invoice):
+            # Invoices moved out of the billing account disappear for consumers.
+            if row.account_id == acc.id:
+                changed_invoices.append(row)
+            else:
+                deleted.invoices.append(row.id)
+        elif isinstance(row, RetentionCertificate):
+            changed_certificates.append(row)
+        else:
+            getattr(deleted, row.entity).append(row.entity_id)
+
+    # A live row is newer than any tombstone of the same id in the page.
+    live_invoices = {row.id for row in changed_invoices}
+    live_certificates = {row.id for row in changed_certificates}
+    deleted.invoices = [i for i in deleted.invoices if i not in live_invoices]
+    deleted.retention_certificates = [
+        i for i in deleted.retention_certificates if i not in live_certificates
+    ]
+
+    payload = BillingInfoChangesOut(
+        invoices=changed_invoices,
+        retention_certificates=changed_certificates,
+        deleted=deleted,
+        next_cursor=encode_change_cursor(changes[-1].change_seq if changes else cursor),
+        has_more=has_more,
     )
-    return BillingInfoOut(invoices=invoices, retention_certificates=certificates)
+    return JSONResponse(content=jsonable_encoder(payload))
@@ -1,7 +1,18 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from auth import require_admin
+from config.db import engine
+from config.db_pool import pool_metrics
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
     return {"ok": True}
+
+
+@router.get("/health/db", dependencies=[Depends(require_admin)])
+def health_db():
+    """Connection pool state and recent wait/checkout latencies (ms)."""
+
+    return pool_metrics.snapshot(engine.pool)
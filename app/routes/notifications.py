@@ -8,11 +8,13 @@ from typing import Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 from sqlalchemy import and_, func, or_, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
 
 from auth import get_current_user
 from config.db import get_db
@@ -129,7 +131,16 @@ async def create_or_ack_notification(
     request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)
 ):
     body_bytes = await request.body()
-    content_type = request.headers.get("content-type", "")
+    # Only the body read is async; the queries run off the event loop.
+    return await run_in_threadpool(
+        _create_or_ack_notification, db, user, request.headers, body_bytes
+    )
+
+
+def _create_or_ack_notification(
+    db: Session, user, headers: Headers, body_bytes: bytes
+) -> JSONResponse:
+    content_type = headers.get("content-type", "")
     if "application/json" not in content_type.lower():
         raise HTTPException(status_code=415, detail="Content-Type inválido")
 
@@ -139,12 +150,12 @@ async def create_or_ack_notification(
     except json.JSONDecodeError as exc:
         raise HTTPException(status_code=400, detail="JSON inválido") from exc
 
-    signature = request.headers.get("X-Signature")
+    signature = headers.get("X-Signature")
 
     if signature:
-        timestamp_header = request.headers.get("X-Timestamp")
-        idempotency_key = request.headers.get("X-Idempotency-Key")
-        source_app = request.headers.get("X-Source-App")
+        timestamp_header = headers.get("X-Timestamp")
+        idempotency_key = headers.get("X-Idempotency-Key")
+        source_app = headers.get("X-Source-App")
 
         if not (timestamp_header and idempotency_key and source_app):
             raise HTTPException(status_code=400, detail="Headers faltantes")
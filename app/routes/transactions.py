@@ -1,21 +1,70 @@
+import asyncio
+import json
+import logging
 import os
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
 from datetime import date, datetime, timezone
 from decimal import Decimal, InvalidOperation
-from typing import List
+from functools import partial
+from itertools import islice
+from typing import List, Literal, NamedTuple
 
 import httpx
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import Response
-from sqlalchemy import select, inspect, func, or_
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import and_, delete, func, or_, select
 from sqlalchemy.orm import Session
 
-from config.db import get_db
-from models import Account, BillingTransactionSyncState, Transaction
+from config.db import SessionLocal, dialect_insert, get_db
+from models import Account, BillingSyncRun, BillingTransactionSyncState, Transaction
 from auth import require_admin
-from schemas import TransactionCreate, TransactionOut, TransactionPage
+from schemas import (
+    BillingSyncRunHistory,
+    TransactionCreate,
+    TransactionOut,
+    TransactionPage,
+)
+from services.account_cache import billing_account_meta
+from services.balances import apply_balance_deltas
+from services.billing_feed import FeedArray, FeedReader, SpooledBody
+from services.billing_http import (
+    billing_post,
+    billing_post_async,
+    billing_stream_get,
+    billing_stream_get_async,
+)
+from services.billing_sync import (
+    BILLING_SYNC_PHASES,
+    billing_db_executor,
+    billing_sync_jobs,
+    billing_sync_lock,
+    billing_sync_run_stats,
+    prune_billing_sync_runs,
+)
+from services.table_versions import bump_table_versions
+from services.notifications import require_shared_secret, validate_timestamp, verify_signature
+from services.transactions import (
+    build_search_clause,
+    count_transactions,
+    decode_transaction_cursor,
+    encode_transaction_cursor,
+    estimate_transaction_count,
+)
+
+LOGGER = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/transactions")
 
+BILLING_DRAIN_MAX_PAGES = 50
+# Feed events decoded and held at once while a page is applied.
+BILLING_APPLY_CHUNK_SIZE = 500
+# How often a webhook retries the sync lock while another sync holds it, and
+# the Retry-After it answers with once it gives up.
+BILLING_WEBHOOK_LOCK_POLL_SECONDS = 0.25
+BILLING_WEBHOOK_RETRY_AFTER_SECONDS = 10
+
 
 def _has_non_empty_string(value: object) -> bool:
     return isinstance(value, str) and bool(value.strip())
@@ -54,12 +103,16 @@ def list_transactions(
     start_date: date | None = None,
     end_date: date | None = None,
     account_id: int | None = None,
+    cursor: str | None = None,
+    include_total: Literal["exact", "estimate", "none"] = "exact",
+    sort: Literal["date", "relevance"] = "date",
     db: Session = Depends(get_db),
 ):
     limit = max(1, limit)
     offset = max(0, offset)
 
     filters = []
+    rank = None
     if account_id is not None:
         filters.append(Transaction.account_id == account_id)
     if start_date is not None:
@@ -67,33 +120,69 @@ def list_transactions(
     if end_date is not None:
         filters.append(Transaction.date <= end_date)
     if _has_non_empty_string(search):
-        term = f"%{search.strip()}%"
-        filters.append(
+        search_filter, rank = build_search_clause(db, search.strip())
+        filters.append(search_filter)
+
+    base_query = select(Transaction).where(*filters)
+    order_by = [Transaction.date.desc(), Transaction.id.desc()]
+    ranked = sort == "relevance" and rank is not None
+    if ranked:
+        if cursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El cursor sólo está disponible con orden por fecha",
+            )
+        order_by.insert(0, rank.desc())
+
+    if cursor:
+        # Keyset pagination: seek past the last (date, id) of the previous page
+        # instead of skipping ``offset`` rows.
+        try:
+            cursor_date, cursor_id = decode_transaction_cursor(cursor)
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido"
+            ) from exc
+        base_query = base_query.where(
             or_(
-                Transaction.description.ilike(term),
-                Transaction.notes.ilike(term),
+                Transaction.date < cursor_date,
+                and_(Transaction.date == cursor_date, Transaction.id < cursor_id),
             )
         )
+        offset = 0
 
-    base_query = select(Transaction).where(*filters)
-
-    stmt = (
-        base_query.order_by(Transaction.date.desc(), Transaction.id.desc())
-        .limit(limit)
-        .offset(offset)
-    )
+    stmt = base_query.order_by(*order_by).limit(limit + 1).offset(offset)
     items = db.scalars(stmt).all()
-
-    total_stmt = select(func.count()).select_from(Transaction).where(*filters)
-    total = db.scalar(total_stmt) or 0
-    has_more = offset + len(items) < total
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    next_cursor: str | None = None
+    if has_more and items and not ranked:
+        last_item = items[-1]
+        next_cursor = encode_transaction_cursor(last_item.date, last_item.id)
+
+    total: int | None = None
+    total_estimated = False
+    if include_total == "estimate":
+        total = estimate_transaction_count(db, filters)
+        total_estimated = total is not None
+    if include_total == "exact" or (include_total == "estimate" and total is None):
+        cache_key = (
+            account_id,
+            start_date,
+            end_date,
+            search.strip() if _has_non_empty_string(search) else None,
+        )
+        total = count_transactions(db, filters, cache_key)
 
     return TransactionPage(
         items=items,
         total=total,
+        total_estimated=total_estimated,
         limit=limit,
         offset=offset,
         has_more=has_more,
+        next_cursor=next_cursor,
     )
 
 
@@ -129,8 +218,328 @@ def delete_tx(tx_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/billing/sync")
-def sync_billing_transactions(limit: int = 100, db: Session = Depends(get_db)):
-    billing_account = db.scalar(select(Account).where(Account.is_billing == True))
+def sync_billing_transactions(
+    limit: int = 100,
+    drain: bool = False,
+    max_pages: int = BILLING_DRAIN_MAX_PAGES,
+    db: Session = Depends(get_db),
+):
+    # Shares the lock of the scheduled sync so both never apply the same feed.
+    with billing_sync_lock() as acquired:
+        if not acquired:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ya hay una sincronización de facturación en curso",
+            )
+        return run_billing_sync(db, limit=limit, drain=drain, max_pages=max_pages)
+
+
+@router.post("/billing/sync-async")
+async def sync_billing_transactions_async(
+    limit: int = 100,
+    drain: bool = False,
+    max_pages: int = BILLING_DRAIN_MAX_PAGES,
+    wait: bool = True,
+):
+    """Non-blocking variant of the sync: HTTP calls are awaited on the event
+    loop and database work runs on the bounded billing executor.
+
+    With ``wait=false`` the sync runs in the background and the response is
+    ``202`` with a job id to poll at ``/transactions/billing/sync-jobs/{id}``.
+    Jobs live in the memory of the worker that started them, so only clients
+    that reach that worker again can poll them.
+    """
+
+    if wait:
+        return await _run_billing_sync_async(limit, drain, max_pages)
+
+    job = billing_sync_jobs.create()
+    job_id = job["job_id"]
+
+    async def run_job() -> None:
+        billing_sync_jobs.update(job_id, status="running")
+        try:
+            result = await _run_billing_sync_async(limit, drain, max_pages)
+        except HTTPException as exc:
+            billing_sync_jobs.update(
+                job_id,
+                status="failed",
+                error={"status_code": exc.status_code, "detail": exc.detail},
+            )
+        except Exception:  # pragma: no cover - defensive
+            LOGGER.exception("Billing sync job %s failed", job_id)
+            billing_sync_jobs.update(
+                job_id,
+                status="failed",
+                error={
+                    "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "detail": "No se pudo completar la sincronización de facturación",
+                },
+            )
+        else:
+            billing_sync_jobs.update(job_id, status="done", result=result)
+
+    billing_sync_jobs.attach(job_id, asyncio.create_task(run_job()))
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "job_id": job_id,
+            "status": job["status"],
+            "status_url": f"{router.prefix}/billing/sync-jobs/{job_id}",
+        },
+    )
+
+
+@router.get("/billing/sync-jobs/{job_id}")
+def get_billing_sync_job(job_id: str):
+    job = billing_sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sincronización no encontrada",
+        )
+    return job
+
+
+@router.post("/billing/webhook")
+async def receive_billing_webhook(request: Request):
+    """Apply a batch of ``transaction_events`` pushed by the billing service.
+
+    Signed like inbound notifications (``X-Timestamp`` and ``X-Signature``)
+    and applied with the same per-event rules as the sync, so the push and
+    the polled feed can deliver the same events in any order. While another
+    sync holds the lock the push waits for it, up to
+    ``BILLING_WEBHOOK_LOCK_WAIT_SECONDS``, and then answers ``503`` with
+    ``Retry-After``. The wait happens on the event loop, so waiting pushes
+    leave the database executor to the sync they are waiting on.
+    """
+
+    body = await request.body()
+    timestamp = request.headers.get("X-Timestamp")
+    signature = request.headers.get("X-Signature")
+    if not (timestamp and signature):
+        raise HTTPException(status_code=400, detail="Headers faltantes")
+    try:
+        validate_timestamp(timestamp)
+    except ValueError as exc:
+        raise HTTPException(status_code=401, detail="Timestamp inválido") from exc
+    if not verify_signature(_billing_webhook_secret(), timestamp, body, signature):
+        raise HTTPException(status_code=401, detail="Firma inválida")
+
+    loop = asyncio.get_running_loop()
+
+    def run_db(func, *args):
+        return loop.run_in_executor(billing_db_executor, partial(func, *args))
+
+    deadline = loop.time() + _billing_webhook_lock_wait_seconds()
+    while True:
+        lock = billing_sync_lock()
+        if await run_db(lock.__enter__):
+            break
+        await run_db(lock.__exit__, None, None, None)
+        if loop.time() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Ya hay una sincronización de facturación en curso",
+                headers={"Retry-After": str(BILLING_WEBHOOK_RETRY_AFTER_SECONDS)},
+            )
+        await asyncio.sleep(BILLING_WEBHOOK_LOCK_POLL_SECONDS)
+    try:
+        return await run_db(_ingest_billing_push, body)
+    finally:
+        await run_db(lock.__exit__, None, None, None)
+
+
+@router.get(
+    "/billing/sync-runs",
+    response_model=BillingSyncRunHistory,
+    dependencies=[Depends(require_admin)],
+)
+def list_billing_sync_runs(limit: int = 100, db: Session = Depends(get_db)):
+    """Latest sync runs, newest first, with percentiles over the same runs."""
+
+    limit = max(1, min(limit, 1000))
+    runs = db.scalars(
+        select(BillingSyncRun)
+        .order_by(BillingSyncRun.started_at.desc(), BillingSyncRun.id.desc())
+        .limit(limit)
+    ).all()
+    return {"runs": runs, "stats": billing_sync_run_stats(runs)}
+
+
+def run_billing_sync(
+    db: Session,
+    limit: int = 100,
+    drain: bool = False,
+    max_pages: int = BILLING_DRAIN_MAX_PAGES,
+    trigger: str = "manual",
+) -> dict:
+    """Sync the billing feed; callers must hold :func:`billing_sync_lock`.
+
+    Every run, successful or not, is stored in ``billing_sync_runs``.
+    """
+
+    billing_account, feed_url, ack_url, headers = _load_billing_sync_config(db)
+    transactions_limit = max(1, min(limit or 100, 500))
+    max_pages = max(1, min(max_pages or BILLING_DRAIN_MAX_PAGES, 500)) if drain else 1
+    deadline = time.monotonic() + _billing_drain_seconds()
+    run = _BillingSyncRun(trigger)
+    try:
+        while not run.done:
+            response_payload, feed = _sync_billing_page(
+                db, run, billing_account, feed_url, ack_url, headers, transactions_limit
+            )
+            run.add_page(response_payload, feed, max_pages, deadline)
+    except Exception as exc:
+        db.rollback()
+        _store_billing_sync_run(db, run.record(exc))
+        raise
+    _store_billing_sync_run(db, run.record())
+    return run.response() if drain else response_payload
+
+
+async def _run_billing_sync_async(limit: int, drain: bool, max_pages: int) -> dict:
+    """Async counterpart of :func:`run_billing_sync`, taking the sync lock itself."""
+
+    loop = asyncio.get_running_loop()
+
+    def run_db(func, *args):
+        return loop.run_in_executor(billing_db_executor, partial(func, *args))
+
+    lock = billing_sync_lock()
+    acquired = await run_db(lock.__enter__)
+    try:
+        if not acquired:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ya hay una sincronización de facturación en curso",
+            )
+        db = SessionLocal()
+        try:
+            billing_account, feed_url, ack_url, headers = await run_db(
+                _load_billing_sync_config, db
+            )
+            transactions_limit = max(1, min(limit or 100, 500))
+            max_pages = max(1, min(max_pages or BILLING_DRAIN_MAX_PAGES, 500)) if drain else 1
+            deadline = time.monotonic() + _billing_drain_seconds()
+            run = _BillingSyncRun("async")
+            try:
+                while not run.done:
+                    run.start_page()
+                    response, body = await _download_billing_feed_async(
+                        feed_url,
+                        headers,
+                        transactions_limit,
+                        transactions_limit,
+                        billing_account.billing_last_changes_confirmed_id,
+                    )
+                    run.received(body.size if body is not None else 0)
+                    run.lap("fetch")
+                    try:
+                        feed = await run_db(_parse_billing_feed, response, body)
+                        run.lap("parse")
+                        counters = await run_db(_apply_billing_feed, db, billing_account, feed)
+                        run.lap("apply")
+                    finally:
+                        if body is not None:
+                            body.close()
+                    await run_db(_commit_billing_feed, db)
+                    run.lap("commit")
+                    ack_data = await _acknowledge_billing_feed_async(ack_url, headers, feed)
+                    run.lap("ack")
+                    response_payload = await run_db(
+                        _record_billing_ack, db, billing_account, feed, ack_data, counters
+                    )
+                    run.lap("commit")
+                    run.add_page(response_payload, feed, max_pages, deadline)
+            except Exception as exc:
+                await run_db(db.rollback)
+                await run_db(_store_billing_sync_run, db, run.record(exc))
+                raise
+            await run_db(_store_billing_sync_run, db, run.record())
+            return run.response() if drain else response_payload
+        finally:
+            await run_db(db.close)
+    finally:
+        await run_db(lock.__exit__, None, None, None)
+
+
+def _ingest_billing_push(body: bytes) -> dict:
+    """Apply a pushed batch and record it as a ``webhook`` run.
+
+    Callers must hold :func:`billing_sync_lock`.
+    """
+
+    with SessionLocal() as db:
+        billing_account = _billing_account_row(db)
+        if not billing_account:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No hay una cuenta de facturación configurada",
+            )
+
+        run = _BillingSyncRun("webhook")
+        run.received(len(body))
+        try:
+            try:
+                feed = _index_billing_feed(body)
+            except (TypeError, ValueError) as exc:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Payload inválido",
+                ) from exc
+            # Checkpoints and export changes belong to the polled feed; a
+            # push only carries events.
+            feed = feed._replace(
+                remote_changes=(),
+                transactions_checkpoint=None,
+                transactions_confirmed=None,
+                changes_checkpoint=None,
+                changes_confirmed=None,
+                has_more=False,
+            )
+            run.lap("parse")
+            counters = _apply_billing_feed(db, billing_account, feed)
+            run.lap("apply")
+            _commit_billing_feed(db)
+            run.lap("commit")
+        except Exception as exc:
+            db.rollback()
+            _store_billing_sync_run(db, run.record(exc))
+            # Invalid events are the sender's fault here, not an upstream failure.
+            if (
+                isinstance(exc, HTTPException)
+                and exc.status_code == status.HTTP_502_BAD_GATEWAY
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=exc.detail,
+                ) from exc
+            raise
+
+        response_payload = {
+            "nuevos": counters["created"],
+            "modificados": counters["updated"],
+            "eliminados": counters["deleted"],
+            "message": _build_sync_summary(
+                counters["created"], counters["updated"], counters["deleted"]
+            ),
+        }
+        run.add_page(response_payload, feed, 1, time.monotonic())
+        _store_billing_sync_run(db, run.record())
+        return response_payload
+
+
+def _billing_account_row(db: Session) -> Account | None:
+    """The billing account row, found through the metadata cache by primary key."""
+
+    meta = billing_account_meta(db)
+    account = db.get(Account, meta.id) if meta else None
+    return account if account is not None and account.is_billing else None
+
+
+def _load_billing_sync_config(db: Session) -> tuple[Account, str, str, dict[str, str]]:
+    billing_account = _billing_account_row(db)
     if not billing_account:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -150,224 +559,430 @@ def sync_billing_transactions(limit: int = 100, db: Session = Depends(get_db)):
             detail="BILLING_API_KEY no está configurado",
         )
 
-    feed_url = _build_billing_feed_url(base_url)
-    ack_url = _build_billing_ack_url(base_url)
-    headers = {"X-API-Key": api_key}
-    transactions_limit = max(1, min(limit or 100, 500))
-    changes_limit = transactions_limit
-    changes_since = billing_account.billing_last_changes_confirmed_id
-
-    (
-        transaction_events,
-        remote_changes,
-        transactions_checkpoint,
-        transactions_confirmed,
-        changes_checkpoint,
-        changes_confirmed,
-    ) = _fetch_billing_feed(
-        feed_url,
-        headers,
-        transactions_limit,
-        changes_limit,
-        changes_since,
+    return (
+        billing_account,
+        _build_billing_feed_url(base_url),
+        _build_billing_ack_url(base_url),
+        {"X-API-Key": api_key},
     )
 
-    counters = {"created": 0, "updated": 0, "deleted": 0}
 
-    now = datetime.now(timezone.utc)
-    if transactions_confirmed is not None:
-        billing_account.billing_last_transactions_confirmed_id = transactions_confirmed
-    if changes_confirmed is not None:
-        billing_account.billing_last_changes_confirmed_id = changes_confirmed
+class _BillingFeed(NamedTuple):
+    transaction_events: FeedArray
+    remote_changes: FeedArray
+    transactions_checkpoint: int | None
+    transactions_confirmed: int | None
+    changes_checkpoint: int | None
+    changes_confirmed: int | None
+    has_more: bool | None
+
+
+class _BillingSyncRun:
+    """Accumulates the pages, counters and phase timings of one sync.
+
+    Also decides when a drain-mode sync stops; a plain sync is a drain of
+    one page.
+    """
+
+    def __init__(self, trigger: str) -> None:
+        self.trigger = trigger
+        self.started_at = datetime.now(timezone.utc)
+        self.counters = {"created": 0, "updated": 0, "deleted": 0}
+        self.phases_ms = dict.fromkeys(BILLING_SYNC_PHASES, 0.0)
+        self.bytes_received = 0
+        self.pages: list[dict] = []
+        self.response_payload: dict = {}
+        self.caught_up = False
+        self.done = False
+        self._previous_checkpoints = None
+        self._page_ms = dict.fromkeys(BILLING_SYNC_PHASES, 0.0)
+        self._page_bytes = 0
+        self._lap_started = time.perf_counter()
+
+    def start_page(self) -> None:
+        self._page_ms = dict.fromkeys(BILLING_SYNC_PHASES, 0.0)
+        self._page_bytes = 0
+        self._lap_started = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """Charge the time since the previous lap to ``phase``."""
+
+        now = time.perf_counter()
+        elapsed = (now - self._lap_started) * 1000
+        self._page_ms[phase] += elapsed
+        self.phases_ms[phase] += elapsed
+        self._lap_started = now
+
+    def received(self, size: int) -> None:
+        self._page_bytes += size
+        self.bytes_received += size
+
+    def add_page(
+        self, response_payload: dict, feed: _BillingFeed, max_pages: int, deadline: float
+    ) -> None:
+        self.response_payload = response_payload
+        self.counters["created"] += response_payload["nuevos"]
+        self.counters["updated"] += response_payload["modificados"]
+        self.counters["deleted"] += response_payload["eliminados"]
+        page = _billing_page_info(feed, self._page_ms, self._page_bytes)
+        self.pages.append(page)
+        self.caught_up = page["caught_up"]
+        checkpoints = (feed.transactions_checkpoint, feed.changes_checkpoint)
+        # A page that does not move the checkpoints means the feed is not
+        # advancing; stop instead of fetching it again.
+        self.done = (
+            self.caught_up
+            or checkpoints == self._previous_checkpoints
+            or len(self.pages) >= max_pages
+            or time.monotonic() >= deadline
+        )
+        self._previous_checkpoints = checkpoints
+
+    def response(self) -> dict:
+        counters = self.counters
+        return {
+            **self.response_payload,
+            "nuevos": counters["created"],
+            "modificados": counters["updated"],
+            "eliminados": counters["deleted"],
+            "message": _build_sync_summary(
+                counters["created"], counters["updated"], counters["deleted"]
+            ),
+            "drained": self.caught_up,
+            "pages": self.pages,
+        }
+
+    def record(self, error: Exception | None = None) -> BillingSyncRun:
+        """Build the history row of the run; pages that failed midway are
+        not counted, but the time spent on them is."""
+
+        error_detail = None
+        if isinstance(error, HTTPException):
+            error_detail = str(error.detail)
+        elif error is not None:
+            error_detail = str(error) or type(error).__name__
+        return BillingSyncRun(
+            trigger=self.trigger,
+            status="failed" if error is not None else "success",
+            started_at=self.started_at,
+            finished_at=datetime.now(timezone.utc),
+            pages=len(self.pages),
+            created_count=self.counters["created"],
+            updated_count=self.counters["updated"],
+            deleted_count=self.counters["deleted"],
+            bytes_received=self.bytes_received,
+            error_detail=error_detail,
+            **{f"{phase}_ms": round(ms) for phase, ms in self.phases_ms.items()},
+        )
 
-    staged_transactions: dict[int, Transaction] = {}
-    staged_sync_states: dict[int, BillingTransactionSyncState] = {}
-    deleted_transactions: set[int] = set()
 
+def _store_billing_sync_run(db: Session, run: BillingSyncRun) -> None:
+    # The history is best effort: failing to store it must neither fail the
+    # sync nor hide the error that ended it.
     try:
-        for change in transaction_events:
-            if not isinstance(change, dict):
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail="Evento inválido recibido desde facturación",
-                )
+        prune_billing_sync_runs(db)
+        db.add(run)
+        db.commit()
+    except Exception:
+        db.rollback()
+        LOGGER.exception("Could not store the billing sync run")
 
-            event = (change.get("event") or "").lower()
-            if event not in counters:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail="Evento desconocido recibido desde facturación",
-                )
 
-            event_id = _parse_remote_identifier(change.get("id"), "transaction_events[].id")
-            if event_id is None:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail="Evento recibido sin identificador válido",
-                )
+def _sync_billing_page(
+    db: Session,
+    run: _BillingSyncRun,
+    billing_account: Account,
+    feed_url: str,
+    ack_url: str,
+    headers: dict[str, str],
+    transactions_limit: int,
+) -> tuple[dict, _BillingFeed]:
+    """Fetch, apply, commit and acknowledge one page of the billing feed.
 
-            payload = change.get("transaction")
-            remote_id = _parse_remote_identifier(
-                change.get("transaction_id"), "transaction_id"
-            )
-            if remote_id is None and isinstance(payload, dict):
-                remote_id = _parse_remote_identifier(payload.get("id"), "transaction.id")
-            if remote_id is None:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail="Movimiento recibido sin identificador válido",
-                )
+    Returns the response payload of the page and the parsed feed; phase
+    timings are charged to ``run``.
+    """
+
+    run.start_page()
+    response, body = _download_billing_feed(
+        feed_url,
+        headers,
+        transactions_limit,
+        transactions_limit,
+        billing_account.billing_last_changes_confirmed_id,
+    )
+    run.received(body.size if body is not None else 0)
+    run.lap("fetch")
+    try:
+        feed = _parse_billing_feed(response, body)
+        run.lap("parse")
+        counters = _apply_billing_feed(db, billing_account, feed)
+        run.lap("apply")
+    finally:
+        # The events are applied; only the checkpoints, already decoded, and
+        # the item counts of the feed are used from here on.
+        if body is not None:
+            body.close()
+    _commit_billing_feed(db)
+    run.lap("commit")
+    ack_data = _acknowledge_billing_feed(ack_url, headers, feed)
+    run.lap("ack")
+    response_payload = _record_billing_ack(db, billing_account, feed, ack_data, counters)
+    run.lap("commit")
+    return response_payload, feed
+
+
+def _billing_page_info(
+    feed: _BillingFeed, phases_ms: dict[str, float], bytes_received: int
+) -> dict:
+    caught_up = (
+        feed.has_more is False
+        or (not feed.transaction_events and not feed.remote_changes)
+        or (
+            feed.transactions_checkpoint in (None, feed.transactions_confirmed)
+            and feed.changes_checkpoint in (None, feed.changes_confirmed)
+        )
+    )
+    return {
+        "events": len(feed.transaction_events),
+        "changes": len(feed.remote_changes),
+        "bytes": bytes_received,
+        **{f"{phase}_ms": round(ms, 1) for phase, ms in phases_ms.items()},
+        "caught_up": caught_up,
+    }
+
+
+def _apply_billing_feed(
+    db: Session, billing_account: Account, feed: _BillingFeed
+) -> dict[str, int]:
+    """Apply the events of a fetched page without committing; return the counters."""
+
+    counters = {"created": 0, "updated": 0, "deleted": 0}
 
-            if remote_id in deleted_transactions:
-                continue
+    if feed.transactions_confirmed is not None:
+        billing_account.billing_last_transactions_confirmed_id = feed.transactions_confirmed
+    if feed.changes_confirmed is not None:
+        billing_account.billing_last_changes_confirmed_id = feed.changes_confirmed
 
-            applied_event = False
-            existing_tx = staged_transactions.get(remote_id)
-            if existing_tx is None:
-                existing_tx = db.scalar(
-                    select(Transaction)
-                    .where(Transaction.account_id == billing_account.id)
-                    .where(Transaction.billing_transaction_id == remote_id)
+    try:
+        # Events are decoded a chunk at a time, so a page never sits in memory
+        # decoded as a whole. The rows each chunk can touch are loaded with two
+        # IN queries instead of looking each event up on its own; events are
+        # then folded in memory and written back with bulk statements.
+        stored_transactions: dict[int, dict] = {}
+        staged_sync_states: dict[int, dict] = {}
+        staged_transactions: dict[int, dict] = {}
+        deleted_transactions: set[int] = set()
+        touched_states: set[int] = set()
+        applied_events: list[tuple[int, str]] = []
+        loaded_ids: set[int] = set()
+
+        parsed_events = _parse_transaction_events(feed.transaction_events)
+        while chunk := list(islice(parsed_events, BILLING_APPLY_CHUNK_SIZE)):
+            remote_ids = {remote_id for _, _, remote_id, _ in chunk} - loaded_ids
+            if remote_ids:
+                loaded_ids |= remote_ids
+                _load_billing_rows(
+                    db, billing_account.id, remote_ids, stored_transactions, staged_sync_states
+                )
+                staged_transactions.update(
+                    (remote_id, dict(stored_transactions[remote_id]))
+                    for remote_id in remote_ids
+                    if remote_id in stored_transactions
                 )
-                if existing_tx is not None:
-                    staged_transactions[remote_id] = existing_tx
 
-            sync_state = staged_sync_states.get(remote_id)
-            if sync_state is None:
-                sync_state = db.get(BillingTransactionSyncState, remote_id)
-                if sync_state is not None:
-                    staged_sync_states[remote_id] = sync_state
+            for event, event_id, remote_id, payload in chunk:
+                if remote_id in deleted_transactions:
+                    continue
 
-            last_applied_event_id = sync_state.updated_at_event_id if sync_state else 0
-            if event_id < last_applied_event_id:
-                continue
+                applied_event = False
+                existing_tx = staged_transactions.get(remote_id)
+                sync_state = staged_sync_states.get(remote_id)
 
-            if event == "deleted":
-                if existing_tx:
-                    tx_state = inspect(existing_tx)
-                    if tx_state.pending:
-                        db.expunge(existing_tx)
-                    else:
-                        db.delete(existing_tx)
-                    staged_transactions.pop(remote_id, None)
-                    applied_event = True
+                last_applied_event_id = sync_state["updated_at_event_id"] if sync_state else 0
+                if event_id < last_applied_event_id:
+                    continue
 
                 if sync_state is None:
-                    sync_state = BillingTransactionSyncState(transaction_id=remote_id)
+                    sync_state = {
+                        "transaction_id": remote_id,
+                        "exportable_movement_id": None,
+                        "is_custom_inkwell": False,
+                    }
                     staged_sync_states[remote_id] = sync_state
-                sync_state.status = "unavailable"
-                sync_state.updated_at_event_id = event_id
-                db.add(sync_state)
-                deleted_transactions.add(remote_id)
-            else:
-                if not isinstance(payload, dict):
-                    raise HTTPException(
-                        status_code=status.HTTP_502_BAD_GATEWAY,
-                        detail="Formato de evento inválido desde facturación",
-                    )
+                touched_states.add(remote_id)
 
-                tx_date = _parse_remote_date(payload.get("date"), remote_id)
-                amount = _parse_remote_amount(payload.get("amount"), remote_id)
-
-                description_source = payload.get("description")
-                if _has_non_empty_string(description_source):
-                    description = description_source.strip()
-                elif existing_tx and existing_tx.description is not None:
-                    description = existing_tx.description
-                else:
-                    raise HTTPException(
-                        status_code=status.HTTP_502_BAD_GATEWAY,
-                        detail=(
-                            "Descripción faltante para el movimiento recibido"
-                        ),
-                    )
+                if event == "deleted":
+                    if existing_tx:
+                        staged_transactions.pop(remote_id, None)
+                        applied_event = True
 
-                notes_source = payload.get("notes")
-                if _has_non_empty_string(notes_source):
-                    notes = notes_source
-                elif existing_tx and existing_tx.notes is not None:
-                    notes = existing_tx.notes
+                    sync_state["status"] = "unavailable"
+                    sync_state["updated_at_event_id"] = event_id
+                    deleted_transactions.add(remote_id)
                 else:
-                    notes = ""
-
-                if existing_tx:
-                    existing_tx.date = tx_date
-                    existing_tx.amount = amount
-                    tx_state = inspect(existing_tx)
-                    should_update_description = tx_state.pending or not _has_non_empty_string(
-                        existing_tx.description
+                    if not isinstance(payload, dict):
+                        raise HTTPException(
+                            status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail="Formato de evento inválido desde facturación",
+                        )
+
+                    tx_date = _parse_remote_date(payload.get("date"), remote_id)
+                    amount = _parse_remote_amount(payload.get("amount"), remote_id)
+
+                    description_source = payload.get("description")
+                    if _has_non_empty_string(description_source):
+                        description = description_source.strip()
+                    elif existing_tx and existing_tx["description"] is not None:
+                        description = existing_tx["description"]
+                    else:
+                        raise HTTPException(
+                            status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail=(
+                                "Descripción faltante para el movimiento recibido"
+                            ),
+                        )
+
+                    notes_source = payload.get("notes")
+                    if _has_non_empty_string(notes_source):
+                        notes = notes_source
+                    elif existing_tx and existing_tx["notes"] is not None:
+                        notes = existing_tx["notes"]
+                    else:
+                        notes = ""
+
+                    if existing_tx:
+                        existing_tx["date"] = tx_date
+                        existing_tx["amount"] = amount
+                        should_update_description = (
+                            remote_id not in stored_transactions
+                            or not _has_non_empty_string(existing_tx["description"])
+                        )
+                        if should_update_description:
+                            existing_tx["description"] = description
+                        existing_tx["notes"] = notes
+                    else:
+                        staged_transactions[remote_id] = {
+                            "billing_transaction_id": remote_id,
+                            "date": tx_date,
+                            "amount": amount,
+                            "description": description,
+                            "notes": notes,
+                        }
+
+                    exportable_movement_id = _parse_remote_identifier(
+                        payload.get("exportable_movement_id"), "transaction.exportable_movement_id"
                     )
-                    if should_update_description:
-                        existing_tx.description = description
-                    existing_tx.notes = notes
-                    db.add(existing_tx)
-                else:
-                    new_tx = Transaction(
-                        account_id=billing_account.id,
-                        date=tx_date,
-                        description=description,
-                        amount=amount,
-                        notes=notes,
-                        billing_transaction_id=remote_id,
+                    is_custom_inkwell = bool(payload.get("is_custom_inkwell") is True)
+                    sync_state["exportable_movement_id"] = exportable_movement_id
+                    sync_state["is_custom_inkwell"] = is_custom_inkwell
+                    sync_state["status"] = _resolve_sync_status(
+                        exportable_movement_id=exportable_movement_id,
+                        is_custom_inkwell=is_custom_inkwell,
                     )
-                    db.add(new_tx)
-                    staged_transactions[remote_id] = new_tx
-
-                if sync_state is None:
-                    sync_state = BillingTransactionSyncState(transaction_id=remote_id)
-                    staged_sync_states[remote_id] = sync_state
+                    sync_state["updated_at_event_id"] = event_id
+                    applied_event = True
 
-                exportable_movement_id = _parse_remote_identifier(
-                    payload.get("exportable_movement_id"), "transaction.exportable_movement_id"
-                )
-                is_custom_inkwell = bool(payload.get("is_custom_inkwell") is True)
-                sync_state.exportable_movement_id = exportable_movement_id
-                sync_state.is_custom_inkwell = is_custom_inkwell
-                sync_state.status = _resolve_sync_status(
-                    exportable_movement_id=exportable_movement_id,
-                    is_custom_inkwell=is_custom_inkwell,
-                )
-                sync_state.updated_at_event_id = event_id
-                db.add(sync_state)
-                applied_event = True
+                if applied_event:
+                    applied_events.append((remote_id, event))
 
-            if applied_event:
+        accepted_ids = _write_billing_batch(
+            db,
+            billing_account.id,
+            {remote_id: staged_sync_states[remote_id] for remote_id in touched_states},
+            stored_transactions,
+            staged_transactions,
+        )
+        for remote_id, event in applied_events:
+            if remote_id in accepted_ids:
                 counters[event] += 1
 
         # Procesamos los cambios de exportación sólo para confirmar checkpoints
-        for change in remote_changes:
+        for change in feed.remote_changes:
             if not isinstance(change, dict):
                 raise HTTPException(
                     status_code=status.HTTP_502_BAD_GATEWAY,
                     detail="Cambio inválido recibido desde facturación",
                 )
-
-        db.commit()
     except HTTPException:
         db.rollback()
         raise
+    except json.JSONDecodeError as exc:
+        # Items are only decoded here; the indexing pass checks the structure.
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Respuesta inválida del servicio de facturación",
+        ) from exc
     except Exception as exc:  # pragma: no cover - defensive
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="No se pudieron guardar los movimientos de facturación",
         ) from exc
+    return counters
+
+
+def _load_billing_rows(
+    db: Session,
+    account_id: int,
+    remote_ids: set[int],
+    stored_transactions: dict[int, dict],
+    sync_states: dict[int, dict],
+) -> None:
+    """Add the stored transactions and sync states of ``remote_ids`` to the maps."""
+
+    stored_transactions.update(
+        (row.billing_transaction_id, dict(row._mapping))
+        for row in db.execute(
+            select(
+                Transaction.billing_transaction_id,
+                Transaction.date,
+                Transaction.amount,
+                Transaction.description,
+                Transaction.notes,
+            )
+            .where(Transaction.account_id == account_id)
+            .where(Transaction.billing_transaction_id.in_(remote_ids))
+        )
+    )
+    sync_states.update(
+        (row.transaction_id, dict(row._mapping))
+        for row in db.execute(
+            select(
+                BillingTransactionSyncState.transaction_id,
+                BillingTransactionSyncState.exportable_movement_id,
+                BillingTransactionSyncState.is_custom_inkwell,
+                BillingTransactionSyncState.status,
+                BillingTransactionSyncState.updated_at_event_id,
+            ).where(BillingTransactionSyncState.transaction_id.in_(remote_ids))
+        )
+    )
 
-    ack_data: dict = {}
-    pending_transactions_checkpoint = transactions_checkpoint
-    pending_changes_checkpoint = changes_checkpoint
 
-    if (
-        pending_transactions_checkpoint is not None
-        or pending_changes_checkpoint is not None
-    ):
-        ack_data = _acknowledge_billing_checkpoint(
-            ack_url,
-            headers,
-            pending_transactions_checkpoint,
-            pending_changes_checkpoint,
-        )
+def _commit_billing_feed(db: Session) -> None:
+    try:
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No se pudieron guardar los movimientos de facturación",
+        ) from exc
 
+
+def _record_billing_ack(
+    db: Session,
+    billing_account: Account,
+    feed: _BillingFeed,
+    ack_data: dict,
+    counters: dict[str, int],
+) -> dict:
+    """Store the acknowledged checkpoints and build the response of the page."""
+
+    now = datetime.now(timezone.utc)
+    pending_transactions_checkpoint = feed.transactions_checkpoint
+    pending_changes_checkpoint = feed.changes_checkpoint
     last_transaction = None
     last_change = None
     if ack_data:
@@ -379,9 +994,9 @@ def sync_billing_transactions(limit: int = 100, db: Session = Depends(get_db)):
         )
 
     if last_transaction is None:
-        last_transaction = transactions_confirmed
+        last_transaction = feed.transactions_confirmed
     if last_change is None:
-        last_change = changes_confirmed
+        last_change = feed.changes_confirmed
 
     timestamps = []
     if ack_data:
@@ -442,6 +1057,142 @@ def sync_billing_transactions(limit: int = 100, db: Session = Depends(get_db)):
     return response_payload
 
 
+def _write_billing_batch(
+    db: Session,
+    account_id: int,
+    sync_states: dict[int, dict],
+    stored_transactions: dict[int, dict],
+    staged_transactions: dict[int, dict],
+) -> set[int]:
+    """Persist a folded billing batch with bulk statements.
+
+    Sync states are upserted first and only rows whose stored
+    ``updated_at_event_id`` is not newer than the batch are accepted; the
+    transactions of any other remote id are left untouched so a stale batch
+    never overwrites a concurrent, newer one. Returns the accepted remote ids.
+    """
+
+    if not sync_states:
+        return set()
+
+    bind = db.get_bind()
+    state_table = BillingTransactionSyncState.__table__
+    upsert_states = dialect_insert(bind, state_table).values(list(sync_states.values()))
+    excluded = upsert_states.excluded
+    upsert_states = upsert_states.on_conflict_do_update(
+        index_elements=[state_table.c.transaction_id],
+        set_={
+            "exportable_movement_id": excluded.exportable_movement_id,
+            "is_custom_inkwell": excluded.is_custom_inkwell,
+            "status": excluded.status,
+            "updated_at_event_id": excluded.updated_at_event_id,
+            "updated_at": func.now(),
+        },
+        where=state_table.c.updated_at_event_id <= excluded.updated_at_event_id,
+    ).returning(state_table.c.transaction_id)
+    accepted_ids = set(db.scalars(upsert_states))
+
+    tx_table = Transaction.__table__
+    removed_ids = []
+    upserted_rows = []
+    for remote_id in accepted_ids:
+        stored = stored_transactions.get(remote_id)
+        staged = staged_transactions.get(remote_id)
+        if stored == staged:
+            continue
+        if staged is None:
+            removed_ids.append(remote_id)
+        else:
+            upserted_rows.append({**staged, "account_id": account_id})
+
+    written_ids: set[int] = set()
+    if removed_ids:
+        written_ids.update(
+            db.execute(
+                delete(Transaction)
+                .where(Transaction.account_id == account_id)
+                .where(Transaction.billing_transaction_id.in_(removed_ids))
+                .returning(Transaction.billing_transaction_id)
+            ).scalars()
+        )
+    if upserted_rows:
+        upsert_transactions = dialect_insert(bind, tx_table).values(upserted_rows)
+        excluded = upsert_transactions.excluded
+        # A remote id already stored under another account is left alone and
+        # not returned.
+        written_ids.update(
+            db.execute(
+                upsert_transactions.on_conflict_do_update(
+                    index_elements=[tx_table.c.billing_transaction_id],
+                    index_where=tx_table.c.billing_transaction_id.isnot(None),
+                    set_={
+                        "date": excluded.date,
+                        "amount": excluded.amount,
+                        "description": excluded.description,
+                        "notes": excluded.notes,
+                    },
+                    where=tx_table.c.account_id == excluded.account_id,
+                ).returning(tx_table.c.billing_transaction_id)
+            ).scalars()
+        )
+
+    # Core statements bypass the session hooks that maintain the rollup and
+    # the table versions, so both follow the rows actually written.
+    deltas: dict[tuple[int, date], Decimal] = defaultdict(Decimal)
+    for remote_id in written_ids:
+        stored = stored_transactions.get(remote_id)
+        staged = staged_transactions.get(remote_id)
+        if stored is not None:
+            deltas[(account_id, stored["date"])] -= stored["amount"]
+        if staged is not None:
+            deltas[(account_id, staged["date"])] += staged["amount"]
+    apply_balance_deltas(db.connection(), deltas)
+    if written_ids:
+        bump_table_versions(db.connection(), ["transactions"])
+    return accepted_ids
+
+
+def _parse_transaction_events(
+    transaction_events: Iterable,
+) -> Iterator[tuple[str, int, int, dict | None]]:
+    """Validate each feed event as it is read.
+
+    Yields ``(event, event_id, remote_id, payload)``.
+    """
+
+    for change in transaction_events:
+        if not isinstance(change, dict):
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Evento inválido recibido desde facturación",
+            )
+
+        event = (change.get("event") or "").lower()
+        if event not in ("created", "updated", "deleted"):
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Evento desconocido recibido desde facturación",
+            )
+
+        event_id = _parse_remote_identifier(change.get("id"), "transaction_events[].id")
+        if event_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Evento recibido sin identificador válido",
+            )
+
+        payload = change.get("transaction")
+        remote_id = _parse_remote_identifier(change.get("transaction_id"), "transaction_id")
+        if remote_id is None and isinstance(payload, dict):
+            remote_id = _parse_remote_identifier(payload.get("id"), "transaction.id")
+        if remote_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Movimiento recibido sin identificador válido",
+            )
+        yield event, event_id, remote_id, payload
+
+
 def _build_billing_feed_url(base_url: str) -> str:
     return base_url.rstrip("/")
 
@@ -450,105 +1201,140 @@ def _build_billing_ack_url(base_url: str) -> str:
     return _build_billing_feed_url(base_url)
 
 
-def _fetch_billing_feed(
-    endpoint: str,
-    headers: dict[str, str],
-    transactions_limit: int,
-    changes_limit: int,
-    changes_since: int | None,
-) -> tuple[
-    list[dict],
-    list[dict],
-    int | None,
-    int | None,
-    int | None,
-    int | None,
-]:
+def _billing_feed_params(
+    transactions_limit: int, changes_limit: int, changes_since: int | None
+) -> dict[str, object]:
     params: dict[str, object] = {
         "limit": transactions_limit,
         "changes_limit": changes_limit,
     }
     if changes_since is not None:
         params["changes_since"] = changes_since
+    return params
+
+
+def _download_billing_feed(
+    endpoint: str,
+    headers: dict[str, str],
+    transactions_limit: int,
+    changes_limit: int,
+    changes_since: int | None,
+) -> tuple[httpx.Response, SpooledBody | None]:
+    params = _billing_feed_params(transactions_limit, changes_limit, changes_since)
     try:
-        response = httpx.get(
-            endpoint,
-            params=params,
-            headers=headers,
-            timeout=30.0,
-        )
-    except HTTPException:
-        raise
+        return billing_stream_get(endpoint, params=params, headers=headers)
     except httpx.RequestError as exc:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="No se pudo conectar con el servicio de facturación",
         ) from exc
 
-    payload = _handle_billing_response(response)
 
-    transactions = payload.get("transactions") or []
-    if not isinstance(transactions, list):
+async def _download_billing_feed_async(
+    endpoint: str,
+    headers: dict[str, str],
+    transactions_limit: int,
+    changes_limit: int,
+    changes_since: int | None,
+) -> tuple[httpx.Response, SpooledBody | None]:
+    params = _billing_feed_params(transactions_limit, changes_limit, changes_since)
+    try:
+        return await billing_stream_get_async(endpoint, params=params, headers=headers)
+    except httpx.RequestError as exc:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="Respuesta inválida del servicio de facturación",
-        )
+            detail="No se pudo conectar con el servicio de facturación",
+        ) from exc
+
 
-    transaction_events = payload.get("transaction_events") or []
-    if not isinstance(transaction_events, list):
+def _parse_billing_feed(
+    response: httpx.Response, body: SpooledBody | None
+) -> _BillingFeed:
+    """Index the spooled feed body without decoding it as a whole.
+
+    Snapshots are kept as an id -> byte span map and decoded only when an
+    event without its own ``transaction`` payload references them.
+    """
+
+    if body is None:
+        _handle_billing_response(response)
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Respuesta inválida del servicio de facturación",
         )
 
-    changes = payload.get("changes") or []
-    if not isinstance(changes, list):
+    try:
+        return _index_billing_feed(body.buffer())
+    except (TypeError, ValueError) as exc:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Respuesta inválida del servicio de facturación",
-        )
+        ) from exc
+
+
+def _index_billing_feed(buffer) -> _BillingFeed:
+    """Build a :class:`_BillingFeed` over a feed document held in ``buffer``.
 
-    snapshots_by_id: dict[int, dict] = {}
-    for snapshot in transactions:
+    Raises ``TypeError``/``ValueError`` when the document is malformed.
+    """
+
+    reader = FeedReader(buffer)
+    snapshots_span = reader.array_span("transactions")
+    events_span = reader.array_span("transaction_events")
+    changes_span = reader.array_span("changes")
+
+    snapshot_spans: dict[int, tuple[int, int]] = {}
+    for span in reader.item_spans(snapshots_span):
+        snapshot = reader.decode(span)
         if not isinstance(snapshot, dict):
             continue
         snapshot_id = _parse_remote_identifier(
             snapshot.get("id"), "transactions[].id"
         )
         if snapshot_id is not None:
-            snapshots_by_id[snapshot_id] = snapshot
+            snapshot_spans[snapshot_id] = span
 
-    for event in transaction_events:
+    def join_snapshot(event: object) -> object:
         if not isinstance(event, dict):
-            continue
+            return event
         event_id = _parse_remote_identifier(
             event.get("transaction_id"), "transaction_events[].transaction_id"
         )
         if event_id is not None and event.get("transaction") is None:
-            snapshot = snapshots_by_id.get(event_id)
-            if snapshot is not None:
-                event["transaction"] = snapshot
+            span = snapshot_spans.get(event_id)
+            if span is not None:
+                event["transaction"] = reader.decode(span)
+        return event
+
+    transaction_events = FeedArray(reader, events_span, join_snapshot)
+    changes = FeedArray(reader, changes_span)
 
     transactions_checkpoint = _parse_remote_identifier(
-        payload.get("transactions_checkpoint_id"), "transactions_checkpoint_id"
+        reader.get("transactions_checkpoint_id"), "transactions_checkpoint_id"
     )
     transactions_confirmed = _parse_remote_identifier(
-        payload.get("last_confirmed_transaction_id"), "last_confirmed_transaction_id"
+        reader.get("last_confirmed_transaction_id"), "last_confirmed_transaction_id"
     )
     changes_checkpoint = _parse_remote_identifier(
-        payload.get("changes_checkpoint_id"), "changes_checkpoint_id"
+        reader.get("changes_checkpoint_id"), "changes_checkpoint_id"
     )
     changes_confirmed = _parse_remote_identifier(
-        payload.get("last_confirmed_change_id"), "last_confirmed_change_id"
+        reader.get("last_confirmed_change_id"), "last_confirmed_change_id"
     )
+    has_more = None
+    if "has_more_transactions" in reader or "has_more_changes" in reader:
+        has_more = bool(reader.get("has_more_transactions")) or bool(
+            reader.get("has_more_changes")
+        )
 
-    return (
+    return _BillingFeed(
         transaction_events,
         changes,
         transactions_checkpoint,
         transactions_confirmed,
         changes_checkpoint,
         changes_confirmed,
+        has_more,
     )
 
 
@@ -596,32 +1382,83 @@ def _extract_remote_error(response: httpx.Response) -> str:
     return f"Error del servicio de facturación ({response.status_code})"
 
 
-def _acknowledge_billing_checkpoint(
-    endpoint: str,
-    headers: dict[str, str],
-    transactions_checkpoint: int | None,
-    changes_checkpoint: int | None,
+def _acknowledge_billing_feed(
+    endpoint: str, headers: dict[str, str], feed: _BillingFeed
+) -> dict:
+    if feed.transactions_checkpoint is None and feed.changes_checkpoint is None:
+        return {}
+    return _acknowledge_billing_checkpoint(
+        endpoint,
+        headers,
+        feed.transactions_checkpoint,
+        feed.changes_checkpoint,
+    )
+
+
+async def _acknowledge_billing_feed_async(
+    endpoint: str, headers: dict[str, str], feed: _BillingFeed
 ) -> dict:
+    payload = _billing_ack_payload(feed.transactions_checkpoint, feed.changes_checkpoint)
+    if not payload:
+        return {}
+    try:
+        response = await billing_post_async(endpoint, json=payload, headers=headers)
+    except httpx.RequestError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="No se pudo confirmar el checkpoint de facturación",
+        ) from exc
+    return _handle_billing_response(response)
+
+
+def _billing_ack_payload(
+    transactions_checkpoint: int | None, changes_checkpoint: int | None
+) -> dict[str, int]:
     payload: dict[str, int] = {}
     if transactions_checkpoint is not None:
         payload["movements_checkpoint_id"] = transactions_checkpoint
     if changes_checkpoint is not None:
         payload["changes_checkpoint_id"] = changes_checkpoint
+    return payload
+
+
+def _acknowledge_billing_checkpoint(
+    endpoint: str,
+    headers: dict[str, str],
+    transactions_checkpoint: int | None,
+    changes_checkpoint: int | None,
+) -> dict:
+    payload = _billing_ack_payload(transactions_checkpoint, changes_checkpoint)
     if not payload:
         return {}
     try:
-        response = httpx.post(
-            endpoint,
-            json=payload,
-            headers=headers,
-            timeout=30.0,
-        )
+        response = billing_post(endpoint, json=payload, headers=headers)
     except httpx.RequestError as exc:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="No se pudo confirmar el checkpoint de facturación",
         ) from exc
     return _handle_billing_response(response)
+
+
+def _billing_drain_seconds() -> float:
+    try:
+        return float(os.getenv("BILLING_SYNC_DRAIN_SECONDS", "60"))
+    except ValueError:
+        return 60.0
+
+
+def _billing_webhook_lock_wait_seconds() -> float:
+    try:
+        return float(os.getenv("BILLING_WEBHOOK_LOCK_WAIT_SECONDS", "30"))
+    except ValueError:
+        return 30.0
+
+
+def _billing_webhook_secret() -> str:
+    return os.getenv("BILLING_WEBHOOK_SECRET") or require_shared_secret()
+
+
 def _parse_remote_date(value: object, remote_id: int) -> date:
     if not value:
         raise HTTPException(
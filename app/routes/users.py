@@ -8,7 +8,7 @@ from fastapi.templating import Jinja2Templates
 
 from config.db import get_db
 from models import User
-from auth import hash_password, get_current_user, require_admin
+from auth import CurrentUser, hash_password, get_current_user, mark_user_changed, require_admin
 
 
 templates = Jinja2Templates(directory=Path(__file__).resolve().parent.parent / "templates")
@@ -117,7 +117,7 @@ def logout(request: Request):
 def list_users(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     if not current_user:
         return RedirectResponse("/login", status_code=302)
@@ -145,7 +145,7 @@ def edit_user_form(
     user_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     if not current_user:
         return RedirectResponse("/login", status_code=302)
@@ -174,7 +174,7 @@ def edit_user(
     email: str = Form(...),
     password: Optional[str] = Form(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     if not current_user:
         return RedirectResponse("/login", status_code=302)
@@ -207,6 +207,7 @@ def edit_user(
     if password:
         user.password_hash = hash_password(password)
     db.add(user)
+    mark_user_changed(request, db, user_id)
     db.commit()
     return RedirectResponse("/users", status_code=302)
 
@@ -216,7 +217,7 @@ def delete_user(
     user_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     if not current_user:
         return RedirectResponse("/login", status_code=302)
@@ -225,6 +226,7 @@ def delete_user(
     user = db.get(User, user_id)
     if user:
         db.delete(user)
+        mark_user_changed(request, db, user_id)
         db.commit()
     if current_user.id == user_id:
         request.session.clear()
@@ -233,11 +235,12 @@ def delete_user(
 
 
 @router.post("/users/{user_id}/approve", dependencies=[Depends(require_admin)])
-def approve_user(user_id: int, db: Session = Depends(get_db)):
+def approve_user(user_id: int, request: Request, db: Session = Depends(get_db)):
     user = db.get(User, user_id)
     if user:
         user.is_active = True
         db.add(user)
+        mark_user_changed(request, db, user_id)
         db.commit()
     return RedirectResponse("/users", status_code=302)
 
@@ -245,8 +248,9 @@ def approve_user(user_id: int, db: Session = Depends(get_db)):
 @router.post("/users/{user_id}/toggle")
 def toggle_admin(
     user_id: int,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: CurrentUser = Depends(require_admin),
 ):
     if user_id == current_user.id:
         return RedirectResponse("/users", status_code=302)
@@ -254,6 +258,7 @@ def toggle_admin(
     if user:
         user.is_admin = not user.is_admin
         db.add(user)
+        mark_user_changed(request, db, user_id)
         db.commit()
     return RedirectResponse("/users", status_code=302)
 
@@ -45,12 +45,21 @@ class TransactionWithBalance(TransactionOut):
     running_balance: Decimal
 
 
+class TransactionLedgerPage(BaseModel):
+    items: List[TransactionWithBalance]
+    limit: int
+    has_more: bool
+    next_cursor: str | None = None
+
+
 class TransactionPage(BaseModel):
     items: List[TransactionOut]
-    total: int
+    total: int | None = None
+    total_estimated: bool = False
     limit: int
     offset: int
     has_more: bool
+    next_cursor: str | None = None
 
 
 class InvoiceCreate(BaseModel):
@@ -119,6 +128,45 @@ class RetentionCertificateOut(RetentionCertificateCreate):
 class BillingInfoOut(BaseModel):
     invoices: List[InvoiceOut]
     retention_certificates: List[RetentionCertificateOut]
+    next_cursor: str | None = None
+
+
+class BillingInfoDeleted(BaseModel):
+    invoices: List[int] = []
+    retention_certificates: List[int] = []
+
+
+class BillingInfoChangesOut(BillingInfoOut):
+    deleted: BillingInfoDeleted
+    next_cursor: str
+    has_more: bool
+
+
+class BillingSyncRunOut(BaseModel):
+    id: int
+    trigger: str
+    status: str
+    started_at: datetime
+    finished_at: datetime
+    pages: int
+    created_count: int
+    updated_count: int
+    deleted_count: int
+    bytes_received: int
+    fetch_ms: int
+    parse_ms: int
+    apply_ms: int
+    commit_ms: int
+    ack_ms: int
+    error_detail: str | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class BillingSyncRunHistory(BaseModel):
+    runs: List[BillingSyncRunOut]
+    stats: dict[str, Any]
 
 
 class RetentionBreakdown(BaseModel):
@@ -0,0 +1,140 @@
+"""In-process cache of account metadata (name, color, currency, flags).
+
+Page handlers and the billing endpoints look up the billing account on almost
+every request. The cache keeps every account's metadata in memory. Any flush
+that changes a metadata column bumps the ``account_metadata`` counter. Once
+that flush commits, the writing process drops its copy. Other workers compare
+the counter at most every ``ACCOUNT_CACHE_RECHECK_SECONDS`` and reload when it
+moved. Writes to the sync checkpoints on the billing row do not count as
+metadata changes, so they leave the cache alone.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from config.constants import Currency
+from models import Account
+from services.table_versions import bump_counter, current_counter
+
+LOGGER = logging.getLogger(__name__)
+
+ACCOUNT_METADATA_COUNTER = "account_metadata"
+ACCOUNT_CACHE_RECHECK_ENV = "ACCOUNT_CACHE_RECHECK_SECONDS"
+DEFAULT_RECHECK_SECONDS = 2.0
+METADATA_FIELDS = ("name", "color", "currency", "is_billing", "is_active")
+
+_CHANGED_FLAG = "account_metadata_changed"
+
+
+class AccountMeta(NamedTuple):
+    id: int
+    name: str
+    color: str
+    currency: Currency
+    is_billing: bool
+    is_active: bool
+
+
+def _recheck_seconds() -> float:
+    try:
+        return float(os.getenv(ACCOUNT_CACHE_RECHECK_ENV, DEFAULT_RECHECK_SECONDS))
+    except ValueError:
+        LOGGER.warning("Invalid %s value, using %s", ACCOUNT_CACHE_RECHECK_ENV, DEFAULT_RECHECK_SECONDS)
+        return DEFAULT_RECHECK_SECONDS
+
+
+class AccountMetadataCache:
+    """Every account's metadata, tagged with the counter value it was read at."""
+
+    def __init__(self) -> None:
+        self._accounts: dict[int, AccountMeta] | None = None
+        self._version = 0
+        self._checked_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> dict[int, AccountMeta]:
+        now = time.monotonic()
+        with self._lock:
+            accounts, version, checked_at = self._accounts, self._version, self._checked_at
+            generation = self._generation
+        if accounts is not None and now - checked_at < _recheck_seconds():
+            return accounts
+
+        # The counter is read before the rows: a write that lands in between
+        # leaves a newer counter behind and the next check reloads.
+        current = current_counter(db.connection(), ACCOUNT_METADATA_COUNTER)
+        if accounts is not None and current == version:
+            with self._lock:
+                if generation == self._generation:
+                    self._checked_at = now
+            return accounts
+
+        rows = db.execute(
+            select(
+                Account.id,
+                Account.name,
+                Account.color,
+                Account.currency,
+                Account.is_billing,
+                Account.is_active,
+            )
+        ).all()
+        accounts = {row.id: AccountMeta(*row) for row in rows}
+        with self._lock:
+            # Skip the store if this process committed a change meanwhile.
+            if generation == self._generation:
+                self._accounts, self._version, self._checked_at = accounts, current, now
+        return accounts
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._accounts = None
+
+
+account_metadata_cache = AccountMetadataCache()
+
+
+def billing_account_meta(db: Session) -> AccountMeta | None:
+    return next(
+        (meta for meta in account_metadata_cache.get(db).values() if meta.is_billing), None
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _version_account_metadata(session: Session, flush_context, instances) -> None:
+    changed = any(isinstance(obj, Account) for obj in (*session.new, *session.deleted))
+    changed = changed or any(
+        isinstance(obj, Account)
+        and any(inspect(obj).attrs[field].history.has_changes() for field in METADATA_FIELDS)
+        for obj in session.dirty
+    )
+    if changed:
+        bump_counter(session.connection(), ACCOUNT_METADATA_COUNTER)
+        session.info[_CHANGED_FLAG] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED_FLAG, False):
+        account_metadata_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_flag_on_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_FLAG, None)
+
+
+@event.listens_for(Account.__table__, "after_create")
+def _invalidate_on_create(target, connection, **kw) -> None:
+    # A recreated table restarts the counter, so a cached version could match.
+    account_metadata_cache.invalidate()
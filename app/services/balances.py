@@ -0,0 +1,178 @@
+"""Daily balance rollup per account: incremental maintenance and rebuild."""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import Connection, delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from config.db import dialect_insert
+from models import AccountDailyBalance, Transaction
+
+LOGGER = logging.getLogger(__name__)
+
+BalanceDeltas = Mapping[tuple[int, date], Decimal]
+
+# First key of ``pg_advisory_xact_lock(int, int)``; the second is the account id.
+BALANCE_LOCK_CLASS = 7_240_312
+
+
+def lock_account_rollups(conn: Connection, account_ids) -> None:
+    """Serialize rollup writers per account until the transaction ends.
+
+    A writer seeds a new day row from the last committed cumulative balance.
+    A concurrent writer of an earlier day would not see that row and would
+    never update it. Waiting here makes the later writer start after the
+    earlier one commits. Accounts are locked in id order, so writers of
+    several accounts do not deadlock. SQLite already serializes writers.
+    """
+
+    if conn.dialect.name != "postgresql":
+        return
+    for account_id in sorted(set(account_ids)):
+        conn.execute(select(func.pg_advisory_xact_lock(BALANCE_LOCK_CLASS, account_id)))
+
+
+def apply_balance_deltas(conn: Connection, deltas: BalanceDeltas) -> None:
+    """Add ``amount`` to the rollup of every ``(account_id, date)`` in ``deltas``.
+
+    The day row is created if missing (seeded with the previous cumulative
+    balance) and the delta is propagated to every later day of the account.
+    Every touched account is locked first, see :func:`lock_account_rollups`.
+    """
+
+    deltas = {key: amount for key, amount in deltas.items() if amount}
+    lock_account_rollups(conn, (account_id for account_id, _ in deltas))
+    rollup = AccountDailyBalance
+    for (account_id, day), amount in sorted(deltas.items()):
+        previous = (
+            select(rollup.cumulative_balance)
+            .where(rollup.account_id == account_id, rollup.date < day)
+            .order_by(rollup.date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        conn.execute(
+            dialect_insert(conn, rollup.__table__)
+            .values(
+                account_id=account_id,
+                date=day,
+                net_amount=0,
+                cumulative_balance=func.coalesce(previous, 0),
+            )
+            .on_conflict_do_nothing(index_elements=["account_id", "date"])
+        )
+        conn.execute(
+            update(rollup)
+            .where(rollup.account_id == account_id, rollup.date == day)
+            .values(net_amount=rollup.net_amount + amount)
+        )
+        conn.execute(
+            update(rollup)
+            .where(rollup.account_id == account_id, rollup.date >= day)
+            .values(cumulative_balance=rollup.cumulative_balance + amount)
+        )
+
+
+def rebuild_daily_balances(conn: Connection, account_id: int | None = None) -> int:
+    """Recompute the rollup from the transactions table; return the rows written."""
+
+    rollup = AccountDailyBalance
+    clear = delete(rollup)
+    daily = select(
+        Transaction.account_id,
+        Transaction.date,
+        func.sum(Transaction.amount).label("net_amount"),
+    ).group_by(Transaction.account_id, Transaction.date)
+    if account_id is not None:
+        lock_account_rollups(conn, [account_id])
+        clear = clear.where(rollup.account_id == account_id)
+        daily = daily.where(Transaction.account_id == account_id)
+    conn.execute(clear)
+
+    daily = daily.subquery()
+    rows = select(
+        daily.c.account_id,
+        daily.c.date,
+        daily.c.net_amount,
+        func.sum(daily.c.net_amount).over(
+            partition_by=daily.c.account_id, order_by=daily.c.date
+        ),
+    )
+    result = conn.execute(
+        insert(rollup).from_select(
+            ["account_id", "date", "net_amount", "cumulative_balance"], rows
+        )
+    )
+    return result.rowcount or 0
+
+
+def balance_until(account_id, to_date):
+    """Scalar subquery with the rollup balance of ``account_id`` at ``to_date``."""
+
+    rollup = AccountDailyBalance
+    return (
+        select(rollup.cumulative_balance)
+        .where(rollup.account_id == account_id, rollup.date <= to_date)
+        .order_by(rollup.date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def _as_decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _previous_value(state, key: str):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), key)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_transaction_balances(session: Session, flush_context, instances) -> None:
+    deltas: dict[tuple[int, date], Decimal] = defaultdict(Decimal)
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            deltas[(obj.account_id, obj.date)] += _as_decimal(obj.amount)
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            deltas[(obj.account_id, obj.date)] -= _as_decimal(obj.amount)
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction):
+            continue
+        state = inspect(obj)
+        if not any(
+            state.attrs[key].history.has_changes()
+            for key in ("account_id", "date", "amount")
+        ):
+            continue
+        old_key = (_previous_value(state, "account_id"), _previous_value(state, "date"))
+        deltas[old_key] -= _as_decimal(_previous_value(state, "amount"))
+        deltas[(obj.account_id, obj.date)] += _as_decimal(obj.amount)
+    if deltas:
+        apply_balance_deltas(session.connection(), deltas)
+
+
+def main() -> None:
+    """Rebuild the whole rollup: ``python -m services.balances``."""
+
+    from config.db import engine
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as connection:
+        written = rebuild_daily_balances(connection)
+    LOGGER.info("Rebuilt %s daily balance rows", written)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Change numbering for the incremental ``/facturacion-info`` feed.
+
+Every insert or update of an invoice or retention certificate stamps the row
+with the next value of the ``billing_info`` counter, and every delete leaves a
+tombstone with its own value. Renaming a retained tax type renumbers the certificates
+that show its name. The counter row is bumped with ``UPDATE``, so
+concurrent writers serialize on its lock and values become visible in commit
+order: a reader that has seen value ``n`` has seen every change up to ``n``.
+"""
+
+from __future__ import annotations
+
+import base64
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import BillingInfoTombstone, Invoice, RetainedTaxType, RetentionCertificate
+from services.table_versions import bump_counter
+
+BILLING_INFO_COUNTER = "billing_info"
+TRACKED_ENTITIES = {Invoice: "invoices", RetentionCertificate: "retention_certificates"}
+
+
+def encode_change_cursor(change_seq: int) -> str:
+    return base64.urlsafe_b64encode(f"seq|{change_seq}".encode("utf-8")).decode("utf-8")
+
+
+def decode_change_cursor(token: str) -> int:
+    raw = base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8")
+    prefix, change_seq = raw.split("|", 1)
+    if prefix != "seq":
+        raise ValueError("Unknown cursor")
+    return int(change_seq)
+
+
+def _certificates_of_renamed_tax_types(session: Session) -> list[RetentionCertificate]:
+    renamed_ids = [
+        obj.id
+        for obj in session.dirty
+        if isinstance(obj, RetainedTaxType)
+        and obj.id is not None
+        and inspect(obj).attrs.name.history.has_changes()
+    ]
+    if not renamed_ids:
+        return []
+    with session.no_autoflush:
+        return list(
+            session.scalars(
+                select(RetentionCertificate).where(
+                    RetentionCertificate.retained_tax_type_id.in_(renamed_ids)
+                )
+            )
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _number_billing_info_changes(session: Session, flush_context, instances) -> None:
+    tracked = tuple(TRACKED_ENTITIES)
+    changed = [obj for obj in session.new if isinstance(obj, tracked)]
+    changed += [
+        obj for obj in session.dirty if isinstance(obj, tracked) and session.is_modified(obj)
+    ]
+    seen = set(changed)
+    changed += [
+        obj
+        for obj in _certificates_of_renamed_tax_types(session)
+        if obj not in seen and obj not in session.deleted
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, tracked)]
+    if not changed and not deleted:
+        return
+
+    last = bump_counter(session.connection(), BILLING_INFO_COUNTER, len(changed) + len(deleted))
+    change_seq = last - len(changed) - len(deleted)
+    for obj in changed:
+        change_seq += 1
+        obj.change_seq = change_seq
+    for obj in deleted:
+        change_seq += 1
+        session.add(
+            BillingInfoTombstone(
+                change_seq=change_seq,
+                entity=TRACKED_ENTITIES[type(obj)],
+                entity_id=obj.id,
+            )
+        )
@@ -0,0 +1,231 @@
+"""Incremental reading of billing feed responses.
+
+The feed body is spooled to memory (or to a temporary file past
+``SPOOL_MAX_MEMORY_BYTES``) and only indexed up front: top-level values are
+located by byte offsets and array items are decoded one at a time when
+iterated, so the decoded feed never has to sit in memory as a whole. The
+up-front scan checks the structure only; an item whose content is not valid
+JSON raises ``json.JSONDecodeError`` when it is reached.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import re
+import tempfile
+from collections.abc import Callable, Iterator
+
+SPOOL_MAX_MEMORY_BYTES = 1024 * 1024
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING_TAIL = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_STRUCTURAL = re.compile(rb'[\[\]{}"]')
+_SCALAR = re.compile(rb"[^,\]}\s]+")
+
+
+class SpooledBody:
+    """Write-once response body kept in memory until it grows past ``max_memory``.
+
+    Close it, or use it as a context manager, to release the temporary file
+    and its ``mmap``; buffers handed out before are invalid afterwards.
+    """
+
+    def __init__(self, max_memory: int = SPOOL_MAX_MEMORY_BYTES) -> None:
+        self.max_memory = max_memory
+        self._chunks: list[bytes] = []
+        self._size = 0
+        self._file = None
+        self._mmap: mmap.mmap | None = None
+
+    def write(self, chunk: bytes) -> None:
+        self._size += len(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+        self._chunks.append(chunk)
+        if self._size > self.max_memory:
+            self._file = tempfile.TemporaryFile()
+            for pending in self._chunks:
+                self._file.write(pending)
+            self._chunks = []
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def buffer(self):
+        """Return the body as ``bytes`` or, once spilled to disk, as an ``mmap``."""
+
+        if self._file is None:
+            return b"".join(self._chunks)
+        if self._mmap is None:
+            self._file.flush()
+            if not self._size:
+                return b""
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._chunks = []
+
+    def __enter__(self) -> "SpooledBody":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _skip_whitespace(buffer, pos: int) -> int:
+    return _WHITESPACE.match(buffer, pos).end()
+
+
+def _value_end(buffer, pos: int) -> int:
+    """Return the offset just past the JSON value starting at ``pos``."""
+
+    opener = buffer[pos : pos + 1]
+    if opener == b'"':
+        match = _STRING_TAIL.match(buffer, pos + 1)
+        if match is None:
+            raise ValueError(f"Unterminated string at {pos}")
+        return match.end()
+    if opener in (b"{", b"["):
+        depth = 0
+        cursor = pos
+        while True:
+            match = _STRUCTURAL.search(buffer, cursor)
+            if match is None:
+                raise ValueError(f"Unterminated value at {pos}")
+            token = match.group()
+            cursor = match.end()
+            if token == b'"':
+                tail = _STRING_TAIL.match(buffer, cursor)
+                if tail is None:
+                    raise ValueError(f"Unterminated string at {cursor}")
+                cursor = tail.end()
+                continue
+            depth += 1 if token in (b"{", b"[") else -1
+            if depth == 0:
+                return cursor
+    match = _SCALAR.match(buffer, pos)
+    if match is None:
+        raise ValueError(f"Expected a value at {pos}")
+    return match.end()
+
+
+class FeedArray:
+    """Re-iterable view of a JSON array inside a :class:`FeedReader`.
+
+    Items are decoded lazily on each iteration and passed through
+    ``transform`` if given; ``len()`` is known from the initial structural
+    scan, which does not decode them.
+    """
+
+    def __init__(
+        self,
+        reader: "FeedReader",
+        span: tuple[int, int] | None,
+        transform: Callable[[object], object] | None = None,
+    ) -> None:
+        self._reader = reader
+        self._span = span
+        self._transform = transform
+        self._length = sum(1 for _ in reader.item_spans(span))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator:
+        for start, end in self._reader.item_spans(self._span):
+            item = self._reader.decode((start, end))
+            yield self._transform(item) if self._transform else item
+
+
+class FeedReader:
+    """Offset index over the top-level object of a JSON document.
+
+    Raises ``ValueError`` if the document is not a well-formed JSON object.
+    """
+
+    def __init__(self, buffer) -> None:
+        self._buffer = buffer
+        self._spans: dict[str, tuple[int, int]] = {}
+        pos = _skip_whitespace(buffer, 0)
+        if buffer[pos : pos + 1] != b"{":
+            raise ValueError("Expected a JSON object")
+        pos = _skip_whitespace(buffer, pos + 1)
+        if buffer[pos : pos + 1] == b"}":
+            pos += 1
+        else:
+            while True:
+                if buffer[pos : pos + 1] != b'"':
+                    raise ValueError(f"Expected a key at {pos}")
+                key_end = _value_end(buffer, pos)
+                key = json.loads(buffer[pos:key_end])
+                pos = _skip_whitespace(buffer, key_end)
+                if buffer[pos : pos + 1] != b":":
+                    raise ValueError(f"Expected ':' at {pos}")
+                pos = _skip_whitespace(buffer, pos + 1)
+                value_end = _value_end(buffer, pos)
+                self._spans[key] = (pos, value_end)
+                pos = _skip_whitespace(buffer, value_end)
+                separator = buffer[pos : pos + 1]
+                pos = _skip_whitespace(buffer, pos + 1)
+                if separator == b"}":
+                    break
+                if separator != b",":
+                    raise ValueError(f"Expected ',' or '}}' at {pos}")
+        if _skip_whitespace(buffer, pos) != len(buffer):
+            raise ValueError("Unexpected data after the JSON object")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._spans
+
+    def decode(self, span: tuple[int, int]):
+        start, end = span
+        return json.loads(self._buffer[start:end])
+
+    def get(self, key: str, default=None):
+        """Decode a whole top-level value; meant for scalars."""
+
+        span = self._spans.get(key)
+        return default if span is None else self.decode(span)
+
+    def array_span(self, key: str) -> tuple[int, int] | None:
+        """Return the span of the array under ``key``; ``None`` if missing or falsy.
+
+        Raises ``TypeError`` when the value is truthy but not an array.
+        """
+
+        span = self._spans.get(key)
+        if span is None:
+            return None
+        if self._buffer[span[0] : span[0] + 1] == b"[":
+            return span
+        if self.decode(span):
+            raise TypeError(f"{key} is not an array")
+        return None
+
+    def item_spans(self, span: tuple[int, int] | None) -> Iterator[tuple[int, int]]:
+        if span is None:
+            return
+        buffer = self._buffer
+        pos = _skip_whitespace(buffer, span[0] + 1)
+        if buffer[pos : pos + 1] == b"]":
+            return
+        while True:
+            end = _value_end(buffer, pos)
+            yield pos, end
+            pos = _skip_whitespace(buffer, end)
+            separator = buffer[pos : pos + 1]
+            if separator == b"]":
+                return
+            if separator != b",":
+                raise ValueError(f"Expected ',' or ']' at {pos}")
+            pos = _skip_whitespace(buffer, pos + 1)
@@ -0,0 +1,183 @@
+"""Shared HTTP clients for the billing service feed and checkpoint acknowledgements."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from services.billing_feed import SpooledBody
+
+LOGGER = logging.getLogger(__name__)
+
+BILLING_HTTP_TIMEOUT_ENV = "BILLING_HTTP_TIMEOUT_SECONDS"
+BILLING_HTTP_CONNECT_TIMEOUT_ENV = "BILLING_HTTP_CONNECT_TIMEOUT_SECONDS"
+BILLING_HTTP2_ENV = "BILLING_HTTP2"
+BILLING_HTTP_RETRIES_ENV = "BILLING_HTTP_RETRIES"
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5.0
+DEFAULT_RETRIES = 3
+MAX_CONNECTIONS = 10
+MAX_KEEPALIVE_CONNECTIONS = 5
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+_client: httpx.Client | None = None
+_async_client: httpx.AsyncClient | None = None
+_client_lock = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        LOGGER.warning("Invalid %s value, using %s", name, default)
+        return default
+
+
+def _http2_enabled() -> bool:
+    if os.getenv(BILLING_HTTP2_ENV, "false").lower() != "true":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        LOGGER.warning("%s=true requires the 'h2' package; using HTTP/1.1", BILLING_HTTP2_ENV)
+        return False
+    return True
+
+
+def _client_options() -> dict:
+    # httpx decodes gzip responses natively and brotli ones with the ``brotli``
+    # package from requirements.txt; it advertises both in Accept-Encoding.
+    return {
+        "timeout": httpx.Timeout(
+            _env_float(BILLING_HTTP_TIMEOUT_ENV, DEFAULT_TIMEOUT_SECONDS),
+            connect=_env_float(BILLING_HTTP_CONNECT_TIMEOUT_ENV, DEFAULT_CONNECT_TIMEOUT_SECONDS),
+        ),
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        "http2": _http2_enabled(),
+    }
+
+
+def _retry_attempts() -> int:
+    """The first try plus ``BILLING_HTTP_RETRIES`` retries."""
+
+    return 1 + max(0, int(_env_float(BILLING_HTTP_RETRIES_ENV, DEFAULT_RETRIES)))
+
+
+def get_billing_http_client() -> httpx.Client:
+    """Return the shared client, creating it if startup has not done so."""
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(**_client_options())
+        return _client
+
+
+def start_billing_http_client() -> None:
+    get_billing_http_client()
+
+
+def close_billing_http_client() -> None:
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def get_billing_async_client() -> httpx.AsyncClient:
+    """Return the shared async client used by the non-blocking sync endpoint."""
+
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(**_client_options())
+        return _async_client
+
+
+async def close_billing_async_client() -> None:
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
+
+
+def billing_stream_get(
+    url: str, *, params: dict | None = None, headers: dict | None = None
+) -> tuple[httpx.Response, SpooledBody | None]:
+    """``GET`` through the shared client, spooling a successful body as it arrives.
+
+    Returns the response and its spooled body; error responses are read
+    normally and come back with ``None``. Transport errors and 502/503/504
+    are retried with full-jitter exponential backoff.
+    """
+
+    client = get_billing_http_client()
+    attempts = _retry_attempts()
+    backoff = RETRY_BASE_DELAY_SECONDS
+    for attempt in range(1, attempts + 1):
+        try:
+            with client.stream("GET", url, params=params, headers=headers) as response:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == attempts:
+                    if response.status_code >= 400:
+                        response.read()
+                        return response, None
+                    body = SpooledBody()
+                    for chunk in response.iter_bytes():
+                        body.write(chunk)
+                    return response, body
+        except httpx.TransportError:
+            if attempt == attempts:
+                raise
+        LOGGER.warning("Billing GET %s failed (attempt %s of %s)", url, attempt, attempts)
+        # Full jitter keeps several workers from retrying in lockstep.
+        time.sleep(random.uniform(0, backoff))
+        backoff *= 2
+
+
+def billing_post(url: str, *, json: dict, headers: dict | None = None):
+    """``POST`` through the shared client; not retried since it is not idempotent."""
+
+    return get_billing_http_client().post(url, json=json, headers=headers)
+
+
+async def billing_stream_get_async(
+    url: str, *, params: dict | None = None, headers: dict | None = None
+) -> tuple[httpx.Response, SpooledBody | None]:
+    """Async counterpart of :func:`billing_stream_get`, with the same retry policy."""
+
+    client = get_billing_async_client()
+    attempts = _retry_attempts()
+    backoff = RETRY_BASE_DELAY_SECONDS
+    for attempt in range(1, attempts + 1):
+        try:
+            async with client.stream("GET", url, params=params, headers=headers) as response:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == attempts:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        return response, None
+                    body = SpooledBody()
+                    async for chunk in response.aiter_bytes():
+                        body.write(chunk)
+                    return response, body
+        except httpx.TransportError:
+            if attempt == attempts:
+                raise
+        LOGGER.warning("Billing GET %s failed (attempt %s of %s)", url, attempt, attempts)
+        await asyncio.sleep(random.uniform(0, backoff))
+        backoff *= 2
+
+
+async def billing_post_async(url: str, *, json: dict, headers: dict | None = None):
+    return await get_billing_async_client().post(url, json=json, headers=headers)
@@ -0,0 +1,315 @@
+"""Scheduled and background billing syncs, and the lock every sync path shares."""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, select
+
+from config.db import SessionLocal, engine
+from models import BillingSyncRun
+
+LOGGER = logging.getLogger(__name__)
+
+BILLING_SYNC_INTERVAL_ENV = "BILLING_SYNC_INTERVAL_SECONDS"
+BILLING_SYNC_MAX_BACKOFF_ENV = "BILLING_SYNC_MAX_BACKOFF_SECONDS"
+BILLING_SYNC_LOCK_FILE_ENV = "BILLING_SYNC_LOCK_FILE"
+BILLING_SYNC_DB_WORKERS_ENV = "BILLING_SYNC_DB_WORKERS"
+BILLING_SYNC_FALLBACK_ENV = "BILLING_SYNC_FALLBACK_SECONDS"
+BILLING_SYNC_RUN_RETENTION_ENV = "BILLING_SYNC_RUN_RETENTION_DAYS"
+DEFAULT_INTERVAL_SECONDS = 5 * 60
+DEFAULT_FALLBACK_SECONDS = 60 * 60
+DEFAULT_MAX_BACKOFF_SECONDS = 60 * 60
+DEFAULT_RUN_RETENTION_DAYS = 30
+JOB_TTL_SECONDS = 60 * 60
+MAX_JOBS = 100
+
+BILLING_SYNC_PHASES = ("fetch", "parse", "apply", "commit", "ack")
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "max": 1.0}
+
+# Arbitrary application-wide key for ``pg_try_advisory_lock``.
+BILLING_SYNC_LOCK_KEY = 7_240_312_001
+
+
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        LOGGER.warning("Invalid %s value, using %s", name, default)
+        return default
+
+
+def _lock_file_path() -> Path:
+    configured = os.getenv(BILLING_SYNC_LOCK_FILE_ENV)
+    if configured:
+        return Path(configured)
+    return Path(tempfile.gettempdir()) / "movdin-billing-sync.lock"
+
+
+@contextmanager
+def billing_sync_lock() -> Iterator[bool]:
+    """Try to take the billing sync lock without waiting; yield whether it was taken.
+
+    Postgres uses a session-level advisory lock on a dedicated connection, so
+    it is shared by every worker and process using the database. The lock
+    outlives the commit that follows the try, so the connection does not sit
+    idle in a transaction, where ``idle_in_transaction_session_timeout``
+    could kill it and release the lock mid-sync. Other backends fall back to
+    an exclusive ``flock`` on a local file.
+    """
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            acquired = bool(
+                conn.scalar(select(func.pg_try_advisory_lock(BILLING_SYNC_LOCK_KEY)))
+            )
+            conn.commit()
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.scalar(select(func.pg_advisory_unlock(BILLING_SYNC_LOCK_KEY)))
+                conn.commit()
+        return
+
+    with open(_lock_file_path(), "a") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# Database work of the async sync endpoint runs here rather than in the AnyIO
+# threadpool, so a slow billing service cannot starve unrelated requests.
+billing_db_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv(BILLING_SYNC_DB_WORKERS_ENV, "2"))),
+    thread_name_prefix="billing-sync-db",
+)
+
+
+class BillingSyncJobs:
+    """In-memory registry of background syncs started by the async endpoint.
+
+    Jobs live in the memory of the worker that started them and are dropped
+    ``ttl_seconds`` after they finish, or oldest first past ``max_jobs``.
+    """
+
+    def __init__(self, ttl_seconds: float, max_jobs: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._finished_at: dict[str, float] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> dict:
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "pending",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job["job_id"]] = job
+        return dict(job)
+
+    def attach(self, job_id: str, task: asyncio.Task) -> None:
+        # Keep a reference so the task is not garbage collected while running.
+        with self._lock:
+            self._tasks[job_id] = task
+        task.add_done_callback(lambda _task: self._tasks.pop(job_id, None))
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if job["status"] in ("done", "failed"):
+                self._finished_at[job_id] = time.monotonic()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for job_id, finished_at in list(self._finished_at.items()):
+            if now - finished_at >= self.ttl_seconds:
+                self._jobs.pop(job_id, None)
+                del self._finished_at[job_id]
+        while len(self._jobs) > self.max_jobs:
+            job_id, _ = self._jobs.popitem(last=False)
+            self._finished_at.pop(job_id, None)
+
+
+billing_sync_jobs = BillingSyncJobs(JOB_TTL_SECONDS, MAX_JOBS)
+
+
+def _percentiles(values: list[float]) -> dict[str, float] | None:
+    """Nearest-rank percentiles of ``values``; ``None`` when there are none."""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        name: round(ordered[max(0, math.ceil(fraction * len(ordered)) - 1)], 1)
+        for name, fraction in PERCENTILES.items()
+    }
+
+
+def billing_sync_run_stats(runs) -> dict:
+    """Summarize ``BillingSyncRun`` rows: totals per phase and throughput."""
+
+    durations = []
+    throughput = []
+    for run in runs:
+        seconds = (run.finished_at - run.started_at).total_seconds()
+        durations.append(seconds * 1000)
+        events = run.created_count + run.updated_count + run.deleted_count
+        if seconds > 0:
+            throughput.append(events / seconds)
+    return {
+        "runs": len(runs),
+        "failed": sum(1 for run in runs if run.status == "failed"),
+        "duration_ms": _percentiles(durations),
+        "phases_ms": {
+            phase: _percentiles([getattr(run, f"{phase}_ms") for run in runs])
+            for phase in BILLING_SYNC_PHASES
+        },
+        "bytes_received": _percentiles([run.bytes_received for run in runs]),
+        "events_per_second": _percentiles(throughput),
+    }
+
+
+def prune_billing_sync_runs(session) -> None:
+    """Delete run rows older than ``BILLING_SYNC_RUN_RETENTION_DAYS``; 0 keeps them all.
+
+    Runs in the caller's transaction, so it commits with the new run.
+    """
+
+    days = _env_seconds(BILLING_SYNC_RUN_RETENTION_ENV, DEFAULT_RUN_RETENTION_DAYS)
+    if days <= 0:
+        return
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    session.execute(delete(BillingSyncRun).where(BillingSyncRun.started_at < cutoff))
+
+
+def _push_ingestion_active(session) -> bool:
+    """Whether both a webhook and a poll succeeded within the fallback window.
+
+    While the billing service pushes events, polling only fills gaps, so it
+    runs once per ``BILLING_SYNC_FALLBACK_SECONDS`` instead of every interval.
+    """
+
+    window = _env_seconds(BILLING_SYNC_FALLBACK_ENV, DEFAULT_FALLBACK_SECONDS)
+    if window <= 0:
+        return False
+    recent = select(BillingSyncRun.id).where(
+        BillingSyncRun.status == "success",
+        BillingSyncRun.started_at >= datetime.now(timezone.utc) - timedelta(seconds=window),
+    )
+    pushed = session.scalar(recent.where(BillingSyncRun.trigger == "webhook").limit(1))
+    polled = session.scalar(recent.where(BillingSyncRun.trigger != "webhook").limit(1))
+    return pushed is not None and polled is not None
+
+
+def run_scheduled_billing_sync() -> bool:
+    """Drain the billing feed unless another worker is syncing; return whether it ran."""
+
+    from routes.transactions import run_billing_sync
+
+    with billing_sync_lock() as acquired:
+        if not acquired:
+            LOGGER.debug("Billing sync already running elsewhere; skipping")
+            return False
+        with SessionLocal() as session:
+            if _push_ingestion_active(session):
+                LOGGER.debug("Billing webhooks are arriving; skipping the fallback poll")
+                return False
+            try:
+                result = run_billing_sync(session, drain=True, trigger="scheduled")
+            except HTTPException as exc:
+                if exc.status_code != status.HTTP_404_NOT_FOUND:
+                    raise
+                # No billing account configured yet: nothing to sync.
+                return False
+        LOGGER.info("Scheduled billing sync: %s", result["message"])
+        return True
+
+
+_billing_sync_stop = threading.Event()
+_billing_sync_thread: threading.Thread | None = None
+
+
+def _billing_sync_worker(interval: float, max_backoff: float) -> None:
+    delay = interval
+    failures = 0
+    while not _billing_sync_stop.wait(delay):
+        try:
+            run_scheduled_billing_sync()
+        except Exception:
+            failures += 1
+            delay = min(interval * 2**failures, max_backoff)
+            LOGGER.exception(
+                "Scheduled billing sync failed; retrying in %.0f seconds", delay
+            )
+        else:
+            failures = 0
+            delay = interval
+
+
+def start_billing_sync_job() -> None:
+    global _billing_sync_thread
+    if _billing_sync_thread and _billing_sync_thread.is_alive():
+        return
+    interval = _env_seconds(BILLING_SYNC_INTERVAL_ENV, DEFAULT_INTERVAL_SECONDS)
+    if interval <= 0:
+        return
+    if not os.getenv("FACTURACION_RUTA_DATA") or not os.getenv("BILLING_API_KEY"):
+        return
+    max_backoff = max(
+        interval, _env_seconds(BILLING_SYNC_MAX_BACKOFF_ENV, DEFAULT_MAX_BACKOFF_SECONDS)
+    )
+    _billing_sync_stop.clear()
+    _billing_sync_thread = threading.Thread(
+        target=_billing_sync_worker,
+        args=(interval, max_backoff),
+        name="billing-sync",
+        daemon=True,
+    )
+    _billing_sync_thread.start()
+
+
+def stop_billing_sync_job() -> None:
+    global _billing_sync_thread
+    if not _billing_sync_thread:
+        return
+    _billing_sync_stop.set()
+    if _billing_sync_thread.is_alive():
+        _billing_sync_thread.join(timeout=1.0)
+    _billing_sync_thread = None
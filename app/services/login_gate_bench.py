@@ -0,0 +1,111 @@
+"""Login gate micro-benchmark: ``python -m services.login_gate_bench``.
+
+Serves the same three trivial routes behind ``SessionMiddleware`` twice, once
+gated by the previous ``@app.middleware("http")`` function and once by
+:class:`~auth.LoginRequiredMiddleware`. It reports requests per second for a
+static file, an anonymous notification poll and a logged-in page. Requests go
+in-process through ``httpx.ASGITransport``, so the numbers measure the
+middleware stack and not the network.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, RedirectResponse
+from starlette.middleware.sessions import SessionMiddleware
+
+from auth import LoginRequiredMiddleware
+
+ALLOWED_PATHS = {"/login", "/register", "/health", "/facturacion-info", "/transactions/billing/webhook"}
+ALLOWED_PREFIXES = ("/static", "/notificaciones")
+CASES = {
+    "static": "/static/app.css",
+    "notificaciones": "/notificaciones",
+    "page (logged in)": "/",
+}
+
+
+def _routes(app: FastAPI) -> FastAPI:
+    @app.get("/static/app.css")
+    def static_file():
+        return PlainTextResponse("body{}")
+
+    @app.get("/notificaciones")
+    def notifications():
+        return {"items": []}
+
+    @app.get("/")
+    def index():
+        return PlainTextResponse("ok")
+
+    @app.get("/login")
+    def login(request: Request):
+        request.session["user_id"] = 1
+        return PlainTextResponse("ok")
+
+    return app
+
+
+def _base_http_app() -> FastAPI:
+    app = _routes(FastAPI())
+
+    @app.middleware("http")
+    async def require_login_middleware(request: Request, call_next):
+        path = request.url.path
+        if path.startswith("/notificaciones"):
+            return await call_next(request)
+        if not request.session.get("user_id") and not path.startswith("/static") and path not in ALLOWED_PATHS:
+            return RedirectResponse("/login")
+        return await call_next(request)
+
+    app.add_middleware(SessionMiddleware, secret_key="bench")
+    return app
+
+
+def _asgi_app() -> FastAPI:
+    app = _routes(FastAPI())
+    app.add_middleware(
+        LoginRequiredMiddleware, allowed_paths=ALLOWED_PATHS, allowed_prefixes=ALLOWED_PREFIXES
+    )
+    app.add_middleware(SessionMiddleware, secret_key="bench")
+    return app
+
+
+async def _requests_per_second(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/login")
+        for _ in range(min(requests, 100)):
+            await client.get(path)
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} answered {response.status_code}")
+        return requests / (time.perf_counter() - started)
+
+
+async def _run(requests: int) -> None:
+    gates = {"BaseHTTPMiddleware": _base_http_app(), "ASGI": _asgi_app()}
+    print(f"{'case':<18} {'BaseHTTP req/s':>15} {'ASGI req/s':>12} {'gain':>7}")
+    for name, path in CASES.items():
+        before, after = [
+            await _requests_per_second(app, path, requests) for app in gates.values()
+        ]
+        print(f"{name:<18} {before:>15.0f} {after:>12.0f} {after / before - 1:>+7.0%}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="Pedidos por caso")
+    args = parser.parse_args(argv)
+    asyncio.run(_run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Per-table version counters and the ETags built from them.
+
+Every flush that inserts, updates or deletes rows of a versioned table bumps
+that table's counter. Updates that only touch the billing sync bookkeeping on
+``accounts`` do not, since no versioned endpoint reads it. Core writes that bypass the session call
+:func:`bump_table_versions` themselves. Endpoints derive strong ETags from the
+counters of the tables they read, so a conditional request is answered with a
+single ``SELECT`` and no serialization.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from fastapi import Request, Response, status
+from sqlalchemy import Connection, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from config.db import dialect_insert
+from models import ChangeCounter
+
+VERSIONED_TABLES = frozenset(
+    {"accounts", "transactions", "invoices", "retention_certificates", "retained_tax_types"}
+)
+# Columns written on every sync page that no versioned endpoint serves.
+UNVERSIONED_ATTRIBUTES = {
+    "accounts": frozenset(
+        {
+            "billing_last_transactions_checkpoint_id",
+            "billing_last_transactions_confirmed_id",
+            "billing_last_changes_checkpoint_id",
+            "billing_last_changes_confirmed_id",
+            "billing_synced_at",
+        }
+    ),
+}
+_TABLE_PREFIX = "table:"
+
+
+def bump_counter(conn: Connection, name: str, amount: int = 1) -> int:
+    """Add ``amount`` to the counter ``name`` and return its new value.
+
+    The ``UPDATE`` holds the counter row lock until commit, so concurrent
+    writers of the same counter commit in the order of their values.
+    """
+
+    bump = (
+        update(ChangeCounter)
+        .where(ChangeCounter.name == name)
+        .values(value=ChangeCounter.value + amount)
+        .returning(ChangeCounter.value)
+    )
+    value = conn.execute(bump).scalar()
+    if value is None:
+        conn.execute(
+            dialect_insert(conn, ChangeCounter.__table__)
+            .values(name=name, value=0)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        value = conn.execute(bump).scalar_one()
+    return value
+
+
+def current_counter(conn: Connection, name: str) -> int:
+    return conn.scalar(select(ChangeCounter.value).where(ChangeCounter.name == name)) or 0
+
+
+def bump_table_versions(conn: Connection, tables: Iterable[str]) -> None:
+    # Sorted so concurrent writers take the counter locks in the same order.
+    for table in sorted(set(tables)):
+        bump_counter(conn, _TABLE_PREFIX + table)
+
+
+def table_versions_etag(conn: Connection, tables: Iterable[str]) -> str:
+    """Strong ETag over the current versions of ``tables``."""
+
+    tables = sorted(tables)
+    values = dict(
+        conn.execute(
+            select(ChangeCounter.name, ChangeCounter.value).where(
+                ChangeCounter.name.in_([_TABLE_PREFIX + table for table in tables])
+            )
+        ).all()
+    )
+    return '"v1-' + "-".join(str(values.get(_TABLE_PREFIX + t, 0)) for t in tables) + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified_response(request: Request, response: Response, etag: str) -> Response | None:
+    """Return a ``304`` if ``request`` already has ``etag``; else tag ``response``.
+
+    Browsers keep the body but revalidate it on every use (``no-cache``).
+    """
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _has_versioned_changes(obj) -> bool:
+    ignored = UNVERSIONED_ATTRIBUTES.get(obj.__table__.name, frozenset())
+    return any(
+        attr.history.has_changes() for attr in inspect(obj).attrs if attr.key not in ignored
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_flushed_table_versions(session: Session, flush_context, instances) -> None:
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.deleted)
+        if getattr(obj, "__table__", None) is not None
+    }
+    tables.update(
+        obj.__table__.name
+        for obj in session.dirty
+        if getattr(obj, "__table__", None) is not None and _has_versioned_changes(obj)
+    )
+    tables &= VERSIONED_TABLES
+    if tables:
+        bump_table_versions(session.connection(), tables)
@@ -0,0 +1,190 @@
+"""Transaction listing helpers: keyset cursors, total counts and text search."""
+
+from __future__ import annotations
+
+import base64
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from datetime import date
+
+from sqlalchemy import cast, column, event, func, literal_column, or_, select, table
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from config.db import SEARCH_CONFIG, engine
+from models import TRANSACTION_FTS_TABLE, Transaction
+
+COUNT_CACHE_TTL_SECONDS = 30
+COUNT_CACHE_MAX_ENTRIES = 256
+
+
+def encode_transaction_cursor(tx_date: date, tx_id: int) -> str:
+    raw = f"{tx_date.isoformat()}|{tx_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("utf-8")
+
+
+def decode_transaction_cursor(token: str) -> tuple[date, int]:
+    raw = base64.urlsafe_b64decode(token.encode("utf-8")).decode("utf-8")
+    date_str, tx_id = raw.split("|", 1)
+    return date.fromisoformat(date_str), int(tx_id)
+
+
+_SEARCH_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_search_clause(
+    db: Session, search: str
+) -> tuple[ColumnElement[bool], ColumnElement | None]:
+    """Return the filter and relevance expression for a transaction search.
+
+    Postgres matches against the indexed ``search_vector`` column and SQLite
+    against the FTS5 shadow table; each word is matched as a prefix. Other
+    backends, or terms without words, fall back to ``ILIKE`` without ranking.
+    """
+
+    dialect = db.get_bind().dialect.name
+    tokens = _SEARCH_TOKEN.findall(search)
+    if tokens and dialect == "postgresql":
+        query = func.to_tsquery(
+            cast(SEARCH_CONFIG, REGCONFIG),
+            " & ".join(f"{token}:*" for token in tokens),
+        )
+        vector = literal_column("search_vector", type_=TSVECTOR)
+        return vector.op("@@")(query), func.ts_rank_cd(vector, query)
+    if tokens and dialect == "sqlite":
+        fts_table = table(TRANSACTION_FTS_TABLE, column("rowid"))
+        fts = literal_column(TRANSACTION_FTS_TABLE)
+        match = fts.op("MATCH")(" ".join(f'"{token}"*' for token in tokens))
+        matching_ids = select(fts_table.c.rowid).where(match)
+        # bm25() is lower for better matches; negate it so higher ranks first.
+        rank = (
+            select(-func.bm25(fts))
+            .select_from(fts_table)
+            .where(match, fts_table.c.rowid == Transaction.id)
+            .scalar_subquery()
+        )
+        return Transaction.id.in_(matching_ids), rank
+
+    term = f"%{search}%"
+    return (
+        or_(
+            Transaction.description.ilike(term),
+            Transaction.notes.ilike(term),
+        ),
+        None,
+    )
+
+
+class TransactionCountCache:
+    """In-memory TTL cache of filtered transaction counts.
+
+    Entries are keyed by the filter tuple of the listing. Any write to the
+    transactions table bumps the generation, so counts computed before the
+    write are never stored.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, int]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> int | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: int, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+transaction_count_cache = TransactionCountCache(
+    COUNT_CACHE_TTL_SECONDS, COUNT_CACHE_MAX_ENTRIES
+)
+
+
+def count_transactions(db: Session, filters: list, cache_key: Hashable) -> int:
+    cached = transaction_count_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = transaction_count_cache.generation
+    total_stmt = select(func.count()).select_from(Transaction).where(*filters)
+    total = db.scalar(total_stmt) or 0
+    transaction_count_cache.set(cache_key, total, generation)
+    return total
+
+
+def estimate_transaction_count(db: Session, filters: list) -> int | None:
+    """Return the planner row estimate for the filters, or ``None`` if unsupported."""
+
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    stmt = select(Transaction.id).where(*filters)
+    compiled = stmt.compile(dialect=bind.dialect)
+    row = db.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).first()
+    if row is None:
+        return None
+    plan = row[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    try:
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+_WRITES_FLAG = "transactions_written"
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _track_transaction_writes(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    table = getattr(getattr(context.compiled, "statement", None), "table", None)
+    if getattr(table, "name", None) == Transaction.__tablename__:
+        transaction_count_cache.invalidate()
+        conn.info[_WRITES_FLAG] = True
+
+
+@event.listens_for(engine, "commit")
+def _invalidate_counts_on_commit(conn):
+    # Listings running concurrently with the write may have cached pre-commit
+    # counts after the first invalidation; drop them once the write is visible.
+    if conn.info.pop(_WRITES_FLAG, False):
+        transaction_count_cache.invalidate()
+
+
+@event.listens_for(engine, "rollback")
+def _clear_write_flag_on_rollback(conn):
+    conn.info.pop(_WRITES_FLAG, None)
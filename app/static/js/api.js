@@ -11,6 +11,11 @@ export async function fetchTransactions(options = {}) {
   const limit = Number.isFinite(limitCandidate) && limitCandidate > 0 ? limitCandidate : 50;
   params.set('page', String(page));
   params.set('limit', String(limit));
+  if (options.cursor) {
+    params.set('cursor', options.cursor);
+  } else {
+    params.set('offset', String((page - 1) * limit));
+  }
 
   const search = options.search?.toString().trim();
   if (search) {
@@ -59,6 +64,7 @@ export async function fetchTransactions(options = {}) {
     items,
     total,
     hasMore: Boolean(hasMoreRaw),
+    nextCursor: data?.next_cursor || null,
     page: responsePage,
     limit: responseLimit,
   };
@@ -180,7 +186,9 @@ export async function acknowledgeNotification(id) {
 
 export async function syncBillingTransactions() {
   try {
-    const res = await fetch('/transactions/billing/sync', { method: 'POST' });
+    const res = await fetch('/transactions/billing/sync-async?drain=true', {
+      method: 'POST'
+    });
     let data = null;
     let rawText = null;
     try {
@@ -334,6 +334,7 @@ let currentPage = 1;
 let pageSize = limit;
 let totalTransactions = 0;
 let hasMorePages = false;
+let pageCursors = [];
 let currentFetchToken = 0;
 let accounts = [];
 let accountMap = {};
@@ -437,6 +438,9 @@ function renderTransactions() {
 
 function buildTransactionRequestParams(page) {
   const params = { page, limit };
+  if (page > 1 && pageCursors[page]) {
+    params.cursor = pageCursors[page];
+  }
   const search = searchBox.value.trim();
   if (search) {
     params.search = search;
@@ -519,6 +523,10 @@ async function loadTransactions(page = 1) {
       return loadTransactions(requestedPage - 1);
     }
 
+    if (requestedPage === 1) {
+      pageCursors = [];
+    }
+    pageCursors[requestedPage + 1] = response?.nextCursor || null;
     transactions = items;
     totalTransactions = total;
     const hasMoreResponse =
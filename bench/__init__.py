@@ -0,0 +1 @@
+"""Benchmarks and fakes kept out of the application image; run from the repo root."""
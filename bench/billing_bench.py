@@ -0,0 +1,180 @@
+"""Billing sync throughput benchmark: ``python -m bench.billing_bench``.
+
+Drains a :class:`~bench.fake_billing.FakeBillingService` feed through
+``sync_billing_transactions`` for each batch size and backend and reports
+events per second, queries per event and peak RSS. Each case runs in its own
+process so the database configuration and the RSS peak do not leak between
+cases. Postgres cases only run against an explicit ``--postgres-url`` or
+``BENCH_DATABASE_URL``, never the application's ``DATABASE_URL``. They use the
+throwaway ``billing_bench`` schema, dropped afterwards, and their own advisory
+lock key, so a bench never blocks a real sync. Run it from the repository
+root; the application is imported from the sibling ``app/`` directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SQLITE_URL = "sqlite+pysqlite:///:memory:"
+BENCH_SCHEMA = "billing_bench"
+BENCH_LOCK_KEY = 7_240_312_099
+DEFAULT_SIZES = "100,1000,10000"
+BASE_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = BASE_DIR / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+
+def _run_case(case: dict) -> dict:
+    """Run one case; ``DATABASE_URL``/``DB_SCHEMA`` must already point at its database."""
+
+    import httpx
+    from sqlalchemy import event, text
+
+    from config.constants import Currency
+    from config.db import Base, SessionLocal, engine, init_db
+    from models import Account
+    from routes.transactions import sync_billing_transactions
+    from bench.fake_billing import FakeBillingService
+    from services import billing_http, billing_sync
+
+    billing_sync.BILLING_SYNC_LOCK_KEY = BENCH_LOCK_KEY
+    init_db()
+    try:
+        with SessionLocal() as session:
+            session.add(
+                Account(
+                    name="Cuenta facturación",
+                    opening_balance=0,
+                    currency=Currency.ARS,
+                    color="#000000",
+                    is_active=True,
+                    is_billing=True,
+                )
+            )
+            session.commit()
+
+        service = FakeBillingService(case["events"], **case["feed"])
+        billing_http._client = httpx.Client(transport=service.transport())
+
+        queries = 0
+
+        def count_query(*_args) -> None:
+            nonlocal queries
+            queries += 1
+
+        event.listen(engine, "before_cursor_execute", count_query)
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            while True:
+                result = sync_billing_transactions(
+                    limit=case["page_size"], drain=True, max_pages=500, db=session
+                )
+                if result["drained"]:
+                    break
+        seconds = time.perf_counter() - started
+        event.remove(engine, "before_cursor_execute", count_query)
+    finally:
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE'))
+        else:
+            Base.metadata.drop_all(bind=engine)
+
+    events = case["events"]
+    return {
+        "backend": engine.dialect.name,
+        "events": events,
+        "pages": service.pages_served,
+        "seconds": round(seconds, 3),
+        "events_per_second": round(events / seconds, 1) if seconds else None,
+        "queries_per_event": round(queries / events, 2),
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _spawn_case(case: dict, database_url: str, schema: str) -> dict:
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "DB_SCHEMA": schema,
+        "BILLING_SYNC_DRAIN_SECONDS": "3600",
+        "FACTURACION_RUTA_DATA": "http://fake-billing.local/feed",
+        "BILLING_API_KEY": "bench",
+        "BILLING_SYNC_LOCK_FILE": str(Path(tempfile.gettempdir()) / "movdin-billing-bench.lock"),
+    }
+    completed = subprocess.run(
+        [sys.executable, "-m", "bench.billing_bench", "--case", json.dumps(case)],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or f"case failed: {case}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Eventos por caso, separados por coma")
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=("sqlite", "postgres"),
+        help="Repetible; por defecto sqlite y, si hay URL, postgres",
+    )
+    parser.add_argument(
+        "--postgres-url",
+        default=os.getenv("BENCH_DATABASE_URL"),
+        help="Base Postgres de pruebas; nunca se toma DATABASE_URL",
+    )
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--update-ratio", type=float, default=0.3)
+    parser.add_argument("--delete-ratio", type=float, default=0.1)
+    parser.add_argument("--out-of-order-ratio", type=float, default=0.05)
+    parser.add_argument("--snapshot-bytes", type=int, default=256)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(_run_case(json.loads(args.case))))
+        return
+
+    postgres_url = args.postgres_url if (args.postgres_url or "").startswith("postgresql") else None
+    backends = args.backend or (["sqlite", "postgres"] if postgres_url else ["sqlite"])
+    if "postgres" in backends and not postgres_url:
+        parser.error("postgres necesita --postgres-url o BENCH_DATABASE_URL")
+    if postgres_url and postgres_url == os.getenv("DATABASE_URL"):
+        parser.error("--postgres-url no puede ser la base de la aplicación (DATABASE_URL)")
+
+    feed = {
+        "update_ratio": args.update_ratio,
+        "delete_ratio": args.delete_ratio,
+        "out_of_order_ratio": args.out_of_order_ratio,
+        "snapshot_bytes": args.snapshot_bytes,
+    }
+    print(f"{'backend':<10} {'events':>7} {'pages':>6} {'events/s':>10} {'queries/event':>14} {'peak RSS MB':>12}")
+    for backend in backends:
+        database_url = SQLITE_URL if backend == "sqlite" else postgres_url
+        for size in (int(value) for value in args.sizes.split(",")):
+            case = {"events": size, "page_size": args.page_size, "feed": feed}
+            result = _spawn_case(case, database_url, BENCH_SCHEMA if backend == "postgres" else "")
+            print(
+                f"{backend:<10} {result['events']:>7} {result['pages']:>6} "
+                f"{result['events_per_second']:>10} {result['queries_per_event']:>14} "
+                f"{result['peak_rss_mb']:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""In-process fake of the billing service feed, for tests and benchmarks.
+
+:class:`FakeBillingService` generates a reproducible stream of
+``transaction_events`` and serves it through ``httpx.MockTransport`` with the
+same protocol as the real service: ``GET`` pages after the last acknowledged
+checkpoint and ``POST`` acknowledgements that move it.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from datetime import date, timedelta
+
+import httpx
+
+
+class FakeBillingService:
+    """Billing feed holding ``events`` generated events.
+
+    ``update_ratio`` and ``delete_ratio`` set the share of events that touch
+    an existing movement instead of creating one; ``out_of_order_ratio`` is
+    the share of adjacent events swapped within a served page, and
+    ``snapshot_bytes`` pads each movement's notes to simulate large snapshots.
+    """
+
+    def __init__(
+        self,
+        events: int,
+        *,
+        update_ratio: float = 0.3,
+        delete_ratio: float = 0.1,
+        out_of_order_ratio: float = 0.0,
+        snapshot_bytes: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.out_of_order_ratio = out_of_order_ratio
+        self.confirmed = 0
+        self.pages_served = 0
+        self.acks = 0
+        self._random = random.Random(seed)
+        self._live: dict[int, dict] = {}
+        self.events = [
+            self._generate(event_id, update_ratio, delete_ratio, snapshot_bytes)
+            for event_id in range(1, events + 1)
+        ]
+
+    def _generate(
+        self, event_id: int, update_ratio: float, delete_ratio: float, snapshot_bytes: int
+    ) -> dict:
+        roll = self._random.random()
+        if self._live and roll < delete_ratio:
+            remote_id = self._random.choice(list(self._live))
+            del self._live[remote_id]
+            return {"id": event_id, "event": "deleted", "transaction_id": remote_id}
+
+        if self._live and roll < delete_ratio + update_ratio:
+            remote_id = self._random.choice(list(self._live))
+            event = "updated"
+            description = self._live[remote_id]["description"]
+        else:
+            remote_id = 100_000 + event_id
+            event = "created"
+            description = f"Movimiento {remote_id}"
+        payload = {
+            "id": remote_id,
+            "date": (date(2024, 1, 1) + timedelta(days=event_id % 365)).isoformat(),
+            "amount": f"{self._random.randint(1, 100_000) / 100:.2f}",
+            "description": description,
+            "notes": f"evento {event_id} ".ljust(snapshot_bytes, "x"),
+        }
+        self._live[remote_id] = payload
+        return {
+            "id": event_id,
+            "event": event,
+            "occurred_at": "2024-01-01T00:00:00Z",
+            "transaction_id": remote_id,
+            "transaction": payload,
+        }
+
+    def live_transactions(self) -> dict[int, dict]:
+        """Movements that exist once every event is applied, by remote id."""
+
+        return {remote_id: dict(payload) for remote_id, payload in self._live.items()}
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            checkpoint = json.loads(request.content).get("movements_checkpoint_id")
+            if checkpoint is not None:
+                self.confirmed = max(self.confirmed, checkpoint)
+            self.acks += 1
+            return httpx.Response(200, json={"last_transaction_id": self.confirmed})
+
+        limit = int(request.url.params.get("limit", 100))
+        page = self.events[self.confirmed : self.confirmed + limit]
+        page = self._shuffle(page)
+        self.pages_served += 1
+        return httpx.Response(
+            200,
+            json={
+                "transactions": [],
+                "transaction_events": page,
+                "transactions_checkpoint_id": max((e["id"] for e in page), default=None),
+                "last_confirmed_transaction_id": self.confirmed,
+                "has_more_transactions": self.confirmed + len(page) < len(self.events),
+                "changes": [],
+                "changes_checkpoint_id": None,
+                "last_confirmed_change_id": None,
+                "has_more_changes": False,
+            },
+        )
+
+    def _shuffle(self, page: list[dict]) -> list[dict]:
+        if not self.out_of_order_ratio:
+            return page
+        page = list(page)
+        index = 0
+        while index < len(page) - 1:
+            if self._random.random() < self.out_of_order_ratio:
+                page[index], page[index + 1] = page[index + 1], page[index]
+                index += 2
+            else:
+                index += 1
+        return page
@@ -1,10 +1,16 @@
 import os
 import sys
+import threading
 from datetime import date
 from decimal import Decimal
 from pathlib import Path
 
 import pytest
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from starlette.requests import Request
 
 
 # Ensure application modules are importable during tests
@@ -16,8 +22,17 @@ os.environ.setdefault("DB_SCHEMA", "")
 
 from config import db  # noqa: E402  # pylint: disable=wrong-import-position
 from config.constants import Currency, InvoiceType  # noqa: E402
-from models import Account, Invoice, Transaction  # noqa: E402
-from routes.accounts import account_balances  # noqa: E402
+from models import Account, AccountDailyBalance, Invoice, Transaction  # noqa: E402
+from routes.accounts import (  # noqa: E402
+    account_balance,
+    account_balances,
+    account_transactions,
+)
+from services.balances import (  # noqa: E402
+    BALANCE_LOCK_CLASS,
+    lock_account_rollups,
+    rebuild_daily_balances,
+)
 
 
 @pytest.fixture(autouse=True)
@@ -113,10 +128,215 @@ def test_account_balances_excludes_future_invoices():
 
         session.commit()
 
-        balances = account_balances(to_date=cutoff, db=session)
+        balances = account_balances(_request(), Response(), to_date=cutoff, db=session)
         assert len(balances) == 1
         assert balances[0].balance == Decimal("110.00")
 
-        future_balances = account_balances(to_date=future, db=session)
+        future_balances = account_balances(_request(), Response(), to_date=future, db=session)
         assert len(future_balances) == 1
         assert future_balances[0].balance == Decimal("189.00")
+
+
+def _rollup(session, account_id):
+    return [
+        (row.date, row.net_amount, row.cumulative_balance)
+        for row in session.query(AccountDailyBalance)
+        .filter(AccountDailyBalance.account_id == account_id)
+        .order_by(AccountDailyBalance.date)
+    ]
+
+
+def test_daily_balances_follow_transaction_writes():
+    with db.SessionLocal() as session:
+        first = Account(name="Caja", opening_balance=Decimal("50"), currency=Currency.ARS)
+        second = Account(name="Banco", opening_balance=Decimal("0"), currency=Currency.ARS)
+        session.add_all([first, second])
+        session.flush()
+
+        early = Transaction(
+            account_id=first.id, date=date(2024, 1, 1), amount=Decimal("100.00")
+        )
+        late = Transaction(
+            account_id=first.id, date=date(2024, 1, 10), amount=Decimal("-30.00")
+        )
+        session.add_all([early, late])
+        session.commit()
+
+        assert _rollup(session, first.id) == [
+            (date(2024, 1, 1), Decimal("100.00"), Decimal("100.00")),
+            (date(2024, 1, 10), Decimal("-30.00"), Decimal("70.00")),
+        ]
+
+        # Inserting in the past shifts every later day.
+        session.add(
+            Transaction(account_id=first.id, date=date(2024, 1, 5), amount=Decimal("5.00"))
+        )
+        early.amount = Decimal("120.00")
+        session.commit()
+        assert _rollup(session, first.id) == [
+            (date(2024, 1, 1), Decimal("120.00"), Decimal("120.00")),
+            (date(2024, 1, 5), Decimal("5.00"), Decimal("125.00")),
+            (date(2024, 1, 10), Decimal("-30.00"), Decimal("95.00")),
+        ]
+
+        late.account_id = second.id
+        late.date = date(2024, 1, 2)
+        session.commit()
+        assert _rollup(session, first.id)[-1] == (
+            date(2024, 1, 10),
+            Decimal("0.00"),
+            Decimal("125.00"),
+        )
+        assert _rollup(session, second.id) == [
+            (date(2024, 1, 2), Decimal("-30.00"), Decimal("-30.00")),
+        ]
+
+        session.delete(early)
+        session.commit()
+
+        assert account_balance(first.id, to_date=date(2024, 1, 4), db=session).balance == Decimal("50.00")
+        assert account_balance(first.id, to_date=None, db=session).balance == Decimal("55.00")
+        balances = {b.account_id: b.balance for b in account_balances(_request(), Response(), db=session)}
+        assert balances == {first.id: Decimal("55.00"), second.id: Decimal("-30.00")}
+
+        incremental = {
+            account_id: _rollup(session, account_id) for account_id in (first.id, second.id)
+        }
+        rebuild_daily_balances(session.connection())
+        session.commit()
+        rebuilt = {
+            account_id: _rollup(session, account_id) for account_id in (first.id, second.id)
+        }
+
+    # The rebuild drops empty days but keeps every cumulative balance.
+    for account_id, rows in rebuilt.items():
+        expected = [row for row in incremental[account_id] if row[1] != 0]
+        assert rows == expected
+
+
+def test_account_transactions_pages_carry_running_balance():
+    with db.SessionLocal() as session:
+        account = Account(name="Ledger", opening_balance=Decimal("0"), currency=Currency.ARS)
+        session.add(account)
+        session.flush()
+        amounts = [
+            (date(2024, 2, 1), Decimal("10.00")),
+            (date(2024, 2, 1), Decimal("-4.00")),
+            (date(2024, 2, 2), Decimal("7.50")),
+            (date(2024, 2, 3), Decimal("1.00")),
+            (date(2024, 2, 3), Decimal("2.00")),
+            (date(2024, 2, 3), Decimal("3.00")),
+            (date(2024, 2, 6), Decimal("-9.00")),
+        ]
+        session.add_all(
+            Transaction(account_id=account.id, date=tx_date, amount=amount)
+            for tx_date, amount in amounts
+        )
+        session.commit()
+
+        expected = []
+        running = Decimal("0")
+        for _, amount in amounts:
+            running += amount
+            expected.append(running)
+
+        seen = []
+        cursor = None
+        while True:
+            page = account_transactions(
+                account.id, from_=None, to=None, limit=2, cursor=cursor, db=session
+            )
+            seen.extend(item.running_balance for item in page.items)
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+        assert seen == expected
+
+        # Filtering keeps balances relative to the whole history.
+        filtered = account_transactions(
+            account.id,
+            from_=date(2024, 2, 3),
+            to=date(2024, 2, 3),
+            limit=100,
+            cursor=None,
+            db=session,
+        )
+        assert [item.running_balance for item in filtered.items] == expected[3:6]
+        assert filtered.has_more is False
+        assert filtered.next_cursor is None
+
+
+def _request(etag: str | None = None) -> Request:
+    headers = [(b"if-none-match", etag.encode("latin-1"))] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/accounts/balances", "headers": headers})
+
+
+def test_account_balances_returns_not_modified_until_a_transaction_is_written():
+    with db.SessionLocal() as session:
+        account = Account(name="Caja", opening_balance=Decimal("0"), currency=Currency.ARS)
+        session.add(account)
+        session.commit()
+
+        response = Response()
+        account_balances(_request(), response, db=session)
+        etag = response.headers["etag"]
+
+        cached = account_balances(_request(etag), Response(), db=session)
+        assert cached.status_code == 304
+
+        session.add(Transaction(account_id=account.id, date=date(2024, 1, 1), amount=Decimal("1")))
+        session.commit()
+
+        fresh = account_balances(_request(etag), Response(), db=session)
+        assert [b.balance for b in fresh] == [Decimal("1.00")]
+
+
+def test_concurrent_writers_keep_the_rollup_consistent(tmp_path):
+    # Two connections to one file, so the second writer really waits on the first.
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'rollup.db'}", connect_args={"check_same_thread": False}
+    )
+    db.Base.metadata.create_all(bind=engine)
+    try:
+        with Session(engine) as session:
+            account = Account(name="Caja", opening_balance=Decimal("0"), currency=Currency.ARS)
+            session.add(account)
+            session.flush()
+            session.add(Transaction(account_id=account.id, date=date(2024, 1, 3), amount=Decimal("5")))
+            session.commit()
+            account_id = account.id
+
+        later, earlier = Session(engine), Session(engine)
+        later.add(Transaction(account_id=account_id, date=date(2024, 1, 5), amount=Decimal("7")))
+        later.flush()  # seeds the 2024-01-05 row from the committed balance
+        committer = threading.Timer(0.2, later.commit)
+        committer.start()
+        earlier.add(Transaction(account_id=account_id, date=date(2024, 1, 1), amount=Decimal("2")))
+        earlier.commit()
+        committer.join()
+        later.close()
+        earlier.close()
+
+        with Session(engine) as session:
+            incremental = _rollup(session, account_id)
+            rebuild_daily_balances(session.connection(), account_id)
+            assert _rollup(session, account_id) == incremental
+            assert incremental[-1][2] == Decimal("14.00")
+    finally:
+        engine.dispose()
+
+
+def test_rollup_writers_take_a_per_account_advisory_lock_on_postgres():
+    statements = []
+
+    class PostgresConnection:
+        dialect = postgresql.dialect()
+
+        def execute(self, statement):
+            compiled = statement.compile(dialect=self.dialect)
+            statements.append((str(compiled), tuple(compiled.params.values())))
+
+    lock_account_rollups(PostgresConnection(), [9, 3, 9])
+
+    assert all("pg_advisory_xact_lock" in sql for sql, _ in statements)
+    assert [keys for _, keys in statements] == [(BALANCE_LOCK_CLASS, 3), (BALANCE_LOCK_CLASS, 9)]
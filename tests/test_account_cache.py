@@ -0,0 +1,100 @@
+import os
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, update
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+
+from config import db  # noqa: E402
+from config.constants import Currency  # noqa: E402
+from models import Account  # noqa: E402
+from services.account_cache import (  # noqa: E402
+    ACCOUNT_CACHE_RECHECK_ENV,
+    ACCOUNT_METADATA_COUNTER,
+    billing_account_meta,
+)
+from services.table_versions import bump_counter  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    db.Base.metadata.create_all(bind=db.engine, checkfirst=True)
+    yield
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+
+
+@pytest.fixture
+def queries():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _billing_account(session) -> tuple[Account, int]:
+    account = Account(
+        name="Facturación", opening_balance=Decimal("0"), currency=Currency.ARS, is_billing=True
+    )
+    session.add(account)
+    session.commit()
+    return account, account.id
+
+
+def test_billing_account_meta_is_cached_until_metadata_changes(monkeypatch, queries):
+    monkeypatch.setenv(ACCOUNT_CACHE_RECHECK_ENV, "60")
+    with db.SessionLocal() as session:
+        account, account_id = _billing_account(session)
+        assert billing_account_meta(session).name == "Facturación"
+
+        queries.clear()
+        assert billing_account_meta(session).id == account_id
+        assert queries == []
+
+        # Sync checkpoints live on the same row but are not metadata.
+        account.billing_synced_at = datetime.now(timezone.utc)
+        session.commit()
+        session.refresh(account)
+        queries.clear()
+        billing_account_meta(session)
+        assert queries == []
+
+        account.color = "#ff0000"
+        session.commit()
+        assert billing_account_meta(session).color == "#ff0000"
+
+        account.is_billing = False
+        session.commit()
+        assert billing_account_meta(session) is None
+
+
+def test_billing_account_meta_follows_the_counter_of_other_workers(monkeypatch, queries):
+    monkeypatch.setenv(ACCOUNT_CACHE_RECHECK_ENV, "0")
+    with db.SessionLocal() as session:
+        _, account_id = _billing_account(session)
+        assert billing_account_meta(session).name == "Facturación"
+
+        queries.clear()
+        billing_account_meta(session)
+        # Only the counter is read while it has not moved.
+        assert len(queries) == 1
+
+    # Another process renames the account: no local hook fires.
+    with db.engine.begin() as conn:
+        conn.execute(update(Account).where(Account.id == account_id).values(name="Facturación 2"))
+        bump_counter(conn, ACCOUNT_METADATA_COUNTER)
+
+    with db.SessionLocal() as session:
+        assert billing_account_meta(session).name == "Facturación 2"
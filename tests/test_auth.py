@@ -0,0 +1,142 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, update
+from starlette.requests import Request
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = BASE_DIR / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+
+from auth import (  # noqa: E402
+    USERS_VERSION_COUNTER,
+    USERS_VERSION_SESSION_KEY,
+    get_current_user,
+    hash_password,
+    user_cache,
+)
+from config import db  # noqa: E402
+from main import app  # noqa: E402
+from models import User  # noqa: E402
+from services.table_versions import bump_counter  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    db.Base.metadata.create_all(bind=db.engine, checkfirst=True)
+    yield
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+
+
+@pytest.fixture
+def user_queries():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _create_user(username: str, *, is_admin: bool = False, is_active: bool = True) -> int:
+    with db.SessionLocal() as session:
+        user = User(
+            username=username,
+            email=f"{username}@example.com",
+            password_hash=hash_password("secret"),
+            is_admin=is_admin,
+            is_active=is_active,
+        )
+        session.add(user)
+        session.commit()
+        return user.id
+
+
+def _session_request(session: dict) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "session": session})
+
+
+def test_current_user_is_cached_until_an_admin_changes_it(user_queries):
+    admin_id = _create_user("admin", is_admin=True)
+    other_id = _create_user("otro")
+    admin = TestClient(app)
+    other = TestClient(app)
+    for client, username in ((admin, "admin"), (other, "otro")):
+        login = client.post(
+            "/login", data={"username": username, "password": "secret"}, follow_redirects=False
+        )
+        assert login.status_code == 302
+
+    assert other.post(f"/users/{admin_id}/toggle", follow_redirects=False).status_code == 403
+    user_queries.clear()
+    assert other.post(f"/users/{admin_id}/toggle", follow_redirects=False).status_code == 403
+    assert user_queries == []
+
+    assert admin.post(f"/users/{other_id}/toggle", follow_redirects=False).status_code == 302
+    # The promotion drops the cached entry, so it applies on the next request.
+    assert other.post(f"/users/{admin_id}/toggle", follow_redirects=False).status_code == 302
+    with db.SessionLocal() as session:
+        assert session.get(User, admin_id).is_admin is False
+
+
+def test_session_version_stamp_skips_entries_cached_before_the_write():
+    user_id = _create_user("ana")
+    with db.SessionLocal() as session:
+        assert get_current_user(_session_request({"user_id": user_id}), session).is_active
+
+    # Another worker deactivates the user and stamps the session it served.
+    with db.engine.begin() as conn:
+        conn.execute(update(User).where(User.id == user_id).values(is_active=False))
+        version = bump_counter(conn, USERS_VERSION_COUNTER)
+
+    with db.SessionLocal() as session:
+        assert get_current_user(_session_request({"user_id": user_id}), session) is not None
+        stamped = {"user_id": user_id, USERS_VERSION_SESSION_KEY: version}
+        assert get_current_user(_session_request(stamped), session) is None
+
+
+def test_changes_made_on_another_worker_apply_after_the_recheck_interval(monkeypatch, user_queries):
+    user_id = _create_user("ana", is_admin=True)
+    user_queries.clear()
+    with db.SessionLocal() as session:
+        assert get_current_user(_session_request({"user_id": user_id}), session).is_admin
+        # A miss reads the user and the counter in a single statement.
+        assert len(user_queries) == 1
+
+    with db.engine.begin() as conn:
+        conn.execute(update(User).where(User.id == user_id).values(is_admin=False))
+        bump_counter(conn, USERS_VERSION_COUNTER)
+
+    monkeypatch.setattr(user_cache, "recheck_seconds", 0)
+    with db.SessionLocal() as session:
+        assert get_current_user(_session_request({"user_id": user_id}), session).is_admin is False
+
+
+def test_login_gate_redirects_anonymous_requests_except_allowed_paths():
+    _create_user("ana")
+    client = TestClient(app)
+
+    for path in ("/", "/accounts/balances", "/healthz"):
+        response = client.get(path, follow_redirects=False)
+        assert response.status_code == 307, path
+        assert response.headers["location"] == "/login"
+
+    assert client.get("/static/css/layout.css").status_code == 200
+    assert client.get("/health", follow_redirects=False).status_code != 307
+    assert client.get("/notificaciones", follow_redirects=False).status_code == 401
+    webhook = client.post("/transactions/billing/webhook", follow_redirects=False)
+    assert webhook.status_code == 400
+
+    client.post("/login", data={"username": "ana", "password": "secret"}, follow_redirects=False)
+    assert client.get("/accounts/balances", follow_redirects=False).status_code == 200
@@ -0,0 +1,229 @@
+import os
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = BASE_DIR / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+
+from config import db  # noqa: E402
+from config.constants import Currency, InvoiceType  # noqa: E402
+from main import app  # noqa: E402
+from routes import billing_info as billing_info_module  # noqa: E402
+from models import Account, Invoice, RetainedTaxType, RetentionCertificate  # noqa: E402
+from schemas import BillingInfoOut  # noqa: E402
+
+HEADERS = {"X-API-Key": "consumer-key"}
+
+
+@pytest.fixture(autouse=True)
+def setup_database(monkeypatch):
+    monkeypatch.setenv("SELF_BILLING_API_KEY", "consumer-key")
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    db.Base.metadata.create_all(bind=db.engine, checkfirst=True)
+    yield
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+
+
+def _invoice(account_id: int, number: str) -> Invoice:
+    return Invoice(
+        account_id=account_id,
+        date=date(2024, 3, 1),
+        number=number,
+        description="Servicios",
+        amount=Decimal("100.00"),
+        iva_amount=Decimal("21.00"),
+        iibb_amount=Decimal("3.63"),
+        type=InvoiceType.SALE,
+    )
+
+
+def _seed() -> tuple[int, int]:
+    with db.SessionLocal() as session:
+        billing = Account(name="Facturación", currency=Currency.ARS, is_billing=True)
+        other = Account(name="Caja", currency=Currency.ARS)
+        tax_type = RetainedTaxType(name="Retención de IVA")
+        session.add_all([billing, other, tax_type])
+        session.flush()
+        session.add_all(
+            [
+                _invoice(billing.id, "A-1"),
+                _invoice(billing.id, "A-2"),
+                RetentionCertificate(
+                    number="RC-1",
+                    date=date(2024, 3, 2),
+                    invoice_reference="A-1",
+                    retained_tax_type_id=tax_type.id,
+                    amount=Decimal("5.00"),
+                ),
+            ]
+        )
+        session.commit()
+        return billing.id, other.id
+
+
+def test_billing_info_since_cursor_returns_only_changes_and_tombstones():
+    billing_id, other_id = _seed()
+    client = TestClient(app)
+
+    dump = client.get("/facturacion-info", headers=HEADERS).json()
+    assert [inv["number"] for inv in dump["invoices"]] == ["A-1", "A-2"]
+    assert len(dump["retention_certificates"]) == 1
+    cursor = dump["next_cursor"]
+
+    unchanged = client.get("/facturacion-info", params={"since": cursor}, headers=HEADERS).json()
+    assert unchanged["invoices"] == []
+    assert unchanged["deleted"] == {"invoices": [], "retention_certificates": []}
+    assert unchanged["next_cursor"] == cursor
+    assert unchanged["has_more"] is False
+
+    with db.SessionLocal() as session:
+        first, second = session.query(Invoice).order_by(Invoice.id).all()
+        first.description = "Servicios de marzo"
+        second.account_id = other_id
+        session.delete(session.query(RetentionCertificate).one())
+        session.add(_invoice(billing_id, "A-3"))
+        session.commit()
+        first_id, second_id = first.id, second.id
+
+    # Four changes in one commit, read two at a time.
+    page = client.get(
+        "/facturacion-info", params={"since": cursor, "limit": 2}, headers=HEADERS
+    ).json()
+    assert page["has_more"] is True
+    rest = client.get(
+        "/facturacion-info", params={"since": page["next_cursor"]}, headers=HEADERS
+    ).json()
+    assert rest["has_more"] is False
+
+    changed = {inv["id"]: inv for inv in page["invoices"] + rest["invoices"]}
+    assert changed[first_id]["description"] == "Servicios de marzo"
+    assert changed[first_id]["amount"] == "100.00"
+    assert sorted(inv["number"] for inv in changed.values()) == ["A-1", "A-3"]
+    assert page["deleted"]["invoices"] + rest["deleted"]["invoices"] == [second_id]
+    deleted_certificates = (
+        page["deleted"]["retention_certificates"] + rest["deleted"]["retention_certificates"]
+    )
+    assert len(deleted_certificates) == 1
+
+    invalid = client.get("/facturacion-info", params={"since": "nope"}, headers=HEADERS)
+    assert invalid.status_code == 400
+
+
+def test_billing_info_since_cursor_reports_certificates_of_a_renamed_tax_type():
+    _seed()
+    client = TestClient(app)
+    cursor = client.get("/facturacion-info", headers=HEADERS).json()["next_cursor"]
+
+    with db.SessionLocal() as session:
+        session.query(RetainedTaxType).one().name = "Retención de Ganancias"
+        session.commit()
+
+    changes = client.get("/facturacion-info", params={"since": cursor}, headers=HEADERS).json()
+    assert changes["invoices"] == []
+    assert [cert["number"] for cert in changes["retention_certificates"]] == ["RC-1"]
+    assert (
+        changes["retention_certificates"][0]["retained_tax_type"]["name"]
+        == "Retención de Ganancias"
+    )
+    assert changes["next_cursor"] != cursor
+
+
+def test_billing_info_answers_if_none_match_until_billing_tables_change():
+    billing_id, _ = _seed()
+    client = TestClient(app)
+
+    first = client.get("/facturacion-info", headers=HEADERS)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    cached = client.get("/facturacion-info", headers={**HEADERS, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+    changes = client.get(
+        "/facturacion-info",
+        params={"since": first.json()["next_cursor"]},
+        headers={**HEADERS, "If-None-Match": etag},
+    )
+    assert changes.status_code == 200
+    assert changes.headers["ETag"] != etag
+
+    with db.SessionLocal() as session:
+        billing = session.get(Account, billing_id)
+        billing.billing_synced_at = datetime.now(timezone.utc)
+        billing.billing_last_transactions_confirmed_id = 42
+        session.commit()
+    synced = client.get("/facturacion-info", headers={**HEADERS, "If-None-Match": etag})
+    assert synced.status_code == 304
+
+    with db.SessionLocal() as session:
+        session.add(_invoice(billing_id, "A-3"))
+        session.commit()
+
+    refreshed = client.get("/facturacion-info", headers={**HEADERS, "If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != etag
+    assert [inv["number"] for inv in refreshed.json()["invoices"]] == ["A-1", "A-2", "A-3"]
+
+
+def test_billing_info_pages_are_not_answered_with_another_pages_etag():
+    billing_id, _ = _seed()
+    client = TestClient(app)
+    cursor = client.get("/facturacion-info", headers=HEADERS).json()["next_cursor"]
+
+    with db.SessionLocal() as session:
+        session.add_all([_invoice(billing_id, "A-3"), _invoice(billing_id, "A-4")])
+        session.commit()
+
+    etag = None
+    numbers = []
+    while True:
+        params = {"since": cursor, "limit": 1}
+        headers = HEADERS if etag is None else {**HEADERS, "If-None-Match": etag}
+        page = client.get("/facturacion-info", params=params, headers=headers)
+        assert page.status_code == 200
+        etag = page.headers["ETag"]
+        numbers += [inv["number"] for inv in page.json()["invoices"]]
+        cursor = page.json()["next_cursor"]
+        if not page.json()["has_more"]:
+            break
+    assert numbers == ["A-3", "A-4"]
+
+    repeated = client.get(
+        "/facturacion-info", params=params, headers={**HEADERS, "If-None-Match": etag}
+    )
+    assert repeated.status_code == 304
+
+
+def test_billing_info_streams_the_full_dump_in_batches(monkeypatch):
+    billing_id, other_id = _seed()
+    with db.SessionLocal() as session:
+        session.add_all([_invoice(billing_id, f"B-{n}") for n in range(5)])
+        session.add(_invoice(other_id, "X-1"))
+        session.commit()
+    monkeypatch.setattr(billing_info_module, "STREAM_BATCH_SIZE", 2)
+
+    chunks = list(billing_info_module._stream_billing_info(billing_id, "cursor"))
+    streamed = BillingInfoOut.model_validate_json(b"".join(chunks))
+    assert [inv.number for inv in streamed.invoices] == ["A-1", "A-2", *[f"B-{n}" for n in range(5)]]
+    assert len(streamed.retention_certificates) == 1
+    assert streamed.next_cursor == "cursor"
+
+    response = TestClient(app).get("/facturacion-info", headers=HEADERS)
+    assert response.headers["content-type"] == "application/json"
+    dump = BillingInfoOut.model_validate_json(response.content)
+    assert [inv.number for inv in dump.invoices] == ["A-1", "A-2", *[f"B-{n}" for n in range(5)]]
+    assert dump.retention_certificates[0].retained_tax_type.name == "Retención de IVA"
+    assert dump.next_cursor is not None
+    assert response.json()["invoices"][0]["amount"] == "100.00"
@@ -1,27 +1,48 @@
+import asyncio
+import json
+import mmap
 import os
 import sys
-from datetime import date, datetime, timezone
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 from pathlib import Path
 
 import pytest
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from fastapi.testclient import TestClient
+from sqlalchemy import event as sa_event, select
+from sqlalchemy.dialects import postgresql
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 APP_DIR = BASE_DIR / "app"
-if str(APP_DIR) not in sys.path:
-    sys.path.insert(0, str(APP_DIR))
+for path in (BASE_DIR, APP_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
 
 os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
 os.environ.setdefault("DB_SCHEMA", "")
 
 import httpx  # noqa: E402
+from bench.fake_billing import FakeBillingService  # noqa: E402
 from config import db  # noqa: E402
 from config.constants import Currency  # noqa: E402
-from models import Account, BillingTransactionSyncState, Transaction  # noqa: E402
+from main import app  # noqa: E402
+from models import (  # noqa: E402
+    Account,
+    AccountDailyBalance,
+    BillingSyncRun,
+    BillingTransactionSyncState,
+    Transaction,
+)
 from routes import transactions as transactions_module  # noqa: E402
 from routes.transactions import sync_billing_transactions  # noqa: E402
+from services import billing_feed, billing_http, billing_sync  # noqa: E402
+from services.notifications import compute_signature  # noqa: E402
+from services.table_versions import table_versions_etag  # noqa: E402
 
 
 @pytest.fixture(autouse=True)
@@ -32,6 +53,30 @@ def setup_database():
     db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
 
 
+class FakeBillingClient:
+    """Stands in for the shared billing ``httpx.Client``; tests patch get/post."""
+
+    def get(self, *_args, **_kwargs):
+        raise AssertionError("GET no esperado")
+
+    @contextmanager
+    def stream(self, method, url, params=None, headers=None):
+        assert method == "GET"
+        dummy = self.get(url, params=params, headers=headers)
+        yield httpx.Response(dummy.status_code, json=dummy.json())
+
+    def post(self, *_args, **_kwargs):
+        raise AssertionError("POST no esperado")
+
+
+billing_client = FakeBillingClient()
+
+
+@pytest.fixture(autouse=True)
+def fake_billing_client(monkeypatch):
+    monkeypatch.setattr(billing_http, "_client", billing_client)
+
+
 class DummyResponse:
     def __init__(self, status_code: int, payload: dict):
         self.status_code = status_code
@@ -133,11 +178,11 @@ def test_sync_billing_transactions_applies_events_and_acknowledges_checkpoint(mo
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
+    monkeypatch.setattr(billing_client, "get", fake_get)
 
     ack_calls: dict = {}
 
-    def fake_post(url, json, headers, timeout):
+    def fake_post(url, json, headers, timeout=None):
         ack_calls.update(
             {
                 "url": url,
@@ -158,7 +203,7 @@ def test_sync_billing_transactions_applies_events_and_acknowledges_checkpoint(mo
             },
         )
 
-    monkeypatch.setattr(httpx, "post", fake_post)
+    monkeypatch.setattr(billing_client, "post", fake_post)
 
     with db.SessionLocal() as session:
         account = Account(
@@ -305,8 +350,8 @@ def test_sync_billing_transactions_handles_created_then_updated_in_same_batch(mo
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -378,8 +423,8 @@ def test_sync_billing_transactions_handles_create_update_delete_sequence(monkeyp
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -447,8 +492,8 @@ def test_sync_billing_transactions_ignores_events_after_delete(monkeypatch):
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -515,8 +560,8 @@ def test_sync_billing_transactions_applies_last_update_for_existing(monkeypatch)
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -596,7 +641,7 @@ def test_sync_billing_transactions_does_not_ack_when_commit_fails(monkeypatch):
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
+    monkeypatch.setattr(billing_client, "get", fake_get)
 
     ack_called = False
 
@@ -678,7 +723,7 @@ def test_sync_billing_transactions_keeps_events_when_ack_fails(monkeypatch):
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
+    monkeypatch.setattr(billing_client, "get", fake_get)
 
     def failing_ack(*_args, **_kwargs):
         raise HTTPException(
@@ -751,8 +796,8 @@ def test_sync_billing_transactions_preserves_existing_notes_when_missing(monkeyp
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -818,8 +863,8 @@ def test_sync_billing_transactions_requires_description(monkeypatch):
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -888,8 +933,8 @@ def test_sync_billing_transactions_is_idempotent_for_repeated_event_batch(monkey
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -943,7 +988,7 @@ def test_sync_billing_transactions_fails_when_deleting_missing_transaction(monke
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
+    monkeypatch.setattr(billing_client, "get", fake_get)
 
     def fake_ack(*_args, **_kwargs):
         nonlocal ack_called
@@ -995,7 +1040,7 @@ def test_sync_billing_transactions_requires_billing_account(monkeypatch):
     os.environ["BILLING_API_KEY"] = "secret"
 
     monkeypatch.setattr(
-        httpx,
+        billing_client,
         "get",
         lambda *_args, **_kwargs: (_ for _ in ()).throw(AssertionError("GET no esperado")),
     )
@@ -1040,8 +1085,8 @@ def test_sync_billing_transactions_created_event_marks_transaction_available(mon
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -1111,8 +1156,8 @@ def test_sync_billing_transactions_created_updated_keeps_available_when_exportab
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -1185,8 +1230,8 @@ def test_sync_billing_transactions_created_updated_without_exportable_becomes_un
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -1243,8 +1288,8 @@ def test_sync_billing_transactions_created_deleted_becomes_unavailable(monkeypat
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -1301,8 +1346,8 @@ def test_sync_billing_transactions_marks_unavailable_for_custom_inkwell(monkeypa
             },
         )
 
-    monkeypatch.setattr(httpx, "get", fake_get)
-    monkeypatch.setattr(httpx, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+    monkeypatch.setattr(billing_client, "get", fake_get)
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
 
     with db.SessionLocal() as session:
         account = Account(
@@ -1323,3 +1368,803 @@ def test_sync_billing_transactions_marks_unavailable_for_custom_inkwell(monkeypa
         assert state.exportable_movement_id == 990
         assert state.is_custom_inkwell is True
         assert state.status == "unavailable"
+
+
+def _count_selects_during_sync(monkeypatch, batch_size: int) -> int:
+    os.environ["FACTURACION_RUTA_DATA"] = "https://facturacion.example/api/movimientos_cuenta_facturada"
+    os.environ["BILLING_API_KEY"] = "secret"
+
+    events = []
+    for offset in range(batch_size):
+        remote_id = 8000 + offset
+        payload = {
+            "id": remote_id,
+            "date": "2024-08-01",
+            "amount": "5.00",
+            "description": f"Movimiento {remote_id}",
+            "notes": "",
+        }
+        event = "updated" if offset % 2 else "created"
+        events.append(_build_transaction_event(event, remote_id, payload))
+
+    monkeypatch.setattr(
+        billing_client,
+        "get",
+        lambda *_args, **_kwargs: DummyResponse(
+            200,
+            {
+                "transactions": [],
+                "transaction_events": events,
+                "transactions_checkpoint_id": 910,
+                "last_confirmed_transaction_id": 900,
+                "changes": [],
+                "changes_checkpoint_id": 910,
+                "last_confirmed_change_id": 900,
+            },
+        ),
+    )
+    monkeypatch.setattr(billing_client, "post", lambda *_args, **_kwargs: DummyResponse(200, {}))
+
+    with db.SessionLocal() as session:
+        account = Account(
+            name="Cuenta facturación",
+            opening_balance=Decimal("0"),
+            currency=Currency.ARS,
+            color="#000000",
+            is_active=True,
+            is_billing=True,
+        )
+        session.add(account)
+        session.flush()
+        for offset in range(1, batch_size, 2):
+            session.add(
+                Transaction(
+                    account_id=account.id,
+                    date=date(2024, 7, 1),
+                    description="Previo",
+                    amount=Decimal("1.00"),
+                    notes="",
+                    billing_transaction_id=8000 + offset,
+                )
+            )
+        session.commit()
+
+        selects: list[str] = []
+
+        def count_select(_conn, _cursor, statement, *_args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append(statement)
+
+        sa_event.listen(db.engine, "before_cursor_execute", count_select)
+        try:
+            result = sync_billing_transactions(limit=500, db=session)
+        finally:
+            sa_event.remove(db.engine, "before_cursor_execute", count_select)
+
+        assert result["nuevos"] == (batch_size + 1) // 2
+        assert result["modificados"] == batch_size // 2
+        return len(selects)
+
+
+def test_sync_billing_transactions_lookups_do_not_grow_with_batch_size(monkeypatch):
+    small_batch = _count_selects_during_sync(monkeypatch, 2)
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    db.Base.metadata.create_all(bind=db.engine, checkfirst=True)
+    large_batch = _count_selects_during_sync(monkeypatch, 40)
+
+    assert small_batch == large_batch
+
+
+def test_sync_billing_transactions_bulk_write_rejects_stale_states_and_updates_rollup():
+    with db.SessionLocal() as session:
+        account = Account(
+            name="Cuenta facturación",
+            opening_balance=Decimal("0"),
+            currency=Currency.ARS,
+            color="#000000",
+            is_active=True,
+            is_billing=True,
+        )
+        session.add(account)
+        session.flush()
+        session.add(
+            BillingTransactionSyncState(
+                transaction_id=9100, status="available", updated_at_event_id=50
+            )
+        )
+        session.commit()
+
+        staged = {
+            remote_id: {
+                "billing_transaction_id": remote_id,
+                "date": date(2024, 9, 1),
+                "amount": Decimal("10.00"),
+                "description": "Movimiento",
+                "notes": "",
+            }
+            for remote_id in (9100, 9101)
+        }
+        # 9100 carries an older event than the one already stored.
+        states = {
+            9100: {
+                "transaction_id": 9100,
+                "exportable_movement_id": None,
+                "is_custom_inkwell": False,
+                "status": "unavailable",
+                "updated_at_event_id": 40,
+            },
+            9101: {
+                "transaction_id": 9101,
+                "exportable_movement_id": 1,
+                "is_custom_inkwell": False,
+                "status": "available",
+                "updated_at_event_id": 41,
+            },
+        }
+
+        etag_before = table_versions_etag(session.connection(), ["transactions"])
+        accepted = transactions_module._write_billing_batch(
+            session, account.id, states, {}, staged
+        )
+        session.commit()
+
+        assert accepted == {9101}
+        # Core writes bypass the session hooks but still bump the table version.
+        assert table_versions_etag(session.connection(), ["transactions"]) != etag_before
+        stored_ids = session.scalars(select(Transaction.billing_transaction_id)).all()
+        assert stored_ids == [9101]
+        stale_state = session.get(BillingTransactionSyncState, 9100)
+        assert stale_state.status == "available"
+        assert stale_state.updated_at_event_id == 50
+
+        rollup = session.scalars(select(AccountDailyBalance)).all()
+        assert [(row.date, row.cumulative_balance) for row in rollup] == [
+            (date(2024, 9, 1), Decimal("10.00"))
+        ]
+
+
+def test_sync_billing_transactions_bulk_write_skips_rows_owned_by_another_account():
+    with db.SessionLocal() as session:
+        billing = Account(name="Cuenta facturación", currency=Currency.ARS, is_billing=True)
+        other = Account(name="Caja", currency=Currency.ARS)
+        session.add_all([billing, other])
+        session.flush()
+        session.add(
+            Transaction(
+                account_id=other.id,
+                date=date(2024, 9, 1),
+                description="Importado a mano",
+                amount=Decimal("5.00"),
+                notes="",
+                billing_transaction_id=9200,
+            )
+        )
+        session.commit()
+
+        staged = {
+            9200: {
+                "billing_transaction_id": 9200,
+                "date": date(2024, 9, 2),
+                "amount": Decimal("10.00"),
+                "description": "Movimiento",
+                "notes": "",
+            }
+        }
+        states = {
+            9200: {
+                "transaction_id": 9200,
+                "exportable_movement_id": 1,
+                "is_custom_inkwell": False,
+                "status": "available",
+                "updated_at_event_id": 1,
+            }
+        }
+        transactions_module._write_billing_batch(session, billing.id, states, {}, staged)
+        session.commit()
+
+        stored = session.scalars(select(Transaction)).one()
+        assert (stored.account_id, stored.amount) == (other.id, Decimal("5.00"))
+        rollup = {
+            row.account_id: row.cumulative_balance
+            for row in session.scalars(select(AccountDailyBalance))
+        }
+        assert rollup == {other.id: Decimal("5.00")}
+
+
+def test_sync_billing_transactions_drain_mode_syncs_until_caught_up(monkeypatch):
+    os.environ["FACTURACION_RUTA_DATA"] = "https://facturacion.example/api/movimientos_cuenta_facturada"
+    os.environ["BILLING_API_KEY"] = "secret"
+
+    pages = [[10, 11], [12, 13], [14]]
+    remote = {"confirmed": 0, "served": 0}
+    requests_seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request.method)
+        assert request.headers["X-API-Key"] == "secret"
+        if request.method == "POST":
+            remote["confirmed"] = json.loads(request.content)["movements_checkpoint_id"]
+            return httpx.Response(200, json={"last_transaction_id": remote["confirmed"]})
+        ids = pages[remote["served"]]
+        remote["served"] += 1
+        return httpx.Response(
+            200,
+            json={
+                "transactions": [],
+                "transaction_events": [
+                    _build_transaction_event(
+                        "created",
+                        remote_id,
+                        {
+                            "id": remote_id,
+                            "date": "2024-10-01",
+                            "amount": "3.00",
+                            "description": f"Movimiento {remote_id}",
+                        },
+                    )
+                    for remote_id in ids
+                ],
+                "transactions_checkpoint_id": ids[-1],
+                "last_confirmed_transaction_id": remote["confirmed"],
+                "has_more_transactions": remote["served"] < len(pages),
+                "changes": [],
+                "changes_checkpoint_id": None,
+                "last_confirmed_change_id": None,
+                "has_more_changes": False,
+            },
+        )
+
+    monkeypatch.setattr(
+        billing_http, "_client", httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+    with db.SessionLocal() as session:
+        session.add(
+            Account(
+                name="Cuenta facturación",
+                opening_balance=Decimal("0"),
+                currency=Currency.ARS,
+                color="#000000",
+                is_active=True,
+                is_billing=True,
+            )
+        )
+        session.commit()
+
+        result = sync_billing_transactions(limit=2, drain=True, db=session)
+
+        assert requests_seen == ["GET", "POST"] * 3
+        assert result["drained"] is True
+        assert result["nuevos"] == 5
+        assert [page["events"] for page in result["pages"]] == [2, 2, 1]
+        assert all("fetch_ms" in page and "ack_ms" in page for page in result["pages"])
+        assert result["transactions_checkpoint_id"] == 14
+        assert result["transactions_confirmed_id"] == 14
+        stored = session.scalars(
+            select(Transaction.billing_transaction_id).order_by(Transaction.billing_transaction_id)
+        ).all()
+        assert stored == [10, 11, 12, 13, 14]
+
+
+def test_sync_billing_transactions_records_run_history(monkeypatch):
+    monkeypatch.setenv("FACTURACION_RUTA_DATA", "https://facturacion.example/api/movimientos_cuenta_facturada")
+    monkeypatch.setenv("BILLING_API_KEY", "secret")
+    monkeypatch.setenv("BILLING_HTTP_RETRIES", "0")
+
+    remote = {"fail": False}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(200, json={"last_transaction_id": 21})
+        if remote["fail"]:
+            return httpx.Response(500, json={"detail": "Servicio caído"})
+        return httpx.Response(
+            200,
+            json={
+                "transactions": [],
+                "transaction_events": [
+                    _build_transaction_event(
+                        "created",
+                        remote_id,
+                        {
+                            "id": remote_id,
+                            "date": "2024-10-01",
+                            "amount": "3.00",
+                            "description": f"Movimiento {remote_id}",
+                        },
+                    )
+                    for remote_id in (20, 21)
+                ],
+                "transactions_checkpoint_id": 21,
+                "last_confirmed_transaction_id": 0,
+                "has_more_transactions": False,
+                "changes": [],
+            },
+        )
+
+    monkeypatch.setattr(
+        billing_http, "_client", httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+    with db.SessionLocal() as session:
+        session.add(
+            Account(
+                name="Cuenta facturación",
+                opening_balance=Decimal("0"),
+                currency=Currency.ARS,
+                color="#000000",
+                is_active=True,
+                is_billing=True,
+            )
+        )
+        session.commit()
+
+        result = sync_billing_transactions(limit=10, db=session)
+        assert result["nuevos"] == 2
+
+        remote["fail"] = True
+        with pytest.raises(HTTPException) as exc_info:
+            sync_billing_transactions(limit=10, db=session)
+        assert exc_info.value.status_code == status.HTTP_502_BAD_GATEWAY
+
+        history = transactions_module.list_billing_sync_runs(limit=10, db=session)
+
+    failed, succeeded = history["runs"]
+    assert succeeded.trigger == "manual"
+    assert succeeded.status == "success"
+    assert succeeded.pages == 1
+    assert succeeded.created_count == 2
+    assert succeeded.bytes_received > 0
+    assert succeeded.error_detail is None
+    assert failed.status == "failed"
+    assert failed.pages == 0
+    assert failed.error_detail == "Servicio caído"
+
+    stats = history["stats"]
+    assert stats["runs"] == 2
+    assert stats["failed"] == 1
+    assert set(stats["duration_ms"]) == {"p50", "p90", "p99", "max"}
+    assert set(stats["phases_ms"]) == {"fetch", "parse", "apply", "commit", "ack"}
+    assert stats["bytes_received"]["max"] == succeeded.bytes_received
+
+
+def test_storing_a_sync_run_prunes_runs_past_retention(monkeypatch):
+    monkeypatch.setenv("BILLING_SYNC_RUN_RETENTION_DAYS", "7")
+    now = datetime.now(timezone.utc)
+
+    def run(age: timedelta) -> BillingSyncRun:
+        return BillingSyncRun(
+            trigger="scheduled", status="success", started_at=now - age, finished_at=now - age
+        )
+
+    with db.SessionLocal() as session:
+        session.add_all([run(timedelta(days=8)), run(timedelta(days=6))])
+        session.commit()
+
+        transactions_module._store_billing_sync_run(session, run(timedelta(0)))
+
+        ages = session.scalars(select(BillingSyncRun.started_at)).all()
+    assert len(ages) == 2
+    assert all(now - started_at.replace(tzinfo=timezone.utc) < timedelta(days=7) for started_at in ages)
+
+
+def test_sync_billing_transactions_shares_lock_with_scheduled_sync(monkeypatch, tmp_path):
+    monkeypatch.setenv("BILLING_SYNC_LOCK_FILE", str(tmp_path / "billing-sync.lock"))
+    monkeypatch.setattr(
+        billing_client,
+        "get",
+        lambda *_args, **_kwargs: (_ for _ in ()).throw(AssertionError("GET no esperado")),
+    )
+
+    with db.SessionLocal() as session:
+        session.add(
+            Account(
+                name="Cuenta facturación",
+                opening_balance=Decimal("0"),
+                currency=Currency.ARS,
+                color="#000000",
+                is_active=True,
+                is_billing=True,
+            )
+        )
+        session.commit()
+
+        with billing_sync.billing_sync_lock() as acquired:
+            assert acquired
+
+            with pytest.raises(HTTPException) as exc_info:
+                sync_billing_transactions(limit=10, db=session)
+            assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+
+            assert billing_sync.run_scheduled_billing_sync() is False
+
+        with billing_sync.billing_sync_lock() as acquired:
+            assert acquired
+
+
+def test_billing_sync_lock_on_postgres_does_not_stay_idle_in_transaction(monkeypatch):
+    calls = []
+
+    class PostgresConnection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *_exc):
+            return False
+
+        def scalar(self, statement):
+            calls.append(statement.selected_columns[0].name)
+            return True
+
+        def commit(self):
+            calls.append("commit")
+
+    class PostgresEngine:
+        dialect = postgresql.dialect()
+
+        def connect(self):
+            return PostgresConnection()
+
+    monkeypatch.setattr(billing_sync, "engine", PostgresEngine())
+
+    with billing_sync.billing_sync_lock() as acquired:
+        assert acquired
+        assert calls == ["pg_try_advisory_lock", "commit"]
+
+    assert calls[2:] == ["pg_advisory_unlock", "commit"]
+
+
+def test_billing_get_retries_transient_failures_with_backoff(monkeypatch):
+    responses = iter(
+        [
+            httpx.ConnectError("sin conexión"),
+            httpx.Response(503),
+            httpx.Response(200, json={"ok": True}),
+        ]
+    )
+    attempts: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.method)
+        outcome = next(responses)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    delays: list[float] = []
+    monkeypatch.setattr(billing_http.time, "sleep", delays.append)
+    monkeypatch.setattr(
+        billing_http, "_client", httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+    response, body = billing_http.billing_stream_get("https://facturacion.example/feed")
+
+    assert response.status_code == 200
+    assert json.loads(body.buffer()) == {"ok": True}
+    assert attempts == ["GET", "GET", "GET"]
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= billing_http.RETRY_BASE_DELAY_SECONDS
+    assert 0 <= delays[1] <= 2 * billing_http.RETRY_BASE_DELAY_SECONDS
+
+
+def test_billing_http_retries_counts_retries_after_the_first_attempt(monkeypatch):
+    attempts: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.method)
+        return httpx.Response(503)
+
+    monkeypatch.setenv("BILLING_HTTP_RETRIES", "1")
+    monkeypatch.setattr(billing_http.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(
+        billing_http, "_client", httpx.Client(transport=httpx.MockTransport(handler))
+    )
+
+    response, body = billing_http.billing_stream_get("https://facturacion.example/feed")
+
+    assert (response.status_code, body) == (503, None)
+    assert attempts == ["GET", "GET"]
+
+
+class InlineExecutor(Executor):
+    """Runs submitted work in the calling thread, so it sees the in-memory database."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+def test_sync_billing_transactions_async_job_can_be_polled(monkeypatch, tmp_path):
+    os.environ["FACTURACION_RUTA_DATA"] = "https://facturacion.example/api/movimientos_cuenta_facturada"
+    os.environ["BILLING_API_KEY"] = "secret"
+    monkeypatch.setenv("BILLING_SYNC_LOCK_FILE", str(tmp_path / "billing-sync.lock"))
+    monkeypatch.setattr(transactions_module, "billing_db_executor", InlineExecutor())
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(200, json={"last_transaction_id": 31})
+        return httpx.Response(
+            200,
+            json={
+                "transactions": [],
+                "transaction_events": [
+                    _build_transaction_event(
+                        "created",
+                        31,
+                        {
+                            "id": 31,
+                            "date": "2024-11-02",
+                            "amount": "7.50",
+                            "description": "Asíncrono",
+                        },
+                    )
+                ],
+                "transactions_checkpoint_id": 31,
+                "last_confirmed_transaction_id": 30,
+                "changes": [],
+            },
+        )
+
+    with db.SessionLocal() as session:
+        session.add(
+            Account(
+                name="Cuenta facturación",
+                opening_balance=Decimal("0"),
+                currency=Currency.ARS,
+                color="#000000",
+                is_active=True,
+                is_billing=True,
+            )
+        )
+        session.commit()
+
+    async def run() -> tuple[httpx.Response, dict]:
+        monkeypatch.setattr(
+            billing_http,
+            "_async_client",
+            httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        accepted = await transactions_module.sync_billing_transactions_async(
+            limit=10, wait=False
+        )
+        job_id = json.loads(accepted.body)["job_id"]
+        for _ in range(100):
+            job = transactions_module.get_billing_sync_job(job_id)
+            if job["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0)
+        await billing_http.close_billing_async_client()
+        return accepted, job
+
+    accepted, job = asyncio.run(run())
+
+    assert accepted.status_code == status.HTTP_202_ACCEPTED
+    assert json.loads(accepted.body)["status_url"].endswith(job["job_id"])
+    assert job["status"] == "done"
+    assert job["result"]["nuevos"] == 1
+    assert job["result"]["transactions_confirmed_id"] == 31
+    with db.SessionLocal() as session:
+        stored = session.scalar(select(Transaction).where(Transaction.billing_transaction_id == 31))
+        assert stored is not None
+        assert stored.description == "Asíncrono"
+
+    with pytest.raises(HTTPException) as exc_info:
+        transactions_module.get_billing_sync_job("desconocido")
+    assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_parse_billing_feed_streams_items_from_spooled_body():
+    payload = {
+        "transactions": [
+            {"id": 41, "date": "2024-12-01", "amount": "1.00", "description": 'Con "comillas" y ]}'},
+            {"id": 42, "date": "2024-12-02", "amount": "2.00", "description": "Ünïcode \\ barra"},
+        ],
+        "transaction_events": [
+            {"id": 1, "event": "created", "transaction_id": 41},
+            {"id": 2, "event": "updated", "transaction_id": 42, "transaction": {"id": 42, "notes": "propio"}},
+        ],
+        "changes": None,
+        "transactions_checkpoint_id": 2,
+        "last_confirmed_transaction_id": 0,
+        "has_more_transactions": False,
+    }
+    raw = json.dumps(payload, indent=2, ensure_ascii=False).encode("utf-8")
+    body = billing_feed.SpooledBody(max_memory=64)
+    for offset in range(0, len(raw), 50):
+        body.write(raw[offset : offset + 50])
+
+    feed = transactions_module._parse_billing_feed(httpx.Response(200), body)
+    spilled = body.buffer()
+    assert isinstance(spilled, mmap.mmap)
+
+    events = list(feed.transaction_events)
+    assert len(feed.transaction_events) == 2
+    assert events[0]["transaction"]["description"] == 'Con "comillas" y ]}'
+    assert events[1]["transaction"] == {"id": 42, "notes": "propio"}
+    assert len(feed.remote_changes) == 0
+    assert feed.transactions_checkpoint == 2
+    assert feed.has_more is False
+
+    for malformed in (b'{"transaction_events": [{"id": 1}', b'{"changes": {"id": 1}}', b"[]"):
+        broken = billing_feed.SpooledBody()
+        broken.write(malformed)
+        with pytest.raises(HTTPException) as exc_info:
+            transactions_module._parse_billing_feed(httpx.Response(200), broken)
+        assert exc_info.value.status_code == status.HTTP_502_BAD_GATEWAY
+
+    body.close()
+    assert spilled.closed
+
+    # Only the structure is checked up front; a bad item fails when applied.
+    broken = billing_feed.SpooledBody()
+    broken.write(b'{"transaction_events": [{"id": 1, "event": nope}]}')
+    feed = transactions_module._parse_billing_feed(httpx.Response(200), broken)
+    assert len(feed.transaction_events) == 1
+    with db.SessionLocal() as session:
+        account = Account(name="Cuenta facturación", currency=Currency.ARS, is_billing=True)
+        session.add(account)
+        session.commit()
+        with pytest.raises(HTTPException) as exc_info:
+            transactions_module._apply_billing_feed(session, account, feed)
+    assert exc_info.value.status_code == status.HTTP_502_BAD_GATEWAY
+
+
+def _signed_push(payload: dict, secret: str = "webhook-secret") -> tuple[bytes, dict[str, str]]:
+    body = json.dumps(payload).encode("utf-8")
+    timestamp = str(int(time.time()))
+    return body, {
+        "Content-Type": "application/json",
+        "X-Timestamp": timestamp,
+        "X-Signature": compute_signature(secret, timestamp, body),
+    }
+
+
+def test_billing_webhook_applies_pushed_events_with_monotonic_rules(monkeypatch, tmp_path):
+    monkeypatch.setenv("BILLING_WEBHOOK_SECRET", "webhook-secret")
+    monkeypatch.setenv("BILLING_SYNC_LOCK_FILE", str(tmp_path / "billing-sync.lock"))
+    monkeypatch.setattr(transactions_module, "billing_db_executor", InlineExecutor())
+
+    with db.SessionLocal() as session:
+        session.add(
+            Account(
+                name="Cuenta facturación",
+                opening_balance=Decimal("0"),
+                currency=Currency.ARS,
+                color="#000000",
+                is_active=True,
+                is_billing=True,
+            )
+        )
+        session.commit()
+
+    client = TestClient(app)
+    created = _build_transaction_event(
+        "created",
+        40,
+        {"id": 40, "date": "2024-12-01", "amount": "9.00", "description": "Empujado"},
+    )
+    created["id"] = 5
+    body, headers = _signed_push({"transaction_events": [created]})
+    response = client.post("/transactions/billing/webhook", content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["nuevos"] == 1
+
+    stale = _build_transaction_event(
+        "updated",
+        40,
+        {"id": 40, "date": "2024-12-01", "amount": "1.00", "description": "Viejo"},
+    )
+    stale["id"] = 4
+    body, headers = _signed_push({"transaction_events": [stale]})
+    response = client.post("/transactions/billing/webhook", content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["modificados"] == 0
+
+    body, headers = _signed_push({"transaction_events": [stale]}, secret="otro")
+    response = client.post("/transactions/billing/webhook", content=body, headers=headers)
+    assert response.status_code == 401
+
+    with db.SessionLocal() as session:
+        stored = session.scalar(select(Transaction).where(Transaction.billing_transaction_id == 40))
+        assert stored.amount == Decimal("9.00")
+        assert stored.description == "Empujado"
+        state = session.get(BillingTransactionSyncState, 40)
+        assert state.updated_at_event_id == 5
+        account = session.scalar(select(Account).where(Account.is_billing == True))
+        assert account.billing_last_transactions_checkpoint_id is None
+
+        runs = session.scalars(select(BillingSyncRun)).all()
+        assert [run.trigger for run in runs] == ["webhook", "webhook"]
+
+        # With pushes arriving and a recent poll, the scheduled poll is skipped.
+        now = datetime.now(timezone.utc)
+        session.add(
+            BillingSyncRun(
+                trigger="scheduled", status="success", started_at=now, finished_at=now
+            )
+        )
+        session.commit()
+
+    monkeypatch.setattr(
+        billing_client,
+        "get",
+        lambda *_args, **_kwargs: (_ for _ in ()).throw(AssertionError("GET no esperado")),
+    )
+    assert billing_sync.run_scheduled_billing_sync() is False
+
+
+def test_billing_webhook_waits_for_a_running_sync_then_asks_to_retry(monkeypatch, tmp_path):
+    monkeypatch.setenv("BILLING_WEBHOOK_SECRET", "webhook-secret")
+    monkeypatch.setenv("BILLING_SYNC_LOCK_FILE", str(tmp_path / "billing-sync.lock"))
+    monkeypatch.setattr(transactions_module, "billing_db_executor", InlineExecutor())
+    monkeypatch.setattr(transactions_module, "BILLING_WEBHOOK_LOCK_POLL_SECONDS", 0.01)
+    with db.SessionLocal() as session:
+        session.add(Account(name="Cuenta facturación", currency=Currency.ARS, is_billing=True))
+        session.commit()
+    created = _build_transaction_event(
+        "created", 41, {"id": 41, "date": "2024-12-01", "amount": "9.00", "description": "Empujado"}
+    )
+    body, headers = _signed_push({"transaction_events": [created]})
+    client = TestClient(app)
+
+    running_sync = billing_sync.billing_sync_lock()
+    assert running_sync.__enter__()
+    monkeypatch.setenv("BILLING_WEBHOOK_LOCK_WAIT_SECONDS", "0")
+    busy = client.post("/transactions/billing/webhook", content=body, headers=headers)
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == str(transactions_module.BILLING_WEBHOOK_RETRY_AFTER_SECONDS)
+
+    monkeypatch.setenv("BILLING_WEBHOOK_LOCK_WAIT_SECONDS", "5")
+    threading.Timer(0.1, running_sync.__exit__, (None, None, None)).start()
+    applied = client.post("/transactions/billing/webhook", content=body, headers=headers)
+    assert applied.status_code == 200
+    assert applied.json()["nuevos"] == 1
+
+
+@pytest.mark.parametrize("chunk_size", [transactions_module.BILLING_APPLY_CHUNK_SIZE, 7])
+def test_sync_billing_transactions_drains_fake_service_to_its_final_state(
+    monkeypatch, tmp_path, chunk_size
+):
+    monkeypatch.setattr(transactions_module, "BILLING_APPLY_CHUNK_SIZE", chunk_size)
+    monkeypatch.setenv("FACTURACION_RUTA_DATA", "https://facturacion.example/api/movimientos_cuenta_facturada")
+    monkeypatch.setenv("BILLING_API_KEY", "secret")
+    monkeypatch.setenv("BILLING_SYNC_LOCK_FILE", str(tmp_path / "billing-sync.lock"))
+
+    service = FakeBillingService(
+        300, update_ratio=0.4, delete_ratio=0.2, out_of_order_ratio=0.2, snapshot_bytes=2048, seed=7
+    )
+    monkeypatch.setattr(billing_http, "_client", httpx.Client(transport=service.transport()))
+
+    with db.SessionLocal() as session:
+        session.add(
+            Account(
+                name="Cuenta facturación",
+                opening_balance=Decimal("0"),
+                currency=Currency.ARS,
+                color="#000000",
+                is_active=True,
+                is_billing=True,
+            )
+        )
+        session.commit()
+
+        result = sync_billing_transactions(limit=50, drain=True, max_pages=20, db=session)
+
+        assert result["drained"] is True
+        assert service.pages_served == 6
+        assert result["transactions_confirmed_id"] == 300
+        stored = {
+            tx.billing_transaction_id: tx
+            for tx in session.scalars(
+                select(Transaction).where(Transaction.billing_transaction_id.isnot(None))
+            )
+        }
+        expected = service.live_transactions()
+        assert set(stored) == set(expected)
+        for remote_id, payload in expected.items():
+            assert stored[remote_id].amount == Decimal(payload["amount"])
+            assert stored[remote_id].notes == payload["notes"]
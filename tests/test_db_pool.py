@@ -0,0 +1,71 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+
+from config.db_pool import (  # noqa: E402
+    TimedQueuePool,
+    engine_options,
+    instrument_pool,
+    pool_metrics,
+)
+from routes.health import health_db  # noqa: E402
+
+
+def test_engine_options_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("DB_POOL_RECYCLE_SECONDS", "300")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+
+    options = engine_options("postgresql+psycopg2://u:p@db/app")
+    assert options["poolclass"] is TimedQueuePool
+    assert (options["pool_size"], options["max_overflow"]) == (3, 1)
+    assert (options["pool_pre_ping"], options["pool_recycle"]) == (False, 300)
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+    assert set(engine_options("sqlite+pysqlite:///:memory:")) == {"pool_pre_ping", "pool_recycle"}
+
+
+def test_pool_metrics_track_checkouts_overflow_and_timeouts(monkeypatch, tmp_path):
+    monkeypatch.setenv("DB_POOL_SIZE", "1")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    monkeypatch.setenv("DB_POOL_TIMEOUT_SECONDS", "0")
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **engine_options("sqlite:///file"))
+    instrument_pool(engine)
+    pool_metrics.reset()
+    try:
+        first = engine.connect()
+        second = engine.connect()
+        first.execute(text("SELECT 1"))
+
+        busy = pool_metrics.snapshot(engine.pool)
+        assert (busy["checked_out"], busy["overflow"]) == (2, 1)
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+        first.close()
+        second.close()
+        stats = pool_metrics.snapshot(engine.pool)
+    finally:
+        engine.dispose()
+
+    assert stats["pool"] == "TimedQueuePool"
+    assert (stats["connects"], stats["checkouts"], stats["checkins"]) == (2, 2, 2)
+    assert stats["timeouts"] == 1
+    assert stats["checked_out"] == 0
+    assert set(stats["wait_ms"]) == {"p50", "p90", "p99", "max"}
+    assert stats["checkout_ms"]["max"] >= stats["checkout_ms"]["p50"]
+
+
+def test_health_db_reports_the_application_pool():
+    assert health_db()["pool"] == "StaticPool"
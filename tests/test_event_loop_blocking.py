@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+APP_DIR = BASE_DIR / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+os.environ.setdefault("SECRETO_NOTIFICACIONES_IW_TA", "test-secret")
+
+from auth import hash_password  # noqa: E402
+from config import db  # noqa: E402
+from config.constants import Currency, InvoiceType  # noqa: E402
+import main  # noqa: E402
+from main import app  # noqa: E402
+from models import Account, Invoice, User  # noqa: E402
+from services.notifications import compute_signature, require_shared_secret  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def setup_database():
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    db.Base.metadata.create_all(bind=db.engine, checkfirst=True)
+    yield
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+
+
+@pytest.fixture
+def loop_queries():
+    """Statements executed from a thread that is running an event loop."""
+
+    flagged = []
+
+    def flag_blocking_query(conn, cursor, statement, *args):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        flagged.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", flag_blocking_query)
+    yield flagged
+    event.remove(db.engine, "before_cursor_execute", flag_blocking_query)
+
+
+def _seed() -> int:
+    with db.SessionLocal() as session:
+        account = Account(name="Facturación", currency=Currency.ARS, is_billing=True)
+        session.add_all(
+            [
+                account,
+                User(
+                    username="admin",
+                    email="admin@example.com",
+                    password_hash=hash_password("secret"),
+                    is_admin=True,
+                    is_active=True,
+                ),
+            ]
+        )
+        session.flush()
+        invoice = Invoice(
+            account_id=account.id,
+            date=date(2024, 3, 1),
+            number="A-1",
+            description="Servicios",
+            amount=Decimal("100.00"),
+            iva_amount=Decimal("21.00"),
+            iibb_amount=Decimal("3.63"),
+            type=InvoiceType.SALE,
+        )
+        session.add(invoice)
+        session.commit()
+        return invoice.id
+
+
+def test_guard_flags_queries_made_on_the_event_loop(loop_queries):
+    async def blocking():
+        with db.SessionLocal() as session:
+            session.scalar(select(User.id))
+
+    asyncio.run(blocking())
+    assert len(loop_queries) == 1
+
+
+def test_page_and_notification_handlers_keep_queries_off_the_event_loop(
+    monkeypatch, loop_queries
+):
+    # Newer Starlette only accepts the request-first TemplateResponse signature.
+    render = main.templates.TemplateResponse
+    monkeypatch.setattr(
+        main.templates,
+        "TemplateResponse",
+        lambda name, context, **kwargs: render(context["request"], name, context, **kwargs),
+    )
+    invoice_id = _seed()
+    client = TestClient(app)
+    login = client.post(
+        "/login", data={"username": "admin", "password": "secret"}, follow_redirects=False
+    )
+    assert login.status_code == 302
+
+    for path in (
+        "/",
+        "/billing.html",
+        "/certificados-retencion.html",
+        "/billing-account-details.html",
+        f"/invoice/{invoice_id}",
+        f"/invoice/{invoice_id}/edit",
+    ):
+        assert client.get(path).status_code == 200, path
+
+    payload = {
+        "type": "ventas.presupuesto_creado.v1",
+        "occurred_at": datetime.now(timezone.utc).isoformat(),
+        "title": "Nuevo presupuesto",
+        "body": "Se creó un presupuesto",
+    }
+    body = json.dumps(payload)
+    timestamp = str(int(time.time()))
+    created = client.post(
+        "/notificaciones",
+        content=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-Timestamp": timestamp,
+            "X-Idempotency-Key": str(uuid.uuid4()),
+            "X-Source-App": "app-b",
+            "X-Signature": compute_signature(
+                require_shared_secret(), timestamp, body.encode("utf-8")
+            ),
+        },
+    )
+    assert created.status_code == 202
+    ack = client.post("/notificaciones", json={"action": "ack", "id": created.json()["id"]})
+    assert ack.status_code == 200
+
+    assert loop_queries == []
@@ -24,7 +24,7 @@ os.environ.setdefault("NOTIFICACIONES_KEY_ALGORITHM", "HS256")
 os.environ.setdefault("NOTIF_SOURCE_APP", "app-a")
 os.environ.setdefault("PEER_BASE_URL", "https://peer.example.com")
 
-from auth import hash_password  # noqa: E402
+from auth import hash_password, user_cache  # noqa: E402
 from config.db import SessionLocal  # noqa: E402
 from main import app  # noqa: E402
 from models import (  # noqa: E402
@@ -48,11 +48,13 @@ def client():
             session.execute(delete(Notification))
             session.execute(delete(User))
             session.commit()
+        user_cache.invalidate()
         yield test_client
         with SessionLocal() as session:
             session.execute(delete(Notification))
             session.execute(delete(User))
             session.commit()
+        user_cache.invalidate()
 
 
 def _prepare_signed_headers(
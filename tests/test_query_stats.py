@@ -0,0 +1,84 @@
+import logging
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+
+from config import db, query_stats  # noqa: E402
+from config.constants import Currency  # noqa: E402
+from main import app  # noqa: E402
+from models import Account  # noqa: E402
+
+HEADERS = {"X-API-Key": "consumer-key"}
+
+
+@pytest.fixture(autouse=True)
+def setup_database(monkeypatch):
+    monkeypatch.setenv("SELF_BILLING_API_KEY", "consumer-key")
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    db.Base.metadata.create_all(bind=db.engine, checkfirst=True)
+    yield
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+
+
+def _db_metrics(response) -> tuple[float, int]:
+    metrics = dict(
+        metric.strip().split(";", 1) for metric in response.headers["Server-Timing"].split(",")
+    )
+    return float(metrics["db"].removeprefix("dur=")), int(metrics["db-count"].split('"')[1])
+
+
+def test_normalize_sql_groups_statements_by_shape():
+    assert query_stats.normalize_sql(
+        "SELECT *\n  FROM accounts WHERE name = 'O''Brien' AND id IN (?, ?, ?) LIMIT 10"
+    ) == "SELECT * FROM accounts WHERE name = ? AND id IN (...) LIMIT ?"
+    assert query_stats.normalize_sql("SELECT ix_1 FROM t WHERE a IN (%(a_1)s, %(a_2)s)") == (
+        "SELECT ix_1 FROM t WHERE a IN (...)"
+    )
+
+
+def test_responses_report_db_time_and_statement_count_within_budget():
+    with db.SessionLocal() as session:
+        session.add(Account(name="Facturación", currency=Currency.ARS, is_billing=True))
+        session.commit()
+    client = TestClient(app)
+    cursor = client.get("/facturacion-info", headers=HEADERS).json()["next_cursor"]
+
+    response = client.get("/facturacion-info", params={"since": cursor}, headers=HEADERS)
+
+    duration_ms, count = _db_metrics(response)
+    assert 0 < count <= 4
+    assert duration_ms >= 0
+    assert _db_metrics(client.get("/health")) == (0.0, 0)
+
+
+def test_query_budget_lists_the_statements_when_exceeded():
+    with db.SessionLocal() as session:
+        with query_stats.query_budget(1) as stats:
+            session.scalars(select(Account)).all()
+        assert stats.count == 1
+
+        with pytest.raises(AssertionError, match=r"2 queries, budget 1:\n  SELECT"):
+            with query_stats.query_budget(1):
+                session.scalars(select(Account)).all()
+                session.scalars(select(Account).where(Account.id.in_([1, 2, 3]))).all()
+
+
+def test_slow_queries_are_logged_normalized(monkeypatch, caplog):
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level(logging.WARNING, logger=query_stats.__name__):
+        with db.SessionLocal() as session:
+            session.scalars(select(Account).where(Account.id.in_([1, 2, 3]))).all()
+
+    [record] = caplog.records
+    assert record.getMessage().startswith("Slow query (")
+    assert "WHERE accounts.id IN (...)" in record.getMessage()
@@ -0,0 +1,63 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, event, inspect, select, text
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "app"))
+
+os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///:memory:")
+os.environ.setdefault("DB_SCHEMA", "")
+
+from config import db  # noqa: E402
+from models import SchemaVersion  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def empty_database():
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+    yield
+    db.Base.metadata.drop_all(bind=db.engine, checkfirst=True)
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _applied_versions() -> list[int]:
+    with db.engine.connect() as conn:
+        return conn.scalars(select(SchemaVersion.version).order_by(SchemaVersion.version)).all()
+
+
+def test_init_db_records_every_step_and_then_only_reads_the_version(statements):
+    db.init_db()
+    assert _applied_versions() == list(range(1, len(db.SCHEMA_MIGRATIONS) + 1))
+
+    statements.clear()
+    db.init_db()
+    assert len(statements) == 1
+    assert "schema_version" in statements[0]
+
+
+def test_init_db_applies_only_the_pending_steps():
+    db.init_db()
+    change_seq_step = db.SCHEMA_MIGRATIONS.index(db._add_billing_info_change_seq) + 1
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_invoices_change_seq"))
+        conn.execute(delete(SchemaVersion).where(SchemaVersion.version >= change_seq_step))
+
+    db.init_db()
+
+    assert _applied_versions() == list(range(1, len(db.SCHEMA_MIGRATIONS) + 1))
+    indexes = {index["name"] for index in inspect(db.engine).get_indexes("invoices")}
+    assert "ix_invoices_change_seq" in indexes
@@ -19,7 +19,7 @@ os.environ.setdefault("DB_SCHEMA", "")
 
 from config.constants import Currency  # noqa: E402
 from config.db import SessionLocal, init_db  # noqa: E402
-from models import Account, Transaction  # noqa: E402
+from models import Account, AccountDailyBalance, Transaction  # noqa: E402
 from routes.transactions import create_tx, list_transactions, update_tx  # noqa: E402
 from schemas import TransactionCreate  # noqa: E402
 
@@ -75,10 +75,12 @@ def db_session():
     init_db()
     with SessionLocal() as session:
         session.execute(delete(Transaction))
+        session.execute(delete(AccountDailyBalance))
         session.execute(delete(Account))
         session.commit()
         yield session
         session.execute(delete(Transaction))
+        session.execute(delete(AccountDailyBalance))
         session.execute(delete(Account))
         session.commit()
 
@@ -248,3 +250,175 @@ def test_update_tx_restricts_billing_fields(db_session):
     assert tx.amount == original_amount
     assert tx.account_id == billing_account.id
     assert tx.notes == "Notas originales"
+
+
+def test_list_transactions_cursor_walks_pages_in_order(db_session):
+    account = _create_account(db_session, "Cuenta Cursor")
+    other = _create_account(db_session, "Cuenta Ajena")
+    created = [
+        _create_transaction(
+            db_session,
+            account,
+            tx_date=tx_date,
+            description=f"Pago {index}",
+            amount=Decimal("-10"),
+        )
+        for index, tx_date in enumerate(
+            [
+                date(2023, 7, 1),
+                date(2023, 7, 3),
+                date(2023, 7, 3),
+                date(2023, 7, 5),
+                date(2023, 7, 8),
+            ]
+        )
+    ]
+    _create_transaction(
+        db_session,
+        other,
+        tx_date=date(2023, 7, 4),
+        description="Pago ajeno",
+        amount=Decimal("-10"),
+    )
+    expected = [
+        tx.id
+        for tx in sorted(created, key=lambda tx: (tx.date, tx.id), reverse=True)
+    ]
+
+    seen: list[int] = []
+    cursor = None
+    pages = 0
+    while True:
+        page = list_transactions(
+            limit=2,
+            search="pago",
+            account_id=account.id,
+            cursor=cursor,
+            db=db_session,
+        )
+        pages += 1
+        seen.extend(item.id for item in page.items)
+        assert page.total == 5
+        if not page.has_more:
+            assert page.next_cursor is None
+            break
+        assert page.next_cursor is not None
+        cursor = page.next_cursor
+
+    assert pages == 3
+    assert seen == expected
+
+
+def test_list_transactions_rejects_invalid_cursor(db_session):
+    with pytest.raises(HTTPException) as exc_info:
+        list_transactions(cursor="no-es-un-cursor", db=db_session)
+
+    assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_list_transactions_without_total_uses_lookahead_row(db_session):
+    account = _create_account(db_session, "Cuenta Sin Total")
+    for day in (1, 2, 3):
+        _create_transaction(
+            db_session,
+            account,
+            tx_date=date(2023, 8, day),
+            description="Cobro",
+            amount=Decimal("10"),
+        )
+
+    first = list_transactions(
+        limit=2, account_id=account.id, include_total="none", db=db_session
+    )
+    assert first.total is None
+    assert first.has_more is True
+    assert len(first.items) == 2
+
+    last = list_transactions(
+        limit=2, offset=2, account_id=account.id, include_total="none", db=db_session
+    )
+    assert last.has_more is False
+    assert len(last.items) == 1
+
+
+def test_list_transactions_count_cache_is_invalidated_by_writes(db_session):
+    account = _create_account(db_session, "Cuenta Cache")
+    _create_transaction(
+        db_session,
+        account,
+        tx_date=date(2023, 9, 1),
+        description="Cobro",
+        amount=Decimal("10"),
+    )
+
+    first = list_transactions(account_id=account.id, db=db_session)
+    assert first.total == 1
+
+    _create_transaction(
+        db_session,
+        account,
+        tx_date=date(2023, 9, 2),
+        description="Cobro",
+        amount=Decimal("15"),
+    )
+
+    second = list_transactions(account_id=account.id, db=db_session)
+    assert second.total == 2
+
+    # SQLite has no planner estimate, so the exact (cached) count is used.
+    estimated = list_transactions(
+        account_id=account.id, include_total="estimate", db=db_session
+    )
+    assert estimated.total == 2
+    assert estimated.total_estimated is False
+
+
+def test_list_transactions_search_matches_words_and_ranks(db_session):
+    account = _create_account(db_session, "Cuenta Búsqueda")
+    weak = _create_transaction(
+        db_session,
+        account,
+        tx_date=date(2023, 10, 5),
+        description="Transferencia",
+        amount=Decimal("-20"),
+        notes="Pago de expensas del edificio y otros gastos varios del mes",
+    )
+    strong = _create_transaction(
+        db_session,
+        account,
+        tx_date=date(2023, 10, 1),
+        description="Pago expensas",
+        amount=Decimal("-30"),
+        notes="expensas",
+    )
+    accented = _create_transaction(
+        db_session,
+        account,
+        tx_date=date(2023, 10, 3),
+        description="Comisión bancaria",
+        amount=Decimal("-5"),
+    )
+    _create_transaction(
+        db_session,
+        account,
+        tx_date=date(2023, 10, 4),
+        description="Cobro cliente",
+        amount=Decimal("100"),
+    )
+
+    by_date = list_transactions(search="expens", db=db_session)
+    assert [item.id for item in by_date.items] == [weak.id, strong.id]
+    assert by_date.total == 2
+
+    by_relevance = list_transactions(search="expensas", sort="relevance", db=db_session)
+    assert [item.id for item in by_relevance.items] == [strong.id, weak.id]
+
+    without_accent = list_transactions(
+        search="comision", start_date=date(2023, 10, 2), db=db_session
+    )
+    assert [item.id for item in without_accent.items] == [accented.id]
+
+    db_session.delete(strong)
+    db_session.commit()
+    after_delete = list_transactions(search="expensas", db=db_session)
+    assert [item.id for item in after_delete.items] == [weak.id]